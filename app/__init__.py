@@ -2,18 +2,33 @@ from flask import Flask
 from flask_jwt_extended import JWTManager
 from flask_sqlalchemy import SQLAlchemy
 from os import path
+from . import metrics, profiling
+from .database import DATABASE_URL, REPLICA_DATABASE_URL, REPLICA_BIND_KEY, RoutingSession, bind_options, \
+    engine_options, start_request, finish_request, stop_request_recording
 
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 DB_NAME = "database.db"
 
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
     app.config['SECRET_KEY'] = 'cc3579e82fc245f3fb19453908926837'
     app.config['JWT_SECRET_KEY'] = '792543746a882f9eeb77b594360bd7f3'
-    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_NAME}'
+    app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
+    if REPLICA_DATABASE_URL:
+        app.config['SQLALCHEMY_BINDS'] = {REPLICA_BIND_KEY: REPLICA_DATABASE_URL}
+    # e.g. another database for benchmarks, applied before the database engine is created
+    app.config.update(config or {})
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+    app.config['SQLALCHEMY_BINDS'] = {key: bind_options(bind)
+                                      for key, bind in app.config.get('SQLALCHEMY_BINDS', {}).items()}
     db.init_app(app)
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    app.teardown_request(stop_request_recording)
+    metrics.init_app(app)
+    profiling.init_app(app)
 
     JWTManager(app)
 
@@ -25,9 +40,13 @@ def create_app():
     app.register_blueprint(auth, url_prefix='/')
 
     from .models import User
+    from . import migrations
 
+    migrations.init_app(app)
     with app.app_context():
+        # a new database gets every table and index here; an existing one is changed by "flask schema upgrade"
         db.create_all()
+        migrations.warn_about_pending_changes()
 
     return app
 
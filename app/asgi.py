@@ -0,0 +1,209 @@
+"""ASGI entry point: the endpoints that wait on OpenAI or DeepL run on one event loop, everything else is Flask.
+
+    uvicorn main:asgi_app --workers 4
+
+The /async/... routes below are the async counterparts of the views in controller.py. While they
+wait for an upstream they hold no thread, so one worker can keep hundreds of them in flight. The
+short database work still runs through the synchronous service functions, on a thread pool and
+inside a Flask request context, so JWT identity and the SQLAlchemy session behave as in Flask.
+"""
+import datetime
+import json
+from a2wsgi import WSGIMiddleware
+import deepl
+import sqlalchemy
+from flask_jwt_extended import verify_jwt_in_request
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+from contextlib import asynccontextmanager
+from .async_service import acreate_chat_completion, acall_chat_response, atranslate_with_memory, close_client_session
+from .controller import (cache, chat_response_content, parse_translation_request, parse_dictionary_request,
+                         translation_cache_key, find_cached_translation, cache_translation)
+from .service import (build_chat_request, save_chat_turn, prepare_guidance_context, find_cached_guidance,
+                      cache_guidance, build_hint_message, build_advanced_version_message, ChatAPIError,
+                      save_to_db_dictionary, schedule_hint_precompute, record_hint_request)
+
+
+def _flask_request_runner(request):
+    """Return run_sync(fn, *args), which calls fn on the thread pool in a Flask request with the caller's JWT."""
+    flask_app = request.app.state.flask_app
+    headers = {"Authorization": request.headers.get("Authorization", "")}
+
+    def call_in_flask_request(fn, *args):
+        with flask_app.test_request_context(request.url.path, method=request.method, headers=headers):
+            verify_jwt_in_request()
+            return fn(*args)
+
+    async def run_sync(fn, *args):
+        return await run_in_threadpool(call_in_flask_request, fn, *args)
+
+    return run_sync
+
+
+async def _json_body(request):
+    try:
+        return await request.json()
+    except json.JSONDecodeError:
+        return None
+
+
+def _authenticated():
+    return None
+
+
+async def get_chat_response(request):
+    run_sync = _flask_request_runner(request)
+    await run_sync(_authenticated)
+    conversation_id = request.path_params["conversation_id"]
+    data_from_stt = await _json_body(request) or {}
+    stt_message_text = data_from_stt.get("TTS_message", None)
+    if not stt_message_text:
+        return JSONResponse({"error": "I have technical problem with answer, please repeat"}, status_code=400)
+
+    # nothing is written while the chat answers, then the whole turn is saved in one transaction
+    sent_at = datetime.datetime.utcnow()
+    messages_for_api = await run_sync(build_chat_request, stt_message_text, conversation_id)
+    try:
+        response = await acreate_chat_completion(messages_for_api)
+    except Exception:
+        # like the Flask view, the user message is kept when the chat fails
+        await run_sync(save_chat_turn, stt_message_text, sent_at, None, conversation_id)
+        raise
+    chat_message_answer = await run_sync(save_chat_turn, stt_message_text, sent_at, chat_response_content(response),
+                                         conversation_id)
+    if chat_message_answer:
+        schedule_hint_precompute(request.app.state.flask_app, conversation_id)
+    return JSONResponse({"chat_message": chat_message_answer or "I have technical problem with answer, please repeat"})
+
+
+async def acall_guidance_response(conversation_id, last_message_id, kind, guidance_message, user_attempt=""):
+    # the guidance cache is in process memory, cheap enough to use on the event loop
+    guidance_response = find_cached_guidance(conversation_id, last_message_id, kind, user_attempt)
+    if guidance_response is None:
+        guidance_response = await acall_chat_response(guidance_message)
+        cache_guidance(conversation_id, last_message_id, kind, user_attempt, guidance_response)
+    return guidance_response
+
+
+async def get_hint(request):
+    run_sync = _flask_request_runner(request)
+    conversation_id = request.path_params["conversation_id"]
+    try:
+        last_message_id, last_message, summary = await run_sync(prepare_guidance_context, conversation_id)
+        record_hint_request(conversation_id, last_message_id)
+        guidance_response = await acall_guidance_response(conversation_id, last_message_id, "hint",
+                                                          build_hint_message(last_message, summary))
+        return JSONResponse({"guidance_response": guidance_response})
+
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except ChatAPIError as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+async def get_advanced_version(request):
+    run_sync = _flask_request_runner(request)
+    conversation_id = request.path_params["conversation_id"]
+    try:
+        last_message_id, last_message, summary = await run_sync(prepare_guidance_context, conversation_id)
+
+        user_attempt = await _json_body(request)
+        if user_attempt is None:
+            return JSONResponse({"error": "There is no sentence to correct, please use hint instead"})
+
+        user_attempt_message = user_attempt["chat_message"]
+        guidance_message = build_advanced_version_message(last_message, summary, user_attempt_message)
+        guidance_response = await acall_guidance_response(conversation_id, last_message_id, "advanced_version",
+                                                          guidance_message, user_attempt_message)
+        return JSONResponse({"guidance_response": guidance_response})
+
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except ChatAPIError as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+async def get_translation(request):
+    run_sync = _flask_request_runner(request)
+    await run_sync(_authenticated)
+    try:
+        word_to_translate, sentence_to_translate, source_lang, target_lang = parse_translation_request(
+            await _json_body(request))
+    except (KeyError, TypeError):
+        return JSONResponse({"error": "Incorrect data format. Make sure you press the word and try again."},
+                            status_code=400)
+
+    # the cache may be Redis, keep its round trip off the event loop
+    value = await run_in_threadpool(find_cached_translation, word_to_translate, sentence_to_translate, source_lang,
+                                    target_lang)
+    if not value:
+        translated_word, translated_sentence = await atranslate_with_memory(word_to_translate, sentence_to_translate,
+                                                                            source_lang, target_lang, run_sync)
+        value = await run_in_threadpool(cache_translation, word_to_translate, sentence_to_translate, source_lang,
+                                        target_lang, translated_word, translated_sentence)
+    return JSONResponse(value)
+
+
+async def add_to_dictionary(request):
+    run_sync = _flask_request_runner(request)
+    await run_sync(_authenticated)
+    try:
+        word_to_dictionary, contex_sentence, source_lang, target_lang = parse_dictionary_request(
+            await _json_body(request))
+    except (KeyError, TypeError):
+        return JSONResponse({"error": "Incorrect data format. Make sure you provide the word and try again."},
+                            status_code=400)
+
+    key = translation_cache_key(word_to_dictionary, source_lang, target_lang)
+    value = await run_in_threadpool(cache.get, key)
+    cached = bool(value) and value.get("contex_sentence") == contex_sentence
+    if not cached:
+        translated_word, translated_contex_sentence = await atranslate_with_memory(word_to_dictionary, contex_sentence,
+                                                                                   source_lang, target_lang, run_sync)
+        value = {"translated_word": translated_word, "translated_contex_sentence": translated_contex_sentence,
+                 "contex_sentence": contex_sentence}
+    # saved for every user who adds it, the cache only spares the translation
+    await run_sync(save_to_db_dictionary, word_to_dictionary, value["translated_word"], contex_sentence, source_lang,
+                   target_lang, value["translated_contex_sentence"])
+    if not cached:
+        await run_in_threadpool(cache.set, key, value)
+    return JSONResponse(value)
+
+
+async def handle_deepl_exception(request, e):
+    return JSONResponse({"error": "Translation mistake, try later"}, status_code=500)
+
+
+async def handle_sqlalchemy_exception(request, e):
+    return JSONResponse({"error": "Database error. I cannot save this word to the dictionary"}, status_code=500)
+
+
+async def handle_jwt_exception(request, e):
+    return JSONResponse({"msg": str(e)}, status_code=401)
+
+
+def create_asgi_app(flask_app):
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        await close_client_session()
+
+    routes = [
+        Route("/async/response/{conversation_id}", get_chat_response, methods=["POST"]),
+        Route("/async/hint/{conversation_id}", get_hint, methods=["POST"]),
+        Route("/async/advanced_version/{conversation_id}", get_advanced_version, methods=["POST"]),
+        Route("/async/translation", get_translation, methods=["POST"]),
+        Route("/async/dictionary", add_to_dictionary, methods=["POST"]),
+        Mount("/", app=WSGIMiddleware(flask_app)),
+    ]
+    exception_handlers = {deepl.DeepLException: handle_deepl_exception,
+                          sqlalchemy.exc.SQLAlchemyError: handle_sqlalchemy_exception,
+                          JWTExtendedException: handle_jwt_exception,
+                          PyJWTError: handle_jwt_exception}
+    asgi_app = Starlette(routes=routes, exception_handlers=exception_handlers, lifespan=lifespan)
+    asgi_app.state.flask_app = flask_app
+    return asgi_app
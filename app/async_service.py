@@ -0,0 +1,118 @@
+import asyncio
+import os
+import aiohttp
+import deepl
+import openai
+from .coalesce import AsyncSingleFlight
+from .metrics import track_upstream
+from .service import (ChatAPIError, OPENAI_TOKEN, DEEPL_MAX_TEXTS_PER_REQUEST, find_in_translation_memory,
+                      save_to_translation_memory, upstream_call_key)
+from .translator import DEEPL_TOKEN, DEEPL_SERVER_URL, DEEPL_TIMEOUT
+
+# async versions of the upstream calls in service.py, used by the ASGI app in asgi.py
+
+UPSTREAM_MAX_CONNECTIONS = int(os.environ.get('UPSTREAM_MAX_CONNECTIONS', 100))
+
+# identical upstream calls running at the same time on the event loop share one request
+async_upstream_calls = AsyncSingleFlight()
+
+_client_session = None
+_client_session_loop = None
+
+
+def get_client_session():
+    """Return the keep-alive HTTP session shared by all upstream calls on the running event loop."""
+    global _client_session, _client_session_loop
+    loop = asyncio.get_running_loop()
+    if _client_session is None or _client_session.closed or _client_session_loop is not loop:
+        _client_session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=UPSTREAM_MAX_CONNECTIONS))
+        _client_session_loop = loop
+    return _client_session
+
+
+async def close_client_session():
+    global _client_session
+    if _client_session is not None and not _client_session.closed:
+        await _client_session.close()
+    _client_session = None
+
+
+async def acreate_chat_completion(messages_for_api):
+    openai.api_key = OPENAI_TOKEN
+    openai.aiosession.set(get_client_session())
+    with track_upstream("openai", "chat_completion"):
+        return await openai.ChatCompletion.acreate(model="gpt-3.5-turbo", messages=messages_for_api)
+
+
+async def acall_chat_response(guidance_message):
+    async def call():
+        response = await acreate_chat_completion(guidance_message)
+        return response["choices"][0]["message"]["content"]
+
+    try:
+        return await async_upstream_calls.do(upstream_call_key("openai", guidance_message), call)
+
+    except (KeyError, IndexError, ValueError) as e:
+        raise ChatAPIError("Failed to get a response from the chat") from e
+
+
+def _deepl_server_url(auth_key):
+    if DEEPL_SERVER_URL:
+        return DEEPL_SERVER_URL
+    # the same choice deepl.Translator makes
+    return deepl.Translator._DEEPL_SERVER_URL_FREE if auth_key.endswith(":fx") else deepl.Translator._DEEPL_SERVER_URL
+
+
+async def aget_translate_deepl_batch(texts_to_translate, source_lang, target_lang):
+    key = upstream_call_key("deepl", [texts_to_translate, source_lang, target_lang])
+    return await async_upstream_calls.do(key, lambda: _atranslate_texts_deepl(texts_to_translate, source_lang,
+                                                                              target_lang))
+
+
+async def _atranslate_texts_deepl(texts_to_translate, source_lang, target_lang):
+    auth_key = DEEPL_TOKEN
+    if not auth_key:
+        raise ValueError("auth_key must not be empty")
+    url = f'{_deepl_server_url(auth_key).rstrip("/")}/v2/translate'
+    headers = {"Authorization": f"DeepL-Auth-Key {auth_key}"}
+    session = get_client_session()
+
+    async def translate_chunk(chunk):
+        request_data = {"text": chunk, "source_lang": source_lang, "target_lang": target_lang}
+        with track_upstream("deepl", "translate_text"):
+            async with session.post(url, json=request_data, headers=headers,
+                                    timeout=aiohttp.ClientTimeout(total=DEEPL_TIMEOUT)) as response:
+                if response.status != 200:
+                    raise deepl.DeepLException(f"Translation request failed with status {response.status}")
+                response_json = await response.json()
+        return [translation["text"] for translation in response_json["translations"]]
+
+    chunks = [texts_to_translate[start:start + DEEPL_MAX_TEXTS_PER_REQUEST]
+              for start in range(0, len(texts_to_translate), DEEPL_MAX_TEXTS_PER_REQUEST)]
+    try:
+        translated_chunks = await asyncio.gather(*(translate_chunk(chunk) for chunk in chunks))
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        raise deepl.DeepLException("Translation request failed") from e
+
+    return [translated_text for translated_chunk in translated_chunks for translated_text in translated_chunk]
+
+
+async def aget_translate_deepl(word_to_translate, sentence_to_translate, source_lang, target_lang):
+    translated_word, translated_sentence = await aget_translate_deepl_batch(
+        [word_to_translate, sentence_to_translate], source_lang, target_lang)
+    return translated_word, translated_sentence
+
+
+async def atranslate_with_memory(word_to_translate, sentence_to_translate, source_lang, target_lang, run_sync):
+    """translate_with_memory for the event loop; `run_sync` runs the database work off the loop."""
+    translations = await run_sync(find_in_translation_memory, [word_to_translate, sentence_to_translate],
+                                  source_lang, target_lang)
+    if word_to_translate in translations and sentence_to_translate in translations:
+        return translations[word_to_translate], translations[sentence_to_translate]
+
+    translated_word, translated_sentence = await aget_translate_deepl(word_to_translate, sentence_to_translate,
+                                                                      source_lang, target_lang)
+    await run_sync(save_to_translation_memory,
+                   {word_to_translate: translated_word, sentence_to_translate: translated_sentence},
+                   source_lang, target_lang)
+    return translated_word, translated_sentence
@@ -2,7 +2,7 @@ from flask import Blueprint, jsonify, request, make_response
 from . import db
 from .models import User
 from flask_jwt_extended import create_access_token
-from werkzeug.security import generate_password_hash, check_password_hash
+from .passwords import hash_password, check_password, needs_rehash, HashingOverloaded
 
 auth = Blueprint('auth', __name__)
 
@@ -13,8 +13,7 @@ def signup():
     name = signup_data['name']
     username = signup_data['username']
     password = signup_data['password']
-    hash_password = generate_password_hash(password)
-    new_user = User(name=name, username=username, password=hash_password)
+    new_user = User(name=name, username=username, password=hash_password(password))
     db.session.add(new_user)
     db.session.commit()
 
@@ -28,12 +27,21 @@ def login():
     form_password = form_data['password']
     user = User.query.filter_by(username=form_username).first()
 
-    if not user or not check_password_hash(user.password, form_password):
+    if not user or not check_password(user.password, form_password):
         return make_response('Could not verify', 401, {'WWW-Authenticate': 'Basic realm: "Login required!"'})
 
-    token = create_access_token(identity=user.username)
+    if needs_rehash(user.password):
+        # the password is known only now, upgrade a hash made with an older method or cost
+        user.password = hash_password(form_password)
+        db.session.commit()
 
-    return jsonify({'token': token})
+    # the user id travels in the token, so protected endpoints need not look the user up
+    token = create_access_token(identity=user.username, additional_claims={"user_id": user.id})
 
+    return jsonify({'token': token})
 
 
+@auth.errorhandler(HashingOverloaded)
+def handle_hashing_overloaded(e):
+    return make_response(jsonify({'error': 'Too many logins right now, try again in a moment'}), 503,
+                         {'Retry-After': '1'})
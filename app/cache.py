@@ -1,7 +1,13 @@
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+import logging
+import threading
+import time
 import redis
 import json
 
+logger = logging.getLogger(__name__)
+
 
 class Cache(ABC):
 
@@ -13,6 +19,19 @@ class Cache(ABC):
     def set(self, key, value):
         pass
 
+    def get_many(self, keys):
+        """Return a dict with the values of the keys that are cached."""
+        values = {}
+        for key in dict.fromkeys(keys):
+            value = self.get(key)
+            if value is not None:
+                values[key] = value
+        return values
+
+    def set_many(self, mapping):
+        for key, value in mapping.items():
+            self.set(key, value)
+
 
 class SimpleCache(Cache):
 
@@ -28,10 +47,98 @@ class SimpleCache(Cache):
         self.cache[key] = value
 
 
+class LRUCache(Cache):
+    """In-process cache bounded by entry count and approximate size in bytes.
+
+    Entries expire after `ttl` seconds (None means never) and the least recently used
+    entries are evicted first once either limit is reached.
+    """
+
+    def __init__(self, max_entries=10000, max_bytes=16 * 1024 * 1024, ttl=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.cache = OrderedDict()  # key -> (value, size, expires_at)
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, size, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        size = self._estimate_size(key, value)
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+
+        with self.lock:
+            if key in self.cache:
+                self._remove(key)
+            # a single value larger than the whole budget is not worth keeping
+            if size > self.max_bytes:
+                return
+
+            self.cache[key] = (value, size, expires_at)
+            self.size_bytes += size
+            while len(self.cache) > self.max_entries or self.size_bytes > self.max_bytes:
+                oldest_key = next(iter(self.cache))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self.lock:
+            if key in self.cache:
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+            self.size_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0,
+                    "evictions": self.evictions, "entries": len(self.cache), "size_bytes": self.size_bytes}
+
+    def __len__(self):
+        return len(self.cache)
+
+    def _remove(self, key):
+        _, size, _ = self.cache.pop(key)
+        self.size_bytes -= size
+
+    @staticmethod
+    def _estimate_size(key, value):
+        # the same JSON form RedisCache stores, so the limit means the same thing for both
+        return len(key.encode("utf-8")) + len(json.dumps(value).encode("utf-8"))
+
+
 class RedisCache(Cache):
 
-    def __init__(self, host='localhost', port=6379, db=0):
-        self.cache = redis.StrictRedis(host=host, port=port, db=db)
+    def __init__(self, host='localhost', port=6379, db=0, ttl=None, client=None):
+        self.cache = client if client is not None else redis.StrictRedis(host=host, port=port, db=db)
+        self.ttl = ttl
+
+    @classmethod
+    def from_url(cls, url, ttl=None):
+        return cls(ttl=ttl, client=redis.StrictRedis.from_url(url))
 
     def get(self, key):
         if cached_key := self.cache.get(key):
@@ -40,5 +147,89 @@ class RedisCache(Cache):
 
     def set(self, key, value):
         formatted_value = json.dumps(value)
-        self.cache.set(key, formatted_value)
+        self.cache.set(key, formatted_value, ex=self.ttl)
+
+    def get_many(self, keys):
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        # one MGET round trip for all keys
+        raw_values = self.cache.mget(keys)
+        return {key: json.loads(raw_value) for key, raw_value in zip(keys, raw_values) if raw_value}
+
+    def set_many(self, mapping):
+        if not mapping:
+            return
+        pipeline = self.cache.pipeline(transaction=False)
+        for key, value in mapping.items():
+            pipeline.set(key, json.dumps(value), ex=self.ttl)
+        pipeline.execute()
+
+
+class TieredCache(Cache):
+    """Small in-process cache (L1) in front of a shared cache (L2), usually RedisCache.
+
+    Reads go through L1 first and fill it from L2; writes go to both. Keys that L2 does not
+    have are remembered for `negative_ttl` seconds, so repeated misses stay in the process.
+    When L2 is unreachable the cache degrades to L1 only instead of failing the request.
+    """
+
+    def __init__(self, l1, l2, negative_ttl=5, negative_max_entries=10000):
+        self.l1 = l1
+        self.l2 = l2
+        self.negative = LRUCache(max_entries=negative_max_entries, ttl=negative_ttl)
+        self.l2_hits = 0
+        self.l2_misses = 0
+        self.l2_errors = 0
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def get_many(self, keys):
+        values = {}
+        missing_in_l1 = []
+        for key in dict.fromkeys(keys):
+            value = self.l1.get(key)
+            if value is not None:
+                values[key] = value
+            elif self.negative.get(key) is None:
+                missing_in_l1.append(key)
+
+        if not missing_in_l1:
+            return values
+
+        try:
+            l2_values = self.l2.get_many(missing_in_l1)
+        except redis.RedisError:
+            self.l2_errors += 1
+            logger.warning("L2 cache unavailable, serving from L1 only", exc_info=True)
+            return values
+
+        for key in missing_in_l1:
+            if key in l2_values:
+                self.l2_hits += 1
+                self.l1.set(key, l2_values[key])
+                values[key] = l2_values[key]
+            else:
+                self.l2_misses += 1
+                self.negative.set(key, True)
+        return values
+
+    def set_many(self, mapping):
+        if not mapping:
+            return
+        for key, value in mapping.items():
+            self.l1.set(key, value)
+            self.negative.delete(key)
+        try:
+            self.l2.set_many(mapping)
+        except redis.RedisError:
+            self.l2_errors += 1
+            logger.warning("L2 cache unavailable, value kept in L1 only", exc_info=True)
 
+    def stats(self):
+        return {"l1": self.l1.stats(), "negative": self.negative.stats(), "l2_hits": self.l2_hits,
+                "l2_misses": self.l2_misses, "l2_errors": self.l2_errors}
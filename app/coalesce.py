@@ -0,0 +1,160 @@
+import asyncio
+import json
+import threading
+import time
+import redis
+
+
+class _Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time inside this process.
+
+    Callers that ask for a key which is already being computed wait for that call and get
+    its result (or its exception) instead of starting their own.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self.lock:
+            self.calls += 1
+            call = self.in_flight.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self.in_flight[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            call.done.set()
+
+    def stats(self):
+        with self.lock:
+            calls, coalesced = self.calls, self.coalesced
+        return {"calls": calls, "coalesced": coalesced, "coalescing_rate": coalesced / calls if calls else 0.0}
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines running on one event loop."""
+
+    def __init__(self):
+        self.in_flight = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        self.calls += 1
+        future = self.in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # shielded, so a waiter that gets cancelled does not cancel the call for the others
+            return await asyncio.shield(future)
+
+        future = self.in_flight[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # retrieved here, so there is no warning when nobody was waiting
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self.in_flight[key]
+
+    def stats(self):
+        calls, coalesced = self.calls, self.coalesced
+        return {"calls": calls, "coalesced": coalesced, "coalescing_rate": coalesced / calls if calls else 0.0}
+
+
+class RedisSingleFlight(SingleFlight):
+    """SingleFlight that also coalesces calls across processes through a Redis lock.
+
+    The process holding the lock runs the call and publishes its result for `result_ttl`
+    seconds; the others poll for it. If the holder fails or takes longer than `wait_timeout`
+    the waiting process runs the call itself. Results must be JSON serializable.
+    """
+
+    def __init__(self, client, lock_timeout=30, result_ttl=10, wait_timeout=30, poll_interval=0.05):
+        super().__init__()
+        self.client = client
+        self.lock_timeout = lock_timeout
+        self.result_ttl = result_ttl
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.coalesced_remote = 0
+
+    def do(self, key, fn):
+        return super().do(key, lambda: self._do_across_processes(key, fn))
+
+    def _do_across_processes(self, key, fn):
+        lock_key, result_key = f'singleflight:lock:{key}', f'singleflight:result:{key}'
+        try:
+            lock = self.client.lock(lock_key, timeout=self.lock_timeout)
+            acquired = lock.acquire(blocking=False)
+        except redis.RedisError:
+            return fn()
+
+        if acquired:
+            try:
+                result = fn()
+                try:
+                    self.client.set(result_key, json.dumps(result), ex=self.result_ttl)
+                except redis.RedisError:
+                    pass
+                return result
+            finally:
+                try:
+                    lock.release()
+                except redis.RedisError:
+                    pass
+
+        with self.lock:
+            self.coalesced_remote += 1
+        deadline = time.monotonic() + self.wait_timeout
+        try:
+            while time.monotonic() < deadline:
+                lock_held = self.client.exists(lock_key)
+                if (raw_result := self.client.get(result_key)) is not None:
+                    return json.loads(raw_result)
+                if not lock_held:
+                    # the holder failed, there will be no result
+                    break
+                time.sleep(self.poll_interval)
+        except redis.RedisError:
+            pass
+        return fn()
+
+    def stats(self):
+        stats = super().stats()
+        stats["coalesced_remote"] = self.coalesced_remote
+        return stats
@@ -1,5 +1,7 @@
-import json
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response, stream_with_context, current_app
+import csv
+import io
+import itertools
 from flask_jwt_extended import jwt_required
 from flask_jwt_extended import get_jwt_identity
 import deepl
@@ -9,16 +11,44 @@ from . import db
 import openai
 import sqlalchemy
 from sqlalchemy import exc
-from .cache import SimpleCache
+from .cache import LRUCache, RedisCache, TieredCache
+from .streaming import AnswerStreamParser, format_sse
+from .async_service import async_upstream_calls
+from .passwords import hashing_executor
+from .metrics import registry, track_upstream, cache_metrics, coalescing_metrics, metrics_authorized, metrics_response
 from .service import (get_user_id_by_token_identify, find_all_conversations_names_ids,
-                      find_conversation_by_conversation_id, save_message_to_database,
-                      prepare_api_payload, message_for_api, call_chat_response, prepare_messages, ChatAPIError,
-                      save_to_db_dictionary, get_translate_deepl)
+                      find_conversation_by_conversation_id, prepare_chat_request, save_chat_response,
+                      prepare_guidance_context, call_guidance_response, build_hint_message,
+                      build_advanced_version_message, ChatAPIError, save_to_db_dictionary, translate_with_memory,
+                      translate_many_with_memory, upstream_calls, guidance_cache, schedule_hint_precompute,
+                      record_hint_request, hint_precomputer, unit_of_work, commit_unit_of_work, find_messages_page,
+                      encode_message_cursor, iter_conversation_messages, MESSAGES_PAGE_DEFAULT_LIMIT,
+                      MESSAGES_PAGE_MAX_LIMIT, identity_cache, search_dictionary, DICTIONARY_SEARCH_DEFAULT_LIMIT,
+                      DICTIONARY_SEARCH_MAX_LIMIT, iter_dictionary_entries, parse_dictionary_file, import_dictionary,
+                      DICTIONARY_FILE_COLUMNS, DICTIONARY_IMPORT_MAX_ROWS)
 
 controller = Blueprint("controller", __name__)
-cache = SimpleCache()
 OPENAI_TOKEN = os.environ.get('OPENAI_TOKEN')
 DEEPL_TOKEN = os.environ.get('DEEPL_TOKEN')
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 10000))
+CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES', 16 * 1024 * 1024))
+CACHE_TTL = int(os.environ.get('CACHE_TTL', 24 * 60 * 60))
+CACHE_L1_MAX_ENTRIES = int(os.environ.get('CACHE_L1_MAX_ENTRIES', 1000))
+REDIS_URL = os.environ.get('REDIS_URL')
+
+if REDIS_URL:
+    # shared between workers, with a small per-process L1 in front of it
+    cache = TieredCache(LRUCache(max_entries=CACHE_L1_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL),
+                        RedisCache.from_url(REDIS_URL, ttl=CACHE_TTL))
+else:
+    cache = LRUCache(max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL)
+
+TRANSLATION_BATCH_MAX_ITEMS = int(os.environ.get('TRANSLATION_BATCH_MAX_ITEMS', 200))
+DICTIONARY_FILE_MIMETYPES = {"ndjson": "application/x-ndjson", "jsonl": "application/x-ndjson", "csv": "text/csv"}
+
+registry.add_collector(lambda: cache_metrics({"translation": cache, "guidance": guidance_cache,
+                                              "identity": identity_cache}))
+registry.add_collector(lambda: coalescing_metrics({"sync": upstream_calls, "async": async_upstream_calls}))
 
 
 @controller.route("/home", methods=["GET"])
@@ -28,6 +58,26 @@ def home():
     return jsonify({"message": "Welcome to home!", "username": username})
 
 
+@controller.route("/stats", methods=["GET"])
+@jwt_required()
+def get_stats():
+    # how well this worker's translation cache and upstream call coalescing are doing
+    return jsonify({"translation_cache": cache.stats(), "guidance_cache": guidance_cache.stats(),
+                    "upstream_calls": upstream_calls.stats(),
+                    "async_upstream_calls": async_upstream_calls.stats(),
+                    "hint_precompute": hint_precomputer.stats(), "identity_cache": identity_cache.stats(),
+                    "password_hashing": hashing_executor.stats()})
+
+
+@controller.route("/metrics", methods=["GET"])
+def get_metrics():
+    # Prometheus text format, for the scraper. Unlike /stats it takes no user JWT on purpose: a scraper has none,
+    # and the metrics hold counts per endpoint, not user data. METRICS_TOKEN closes it to anyone else.
+    if not metrics_authorized():
+        return jsonify({"error": "Missing or wrong metrics token"}), 401
+    return metrics_response()
+
+
 @controller.route("/conversation", methods=["POST"])
 @jwt_required()
 def create_conversation():
@@ -58,23 +108,58 @@ def get_conversations():
 @controller.route("/conversation/<conversation_id>", methods=["GET"])
 @jwt_required()
 def get_conversation(conversation_id):
+    # ?limit=N newest messages, ?before=<cursor> older ones, ?after=<cursor> newer ones
     conversation_object = find_conversation_by_conversation_id(conversation_id)
+    if isinstance(conversation_object, tuple):
+        return conversation_object
 
     name = conversation_object.conversation_name
     beginning_date = conversation_object.beginning_date
     last_messaged_date = conversation_object.last_messaged_date
     language = conversation_object.language
 
-    conversation_messages = conversation_object.messages
+    limit = request.args.get("limit", MESSAGES_PAGE_DEFAULT_LIMIT, type=int)
+    if not 1 <= limit <= MESSAGES_PAGE_MAX_LIMIT:
+        return jsonify({"error": f"limit must be between 1 and {MESSAGES_PAGE_MAX_LIMIT}"}), 400
+    try:
+        conversation_messages, has_older, has_newer = find_messages_page(
+            conversation_id, limit, before=request.args.get("before"), after=request.args.get("after"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     messages_data = [{"id": message.id, "is_user": message.is_user, "message_text": message.message_text,
                       "timestamp": message.timestamp} for message in conversation_messages]
 
+    cursors = {"before": None, "after": None}
+    if conversation_messages:
+        cursors["before"] = encode_message_cursor(conversation_messages[0].timestamp, conversation_messages[0].id)
+        cursors["after"] = encode_message_cursor(conversation_messages[-1].timestamp, conversation_messages[-1].id)
+
     return jsonify({"id": conversation_id, "conversation_name": name, "beginning_date": beginning_date,
-                    "last_message_date": last_messaged_date, "language": language, "messages": messages_data})
+                    "last_message_date": last_messaged_date, "language": language, "messages": messages_data,
+                    "cursors": cursors, "has_older": has_older, "has_newer": has_newer})
+
+
+@controller.route("/conversation/<conversation_id>/export", methods=["GET"])
+@jwt_required()
+def export_conversation(conversation_id):
+    # every message as one JSON object per line (NDJSON), written while it is read from the database
+    conversation_object = find_conversation_by_conversation_id(conversation_id)
+    if isinstance(conversation_object, tuple):
+        return conversation_object
+
+    def generate():
+        for message in iter_conversation_messages(conversation_id):
+            yield current_app.json.dumps({"id": message.id, "is_user": message.is_user,
+                                          "message_text": message.message_text,
+                                          "timestamp": message.timestamp}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson",
+                    headers={"Content-Disposition": f"attachment; filename=conversation-{conversation_id}.ndjson"})
 
 
 @controller.route("/response/<conversation_id>", methods=["POST"])
 @jwt_required()
+@unit_of_work
 def get_chat_response(conversation_id):
     # save to database stt
     # assume that this json looks like this: {TTS_message='blabla'}
@@ -82,44 +167,114 @@ def get_chat_response(conversation_id):
     stt_message_text = data_from_stt.get("TTS_message", None)
     if not stt_message_text:
         return jsonify({"error": "I have technical problem with answer, please repeat"}), 400
-    save_message_to_database(stt_message_text, conversation_id, True, None)
-
-    # Api messages preparation
-    language, user_message, sum_up_sentence = prepare_api_payload(conversation_id)
-    messages_for_api = message_for_api(language, user_message, sum_up_sentence)
+    messages_for_api = prepare_chat_request(stt_message_text, conversation_id)
 
     # Api
     openai.api_key = OPENAI_TOKEN
-    response = openai.ChatCompletion.create(model="gpt-3.5-turbo", messages=messages_for_api)
+    if wants_stream():
+        # until the first chunk, _stream_chat_response reads the rest
+        with track_upstream("openai", "chat_completion_stream"):
+            response = openai.ChatCompletion.create(model="gpt-3.5-turbo", messages=messages_for_api, stream=True)
+        return Response(stream_with_context(_stream_chat_response(response, conversation_id)),
+                        mimetype="text/event-stream", headers={"Cache-Control": "no-cache",
+                                                               "X-Accel-Buffering": "no"})
+
+    with track_upstream("openai", "chat_completion"):
+        response = openai.ChatCompletion.create(model="gpt-3.5-turbo", messages=messages_for_api)
 
     # get chat response
+    chat_message_answer = save_chat_response(chat_response_content(response), conversation_id)
+    # both messages of the turn in one transaction, before the hint precompute reads them
+    commit_unit_of_work()
+    if chat_message_answer:
+        schedule_hint_precompute(current_app._get_current_object(), conversation_id)
+    response_for_user = chat_message_answer or "I have technical problem with answer, please repeat"
+
+    return jsonify({"chat_message": response_for_user})
+
+
+def wants_stream():
+    # ?stream=1/true/yes/on asks for server-sent events and ?stream=0/false/no/off for JSON,
+    # without the parameter the Accept header decides
+    stream = request.args.get("stream")
+    if stream is not None:
+        return stream.strip().lower() in ("1", "true", "yes", "on")
+    return "text/event-stream" in request.headers.get("Accept", "")
+
+
+def _stream_chat_response(response, conversation_id):
+    # send the answer to TTS piece by piece as server-sent events, save it once it is complete
+    parser = AnswerStreamParser()
+    chat_message_content = []
     try:
-        chat_message_json = json.loads(response["choices"][0]["message"]["content"])
-        chat_message_answer = chat_message_json.get("answer", None)
-        chat_message_summary = chat_message_json.get("summary", None)
-
-        # response for user and save to database
-        if chat_message_answer:
-            response_for_user = chat_message_answer
-            save_message_to_database(chat_message_answer, conversation_id, False, chat_message_summary)
-        else:
-            response_for_user = "I have technical problem with answer, please repeat"
+        for chunk in response:
+            content = chunk["choices"][0]["delta"].get("content")
+            if not content:
+                continue
+            chat_message_content.append(content)
+            if answer_part := parser.feed(content):
+                yield format_sse({"chat_message": answer_part})
+    except (KeyError, IndexError):
+        pass
+    except openai.error.OpenAIError:
+        # the connection broke off mid-answer, an incomplete answer is not saved
+        yield format_sse({"chat_message": "I have technical problem with answer, please repeat"}, event="error")
+        return
+
+    chat_message_answer = save_chat_response("".join(chat_message_content), conversation_id)
+    if chat_message_answer:
+        schedule_hint_precompute(current_app._get_current_object(), conversation_id)
+        yield format_sse({"chat_message": chat_message_answer}, event="done")
+    else:
+        yield format_sse({"chat_message": "I have technical problem with answer, please repeat"}, event="error")
+
+
+def chat_response_content(response):
+    try:
+        return response["choices"][0]["message"]["content"]
+    except (KeyError, IndexError):
+        return None
 
-    except (KeyError, json.JSONDecodeError, ValueError):
-        response_for_user = "I have technical problem with answer, please repeat"
 
-    return jsonify({"chat_message": response_for_user})
+def parse_translation_request(to_translate_data):
+    return (to_translate_data["word_to_translate"], to_translate_data["sentence_to_translate"],
+            to_translate_data["source_lang"], to_translate_data["target_lang"])
+
+
+def parse_dictionary_request(to_dictionary_data):
+    return (to_dictionary_data["word_to_dictionary"], to_dictionary_data["contex_sentence"],
+            to_dictionary_data["source_lang"], to_dictionary_data["target_lang"])
+
+
+def translation_cache_key(word, source_lang, target_lang):
+    return f'{word}_{source_lang}_{target_lang}'
+
+
+def find_cached_translation(word_to_translate, sentence_to_translate, source_lang, target_lang):
+    value = cache.get(translation_cache_key(word_to_translate, source_lang, target_lang))
+    # the key only has the word, the cached sentence translation may belong to another sentence
+    if value and value.get("sentence_to_translate") == sentence_to_translate:
+        return value
+    return None
+
+
+def cache_translation(word_to_translate, sentence_to_translate, source_lang, target_lang, translated_word,
+                      translated_sentence):
+    value = {"translated_word": translated_word, "translated_sentence": translated_sentence,
+             "sentence_to_translate": sentence_to_translate}
+    cache.set(translation_cache_key(word_to_translate, source_lang, target_lang), value)
+    return value
 
 
 @controller.route("/hint/<conversation_id>", methods=["POST"])
 @jwt_required()
 def get_hint(conversation_id):
     try:
-        last_message, summary = prepare_messages(conversation_id)
-        guidance_message = [{"role": "user",
-                             "content": f"{summary}, give me only one sentence example answer to this '{last_message}'"}]
+        last_message_id, last_message, summary = prepare_guidance_context(conversation_id)
+        record_hint_request(conversation_id, last_message_id)
+        guidance_message = build_hint_message(last_message, summary)
         # get chat_response
-        guidance_response = call_chat_response(guidance_message)
+        guidance_response = call_guidance_response(conversation_id, last_message_id, "hint", guidance_message)
         return jsonify({"guidance_response": guidance_response}), 200
 
     except ValueError as e:
@@ -132,7 +287,7 @@ def get_hint(conversation_id):
 @jwt_required()
 def get_advanced_version(conversation_id):
     try:
-        last_message, summary = prepare_messages(conversation_id)
+        last_message_id, last_message, summary = prepare_guidance_context(conversation_id)
 
         # handle invalid input
         user_attempt = request.get_json(silent=True)
@@ -141,10 +296,10 @@ def get_advanced_version(conversation_id):
 
         # create message to chat
         user_attempt_message = user_attempt["chat_message"]
-        guidance_message = [{"role": "user",
-                             "content": f"{summary}, this is last message '{last_message}', transform this '{user_attempt_message}' to make it more linguistically advanced"}]
+        guidance_message = build_advanced_version_message(last_message, summary, user_attempt_message)
         # get chat_response
-        guidance_response = call_chat_response(guidance_message)
+        guidance_response = call_guidance_response(conversation_id, last_message_id, "advanced_version",
+                                                   guidance_message, user_attempt_message)
         return jsonify({"guidance_response": guidance_response}), 200
 
     except ValueError as e:
@@ -155,24 +310,18 @@ def get_advanced_version(conversation_id):
 
 @controller.route("/translation", methods=["POST"])
 @jwt_required()
+@unit_of_work
 def get_translation():
     try:
-        to_translate_data = request.get_json()
-        word_to_translate = to_translate_data["word_to_translate"]
-        sentence_to_translate = to_translate_data["sentence_to_translate"]
-        source_lang = to_translate_data["source_lang"]
-        target_lang = to_translate_data["target_lang"]
-
-        key = f'{word_to_translate}_{source_lang}_{target_lang}'
-        value = cache.get(key)
+        word_to_translate, sentence_to_translate, source_lang, target_lang = parse_translation_request(
+            request.get_json())
+        value = find_cached_translation(word_to_translate, sentence_to_translate, source_lang, target_lang)
 
         if not value:
-            translated_word, translated_sentence = get_translate_deepl(word_to_translate, sentence_to_translate,
-                                                                       source_lang, target_lang)
-
-            value = {"translated_word": translated_word, "translated_sentence": translated_sentence,
-                     "sentence_to_translate": sentence_to_translate}
-            cache.set(key, value)
+            translated_word, translated_sentence = translate_with_memory(word_to_translate, sentence_to_translate,
+                                                                         source_lang, target_lang)
+            value = cache_translation(word_to_translate, sentence_to_translate, source_lang, target_lang,
+                                      translated_word, translated_sentence)
 
         return jsonify(value), 200
 
@@ -181,28 +330,72 @@ def get_translation():
             {"error": "Incorrect data format. Make sure you press the word and try again."}), 400
 
 
+@controller.route("/translation/batch", methods=["POST"])
+@jwt_required()
+@unit_of_work
+def get_translation_batch():
+    # assume that this json looks like this: {items: [{word_to_translate, sentence_to_translate, source_lang,
+    # target_lang}, ...]} and answer with translations in the same order
+    try:
+        to_translate = [parse_translation_request(item) for item in request.get_json()["items"]]
+    except (KeyError, TypeError):
+        return jsonify(
+            {"error": "Incorrect data format. Make sure you press the word and try again."}), 400
+    if len(to_translate) > TRANSLATION_BATCH_MAX_ITEMS:
+        return jsonify({"error": f"Too many words, send at most {TRANSLATION_BATCH_MAX_ITEMS} at once."}), 400
+
+    unique_items = list(dict.fromkeys(to_translate))
+    keys = {item: translation_cache_key(item[0], item[2], item[3]) for item in unique_items}
+    cached_values = cache.get_many(keys.values())
+
+    values = {}
+    missing_by_langs = {}
+    for item in unique_items:
+        word_to_translate, sentence_to_translate, source_lang, target_lang = item
+        value = cached_values.get(keys[item])
+        if value and value.get("sentence_to_translate") == sentence_to_translate:
+            values[item] = value
+        else:
+            missing_by_langs.setdefault((source_lang, target_lang), []).append(item)
+
+    new_values = {}
+    for (source_lang, target_lang), missing_items in missing_by_langs.items():
+        texts_to_translate = [text for word, sentence, _, _ in missing_items for text in (word, sentence)]
+        translations = translate_many_with_memory(texts_to_translate, source_lang, target_lang)
+        for item in missing_items:
+            word_to_translate, sentence_to_translate, _, _ = item
+            values[item] = {"translated_word": translations[word_to_translate],
+                            "translated_sentence": translations[sentence_to_translate],
+                            "sentence_to_translate": sentence_to_translate}
+            new_values[keys[item]] = values[item]
+    cache.set_many(new_values)
+
+    return jsonify({"translations": [values[item] for item in to_translate]}), 200
+
+
 @controller.route("/dictionary", methods=["POST"])
 @jwt_required()
+@unit_of_work
 def add_to_dictionary():
     try:
-        to_dictionary_data = request.get_json()
-        word_to_dictionary = to_dictionary_data["word_to_dictionary"]
-        contex_sentence = to_dictionary_data["contex_sentence"]
-        source_lang = to_dictionary_data["source_lang"]
-        target_lang = to_dictionary_data["target_lang"]
+        word_to_dictionary, contex_sentence, source_lang, target_lang = parse_dictionary_request(request.get_json())
 
-        key = f'{word_to_dictionary}_{source_lang}_{target_lang}'
+        key = translation_cache_key(word_to_dictionary, source_lang, target_lang)
         value = cache.get(key)
+        cached = bool(value) and value.get("contex_sentence") == contex_sentence
 
-        if not value:
-            translated_word, translated_contex_sentence = get_translate_deepl(word_to_dictionary, contex_sentence,
-                                                                              source_lang, target_lang)
-
-            save_to_db_dictionary(word_to_dictionary, translated_word, contex_sentence, source_lang, target_lang,
-                                  translated_contex_sentence)
-
+        if not cached:
+            translated_word, translated_contex_sentence = translate_with_memory(word_to_dictionary, contex_sentence,
+                                                                                source_lang, target_lang)
             value = {"translated_word": translated_word, "translated_contex_sentence": translated_contex_sentence,
                      "contex_sentence": contex_sentence}
+
+        # saved for every user who adds it, the cache only spares the translation
+        save_to_db_dictionary(word_to_dictionary, value["translated_word"], contex_sentence, source_lang, target_lang,
+                              value["translated_contex_sentence"])
+        # cache only what was saved
+        commit_unit_of_work()
+        if not cached:
             cache.set(key, value)
 
         return jsonify(value), 200
@@ -212,11 +405,80 @@ def add_to_dictionary():
             {"error": "Incorrect data format. Make sure you provide the word and try again."}), 400
 
 
+@controller.route("/dictionary/search", methods=["GET"])
+@jwt_required()
+def search_in_dictionary():
+    # ?q=words, optional ?source_lang=&target_lang=, pages of ?limit=N entries: ?page=1, 2, ...
+    limit = request.args.get("limit", DICTIONARY_SEARCH_DEFAULT_LIMIT, type=int)
+    page = request.args.get("page", 1, type=int)
+    if not 1 <= limit <= DICTIONARY_SEARCH_MAX_LIMIT:
+        return jsonify({"error": f"limit must be between 1 and {DICTIONARY_SEARCH_MAX_LIMIT}"}), 400
+    if page < 1:
+        return jsonify({"error": "page must be 1 or more"}), 400
+    try:
+        entries, has_more = search_dictionary(get_user_id_by_token_identify(), request.args.get("q", ""),
+                                              request.args.get("source_lang"), request.args.get("target_lang"),
+                                              limit=limit, offset=(page - 1) * limit)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    results = [{"id": entry.id, "word_to_dictionary": entry.word_to_dictionary,
+                "translated_word": entry.translated_word, "contex_sentence": entry.contex_sentence,
+                "translated_contex_sentence": entry.translated_contex_sentence, "source_lang": entry.source_lang,
+                "target_lang": entry.target_lang} for entry in entries]
+    return jsonify({"results": results, "page": page, "limit": limit, "has_more": has_more})
+
+
+@controller.route("/dictionary/export", methods=["GET"])
+@jwt_required()
+def export_dictionary():
+    # ?format=ndjson (default, also jsonl) or csv, written while it is read from the database
+    file_format = request.args.get("format", "ndjson")
+    if file_format not in DICTIONARY_FILE_MIMETYPES:
+        return jsonify({"error": f"format must be one of {', '.join(DICTIONARY_FILE_MIMETYPES)}"}), 400
+    entries = iter_dictionary_entries(get_user_id_by_token_identify())
+
+    def generate_ndjson():
+        for entry in entries:
+            yield current_app.json.dumps(dict(zip(DICTIONARY_FILE_COLUMNS, entry))) + "\n"
+
+    def generate_csv():
+        line = io.StringIO()
+        writer = csv.writer(line)
+        for row in itertools.chain([DICTIONARY_FILE_COLUMNS], entries):
+            writer.writerow(row)
+            yield line.getvalue()
+            line.seek(0)
+            line.truncate()
+
+    generate = generate_csv if file_format == "csv" else generate_ndjson
+    return Response(stream_with_context(generate()), mimetype=DICTIONARY_FILE_MIMETYPES[file_format],
+                    headers={"Content-Disposition": f"attachment; filename=dictionary.{file_format}"})
+
+
+@controller.route("/dictionary/import", methods=["POST"])
+@jwt_required()
+def import_to_dictionary():
+    # the body is an export of /dictionary/export, CSV with ?format=csv or a text/csv Content-Type, else NDJSON;
+    # missing translations are filled in
+    file_format = request.args.get("format", "csv" if request.mimetype == "text/csv" else "ndjson")
+    if file_format not in DICTIONARY_FILE_MIMETYPES:
+        return jsonify({"error": f"format must be one of {', '.join(DICTIONARY_FILE_MIMETYPES)}"}), 400
+    try:
+        rows = parse_dictionary_file(request.get_data(as_text=True), file_format)
+    except csv.Error as e:
+        return jsonify({"error": f"Invalid CSV: {e}"}), 400
+    if len(rows) > DICTIONARY_IMPORT_MAX_ROWS:
+        return jsonify({"error": f"Too many rows, import at most {DICTIONARY_IMPORT_MAX_ROWS} at once."}), 400
+
+    return jsonify(import_dictionary(get_user_id_by_token_identify(), rows)), 200
+
+
 @controller.errorhandler(deepl.DeepLException)
-def handle_deepl_exception():
+def handle_deepl_exception(e):
     return jsonify({"error": "Translation mistake, try later"}), 500
 
 
 @controller.errorhandler(sqlalchemy.exc.SQLAlchemyError)
-def handle_sqlalchemy_exception():
+def handle_sqlalchemy_exception(e):
     return jsonify({"error": "Database error. I cannot save this word to the dictionary"}), 500
@@ -0,0 +1,224 @@
+import bisect
+import contextlib
+import hmac
+import os
+import threading
+import time
+from flask import g, has_request_context, request, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from flask_sqlalchemy.session import Session
+
+# when set, /metrics answers only requests with "Authorization: Bearer <METRICS_TOKEN>"; unset, it is public
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+# seconds; upstream calls take up to DEEPL_TIMEOUT and OpenAI's own timeout
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+class Counter:
+    """A Prometheus counter, one value per combination of label values."""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values = {}  # label values -> count
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            values = dict(self.values)
+        for key, value in values.items():
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    """A Prometheus histogram: counts per bucket, sum and count, per combination of label values."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self.values = {}  # label values -> [counts per bucket and +Inf, sum]
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                counts = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[bucket] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self.lock:
+            values = {key: list(counts) for key, counts in self.values.items()}
+        for key, counts in values.items():
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for upper_bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, "le": str(upper_bound)}, cumulative
+            yield f"{self.name}_sum", labels, counts[-1]
+            yield f"{self.name}_count", labels, cumulative
+
+
+class Registry:
+    """The metrics of this process and collectors that read other counters, e.g. cache stats, when scraped."""
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        """`collector()` returns [(name, kind, documentation, [(labels, value)])]."""
+        self.collectors.append(collector)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        families = [(metric.name, metric.kind, metric.documentation, metric.samples()) for metric in self.metrics]
+        for collector in self.collectors:
+            for name, kind, documentation, samples in collector():
+                families.append((name, kind, documentation, [(name, labels, value) for labels, value in samples]))
+        lines = []
+        for name, kind, documentation, samples in families:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{sample_name}{_format_labels(labels)} {value}" for sample_name, labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+request_duration = registry.histogram("http_request_duration_seconds", "Time to answer a request, until the "
+                                      "response headers for streamed responses.", ("method", "endpoint", "status"))
+request_queries = registry.histogram("http_request_db_queries", "Database queries made by one request.",
+                                     ("endpoint",), QUERY_COUNT_BUCKETS)
+upstream_duration = registry.histogram("upstream_request_duration_seconds", "OpenAI and Deepl call latency.",
+                                       ("provider", "operation"))
+upstream_errors = registry.counter("upstream_errors_total", "Failed OpenAI and Deepl calls.",
+                                   ("provider", "operation", "error"))
+db_queries = registry.counter("db_queries_total", "Database queries.")
+db_commit_duration = registry.histogram("db_commit_duration_seconds", "Time to flush and commit a session.")
+
+
+@contextlib.contextmanager
+def track_upstream(provider, operation):
+    """Time the call to `provider` made inside the block and count it as an error if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        upstream_errors.inc(provider=provider, operation=operation, error=type(e).__name__)
+        raise
+    finally:
+        upstream_duration.observe(time.perf_counter() - start, provider=provider, operation=operation)
+
+
+def cache_metrics(caches):
+    """Collector for {name: cache} of LRUCache and TieredCache objects, from their own counters."""
+    samples = {"hits": [], "misses": [], "evictions": [], "entries": []}
+    for name, cache in caches.items():
+        stats = cache.stats()
+        if "l1" in stats:
+            # TieredCache: the process' L1 and the shared L2 behind it
+            samples["hits"].append(({"cache": name, "level": "l2"}, stats["l2_hits"]))
+            samples["misses"].append(({"cache": name, "level": "l2"}, stats["l2_misses"]))
+            stats = stats["l1"]
+        labels = {"cache": name, "level": "l1"}
+        for key in samples:
+            samples[key].append((labels, stats[key]))
+    return [("cache_hits_total", "counter", "Cache lookups that found a value.", samples["hits"]),
+            ("cache_misses_total", "counter", "Cache lookups that found nothing.", samples["misses"]),
+            ("cache_evictions_total", "counter", "Values evicted to stay within the cache limits.",
+             samples["evictions"]),
+            ("cache_entries", "gauge", "Values in the cache.", samples["entries"])]
+
+
+def coalescing_metrics(coalescers):
+    """Collector for {name: SingleFlight} objects."""
+    stats = {name: coalescer.stats() for name, coalescer in coalescers.items()}
+    return [("upstream_calls_total", "counter", "OpenAI and Deepl calls requested.",
+             [({"coalescer": name}, value["calls"]) for name, value in stats.items()]),
+            ("upstream_calls_coalesced_total", "counter", "Calls answered by an identical call already running.",
+             [({"coalescer": name}, value["coalesced"]) for name, value in stats.items()])]
+
+
+def metrics_authorized():
+    if not METRICS_TOKEN:
+        return True
+    return hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {METRICS_TOKEN}")
+
+
+def metrics_response():
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+def _start_request_timer():
+    g.metrics_start = time.perf_counter()
+    g.db_queries = 0
+
+
+def _observe_request(response):
+    start = g.pop("metrics_start", None)
+    if start is not None:
+        # the URL rule, not the URL, keeps one series per endpoint
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        request_duration.observe(time.perf_counter() - start, method=request.method, endpoint=endpoint,
+                                 status=str(response.status_code))
+        request_queries.observe(g.get("db_queries", 0), endpoint=endpoint)
+    return response
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    db_queries.inc()
+    if has_request_context():
+        g.db_queries = g.get("db_queries", 0) + 1
+
+
+@event.listens_for(Session, "before_commit")
+def _start_commit_timer(session):
+    session.info["commit_start"] = time.perf_counter()
+
+
+@event.listens_for(Session, "after_commit")
+def _observe_commit(session):
+    start = session.info.pop("commit_start", None)
+    if start is not None:
+        db_commit_duration.observe(time.perf_counter() - start)
+
+
+def init_app(app):
+    app.before_request(_start_request_timer)
+    app.after_request(_observe_request)
@@ -0,0 +1,125 @@
+import logging
+import click
+from flask.cli import AppGroup
+from sqlalchemy.schema import CreateColumn
+from . import db
+from .search import DICTIONARY_SEARCH_TABLE, create_dictionary_search, has_dictionary_search
+
+logger = logging.getLogger(__name__)
+DELETE_BATCH_SIZE = 500  # ids per DELETE, below the bound parameter limit of every database
+
+
+def missing_columns(connection):
+    """[(table, column)] of the columns the models define that the existing tables do not have yet."""
+    inspector = db.inspect(connection)
+    missing = []
+    for table in db.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        missing.extend((table, column) for column in table.columns if column.name not in existing)
+    return missing
+
+
+def missing_indexes(connection):
+    """[(table, index)] of the indexes the models define that the database does not have yet.
+
+    create_all() only creates the indexes of new tables.
+    """
+    inspector = db.inspect(connection)
+    missing = []
+    for table in db.metadata.sorted_tables:
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        missing.extend((table, index) for index in table.indexes if index.name not in existing)
+    return missing
+
+
+def find_duplicate_rows(connection, table, columns):
+    """Rows that would break a unique index on `columns`, all but the newest of each group.
+
+    A unique index lets rows with a NULL in its columns repeat, so they are never duplicates.
+    """
+    not_null = [column.is_not(None) for column in columns]
+    newest_ids = db.select(db.func.max(table.c.id)).where(*not_null).group_by(*columns)
+    return connection.execute(db.select(table.c.id, *columns)
+                              .where(*not_null, table.c.id.not_in(newest_ids))
+                              .order_by(table.c.id)).all()
+
+
+def _search_table_missing(connection):
+    return has_dictionary_search(connection) and not db.inspect(connection).has_table(DICTIONARY_SEARCH_TABLE)
+
+
+def pending_changes(connection):
+    """Descriptions of what upgrade_schema would change."""
+    changes = [f"add column {column.name} to {table.name}" for table, column in missing_columns(connection)]
+    changes += [f"create index {index.name} on {table.name}" for table, index in missing_indexes(connection)]
+    if _search_table_missing(connection):
+        changes.append(f"create search table {DICTIONARY_SEARCH_TABLE}")
+    return changes
+
+
+def upgrade_schema(connection, dry_run=False):
+    """Add the columns, indexes and the search table the models define to an existing database, in one transaction.
+
+    Before a unique index is created, the rows it would reject are deleted and logged, the newest of each group
+    stays. Returns [(change, removed rows)]; with `dry_run` nothing is changed.
+    """
+    report = []
+    for table, column in missing_columns(connection):
+        if not dry_run:
+            # a NOT NULL column needs its server_default here, to fill the rows already in the table
+            connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN "
+                                       f"{CreateColumn(column).compile(dialect=connection.dialect)}")
+        report.append((f"add column {column.name} to {table.name}", []))
+    for table, index in missing_indexes(connection):
+        duplicates = find_duplicate_rows(connection, table, list(index.columns)) if index.unique else []
+        for row in duplicates:
+            logger.warning("%s %s row %s, a duplicate for %s", "Would remove" if dry_run else "Removing", table.name,
+                           row.id, {key: value for key, value in row._mapping.items() if key != "id"})
+        if not dry_run:
+            duplicate_ids = [row.id for row in duplicates]
+            for start in range(0, len(duplicate_ids), DELETE_BATCH_SIZE):
+                batch = duplicate_ids[start:start + DELETE_BATCH_SIZE]
+                connection.execute(table.delete().where(table.c.id.in_(batch)))
+            index.create(connection)
+        report.append((f"create index {index.name} on {table.name}", duplicates))
+    if _search_table_missing(connection):
+        if not dry_run:
+            create_dictionary_search(connection)
+        report.append((f"create search table {DICTIONARY_SEARCH_TABLE}", []))
+    return report
+
+
+schema_cli = AppGroup("schema", help="Changes to an existing database after a deploy.")
+
+
+@schema_cli.command("upgrade")
+@click.option("--dry-run", is_flag=True, help="only show what would change and which rows would be removed")
+def upgrade(dry_run):
+    """Create the columns, indexes and tables added to the models since the database was created.
+
+    Run it once per deploy, from one process; a new unique index first removes the rows it would reject.
+    """
+    if dry_run:
+        with db.engine.connect() as connection:
+            report = upgrade_schema(connection, dry_run=True)
+    else:
+        db.create_all()
+        with db.engine.begin() as connection:
+            report = upgrade_schema(connection)
+    for change, removed_rows in report:
+        click.echo(f"{'would ' if dry_run else ''}{change}"
+                   + (f", removing {len(removed_rows)} duplicate rows" if removed_rows else ""))
+    if not report:
+        click.echo("The database is up to date")
+
+
+def warn_about_pending_changes():
+    with db.engine.connect() as connection:
+        changes = pending_changes(connection)
+    if changes:
+        logger.warning("The database schema is behind the models (%s), run: flask --app main schema upgrade",
+                       "; ".join(changes))
+
+
+def init_app(app):
+    app.cli.add_command(schema_cli)
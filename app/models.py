@@ -22,6 +22,8 @@ class Conversation(db.Model):
 
 
 class Message(db.Model):
+    # the last messages of a conversation, see service.find_last_messages
+    __table_args__ = (db.Index('ix_message_conversation_timestamp_id', 'conversation_id', 'timestamp', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
     conversation_id = db.Column(db.Integer, db.ForeignKey('conversation.id', ondelete='CASCADE'), nullable=False)
     is_user = db.Column(db.Boolean, default=False, nullable=False)
@@ -31,6 +33,12 @@ class Message(db.Model):
 
 
 class Dictionary(db.Model):
+    # translate_with_memory looks up earlier translations by word or by sentence; a user has a word once per
+    # language pair, see service.save_to_db_dictionary
+    __table_args__ = (db.Index('ix_dictionary_word_langs', 'word_to_dictionary', 'source_lang', 'target_lang'),
+                      db.Index('ix_dictionary_sentence_langs', 'contex_sentence', 'source_lang', 'target_lang'),
+                      db.Index('uq_dictionary_user_word_langs', 'user_id', 'word_to_dictionary', 'source_lang',
+                               'target_lang', unique=True))
     id = db.Column(db.Integer, primary_key=True)
     word_to_dictionary = db.Column(db.String(50))
     translated_word = db.Column(db.String(50))
@@ -38,4 +46,17 @@ class Dictionary(db.Model):
     translated_contex_sentence = db.Column(db.String(200))
     user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
     source_lang = db.Column(db.String(50))
-    target_lang = db.Column(db.String(50))
\ No newline at end of file
+    target_lang = db.Column(db.String(50))
+    # translations the user brought in an import, they never reach the shared translation memory
+    imported = db.Column(db.Boolean, default=False, nullable=False, server_default=db.false())
+
+
+class TranslationMemory(db.Model):
+    __table_args__ = (db.UniqueConstraint('source_text', 'source_lang', 'target_lang',
+                                          name='uq_translation_memory_text_langs'),)
+    id = db.Column(db.Integer, primary_key=True)
+    source_text = db.Column(db.String(500), nullable=False)  # normalized, see service.normalize_text
+    source_lang = db.Column(db.String(50), nullable=False)
+    target_lang = db.Column(db.String(50), nullable=False)
+    translated_text = db.Column(db.String(500), nullable=False)
+    created_date = db.Column(db.DateTime, default=datetime.datetime.utcnow)
@@ -0,0 +1,71 @@
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import os
+import threading
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# werkzeug method string with its cost, e.g. "pbkdf2:sha256:600000" or "scrypt:32768:8:1"
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2')
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1)))
+# hashes waiting for a worker before new ones are turned away; every waiting hash holds a request thread, the
+# default lets an ordinary burst of logins wait a moment instead of failing
+PASSWORD_HASH_MAX_QUEUE = int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', 8 * PASSWORD_HASH_WORKERS))
+
+
+class HashingOverloaded(Exception):
+    """Raised when more password hashes are waiting than the executor accepts."""
+    pass
+
+
+class HashingExecutor:
+    """Runs password hashing on a few dedicated threads.
+
+    Hashing is slow on purpose; a burst of logins uses at most `workers` threads' worth of CPU
+    and the endpoints that do not hash keep theirs. Once `max_queue` more hashes are waiting,
+    run() raises HashingOverloaded instead of queueing without bound.
+    """
+
+    def __init__(self, workers, max_queue):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self.slots = threading.BoundedSemaphore(workers + max_queue)
+        self.lock = threading.Lock()
+        self.hashed = 0
+        self.rejected = 0
+
+    def run(self, fn, *args):
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.rejected += 1
+            raise HashingOverloaded("Too many password checks right now")
+        try:
+            return self.executor.submit(fn, *args).result()
+        finally:
+            self.slots.release()
+            with self.lock:
+                self.hashed += 1
+
+    def stats(self):
+        with self.lock:
+            return {"hashed": self.hashed, "rejected": self.rejected}
+
+
+hashing_executor = HashingExecutor(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE)
+
+
+@functools.lru_cache(maxsize=None)
+def _current_method():
+    # the configured method with werkzeug's defaults filled in, as it is written at the start of a hash
+    return generate_password_hash("", method=PASSWORD_HASH_METHOD).split("$", 1)[0]
+
+
+def hash_password(password):
+    return hashing_executor.run(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+
+def check_password(password_hash, password):
+    return hashing_executor.run(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    # hashed with another method or cost than the configured one
+    return password_hash.split("$", 1)[0] != _current_method()
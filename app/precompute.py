@@ -0,0 +1,74 @@
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+from .cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+class Precomputer:
+    """Runs work in the background before anyone asks for its result.
+
+    At most `max_concurrent` jobs run at a time; a job submitted while all slots are busy is
+    dropped, since the request it prepares for can still compute the result itself. A job
+    returns the key its result is ready under, and record_request() counts how often the
+    requests that followed were served by a precomputed result.
+    """
+
+    def __init__(self, max_concurrent=4, max_tracked=10000):
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="precompute")
+        self.slots = threading.BoundedSemaphore(max_concurrent)
+        self.ready = LRUCache(max_entries=max_tracked)
+        self.lock = threading.Lock()
+        self.submitted = 0
+        self.dropped = 0
+        self.completed = 0
+        self.failed = 0
+        self.used = 0
+        self.missed = 0
+
+    def submit(self, fn, *args):
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.dropped += 1
+            return False
+        with self.lock:
+            self.submitted += 1
+        try:
+            self.executor.submit(self._run, fn, args)
+        except RuntimeError:
+            # the executor is shut down, e.g. while the interpreter exits
+            self.slots.release()
+            return False
+        return True
+
+    def _run(self, fn, args):
+        try:
+            ready_key = fn(*args)
+        except Exception:
+            logger.warning("Background precompute failed", exc_info=True)
+            with self.lock:
+                self.failed += 1
+        else:
+            if ready_key is not None:
+                self.ready.set(ready_key, True)
+            with self.lock:
+                self.completed += 1
+        finally:
+            self.slots.release()
+
+    def record_request(self, key, served_from_cache):
+        precomputed = served_from_cache and self.ready.get(key) is not None
+        with self.lock:
+            if precomputed:
+                self.used += 1
+            else:
+                self.missed += 1
+        return precomputed
+
+    def stats(self):
+        with self.lock:
+            requests = self.used + self.missed
+            return {"submitted": self.submitted, "dropped": self.dropped, "completed": self.completed,
+                    "failed": self.failed, "used": self.used, "missed": self.missed,
+                    "use_rate": self.used / requests if requests else 0.0}
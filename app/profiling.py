@@ -0,0 +1,147 @@
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import random
+import threading
+import time
+import click
+from flask import current_app, g, request
+from flask.cli import AppGroup
+
+# fraction of requests to profile, e.g. 0.01; 0 profiles only requests with the admin header
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+# requests with "X-Profile: <PROFILE_ADMIN_TOKEN>" are profiled; unset, the header does nothing
+PROFILE_ADMIN_TOKEN = os.environ.get('PROFILE_ADMIN_TOKEN')
+PROFILE_DIR = os.environ.get('PROFILE_DIR')  # default: profiles/ in the instance folder
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 100))
+PROFILE_HEADER = "X-Profile"
+
+
+class ProfileRing:
+    """Profiles of single requests on disk, the oldest deleted once there are more than `max_files`.
+
+    Each profile is a pstats file, <id>.prof, next to <id>.json with the request it belongs to.
+    """
+
+    def __init__(self, directory, max_files=PROFILE_MAX_FILES):
+        self.directory = directory
+        self.max_files = max_files
+        self.lock = threading.Lock()
+
+    def save(self, profile, meta):
+        os.makedirs(self.directory, exist_ok=True)
+        # ids sort by time, so the ring drops the oldest
+        profile_id = f"{time.time_ns()}-{os.getpid()}-{threading.get_ident()}"
+        profile.dump_stats(os.path.join(self.directory, f"{profile_id}.prof"))
+        with open(os.path.join(self.directory, f"{profile_id}.json"), "w") as meta_file:
+            json.dump({"id": profile_id, **meta}, meta_file)
+        with self.lock:
+            for old_id in self.ids()[:-self.max_files]:
+                for extension in (".prof", ".json"):
+                    try:
+                        os.remove(os.path.join(self.directory, old_id + extension))
+                    except FileNotFoundError:
+                        pass  # another worker removed it
+        return profile_id
+
+    def ids(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-len(".prof")] for name in os.listdir(self.directory) if name.endswith(".prof"))
+
+    def list(self):
+        """Metadata of the profiles, oldest first."""
+        profiles = []
+        for profile_id in self.ids():
+            try:
+                with open(os.path.join(self.directory, f"{profile_id}.json")) as meta_file:
+                    profiles.append(json.load(meta_file))
+            except (FileNotFoundError, ValueError):
+                continue  # being written or removed
+        return profiles
+
+    def top(self, profile_ids, sort="cumulative", limit=20):
+        """The pstats report of `limit` functions over all `profile_ids` together."""
+        output = io.StringIO()
+        stats = pstats.Stats(*(os.path.join(self.directory, f"{profile_id}.prof") for profile_id in profile_ids),
+                             stream=output)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+
+def get_profile_ring():
+    return current_app.extensions["profile_ring"]
+
+
+def should_profile():
+    token = request.headers.get(PROFILE_HEADER)
+    if token is not None and PROFILE_ADMIN_TOKEN and hmac.compare_digest(token, PROFILE_ADMIN_TOKEN):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _start_profile():
+    if not should_profile():
+        return
+    g.profile = cProfile.Profile()
+    g.profile_start = time.perf_counter()
+    g.profile.enable()
+
+
+def _save_profile(response):
+    profile = g.pop("profile", None)
+    if profile is None:
+        return response
+    # a streamed response is profiled until its headers are sent
+    profile.disable()
+    meta = {"endpoint": request.url_rule.rule if request.url_rule else request.path, "method": request.method,
+            "conversation_id": (request.view_args or {}).get("conversation_id"), "status": response.status_code,
+            "duration": round(time.perf_counter() - g.pop("profile_start"), 6), "time": time.time()}
+    response.headers["X-Profile-Id"] = get_profile_ring().save(profile, meta)
+    return response
+
+
+profiles_cli = AppGroup("profiles", help="Request profiles captured by PROFILE_SAMPLE_RATE or the X-Profile header.")
+
+
+@profiles_cli.command("list")
+def list_profiles():
+    """List the captured profiles, oldest first."""
+    for meta in get_profile_ring().list():
+        click.echo(f"{meta['id']}  {meta['method']} {meta['endpoint']}  conversation={meta['conversation_id']}  "
+                   f"status={meta['status']}  {meta['duration'] * 1000:.1f} ms")
+
+
+@profiles_cli.command("top")
+@click.option("--endpoint", help="only profiles of this URL rule, e.g. /response/<conversation_id>")
+@click.option("--conversation", "conversation_id", help="only profiles of this conversation")
+@click.option("--sort", default="cumulative", show_default=True, help="pstats sort key, e.g. tottime")
+@click.option("--limit", default=20, show_default=True, help="functions to show")
+def top_functions(endpoint, conversation_id, sort, limit):
+    """Aggregate the top functions of the matching profiles."""
+    ring = get_profile_ring()
+    profile_ids = [meta["id"] for meta in ring.list()
+                   if (endpoint is None or meta["endpoint"] == endpoint)
+                   and (conversation_id is None or str(meta["conversation_id"]) == conversation_id)]
+    if not profile_ids:
+        raise click.ClickException("No matching profiles")
+    click.echo(f"{len(profile_ids)} profiles")
+    click.echo(ring.top(profile_ids, sort=sort, limit=limit))
+
+
+def _stop_unsaved_profile(exception):
+    # a request that failed before after_request ran
+    profile = g.pop("profile", None)
+    if profile is not None:
+        profile.disable()
+
+
+def init_app(app):
+    app.extensions["profile_ring"] = ProfileRing(PROFILE_DIR or os.path.join(app.instance_path, "profiles"))
+    app.before_request(_start_profile)
+    app.after_request(_save_profile)
+    app.teardown_request(_stop_unsaved_profile)
+    app.cli.add_command(profiles_cli)
@@ -0,0 +1,69 @@
+import re
+from sqlalchemy import event
+from .models import Dictionary
+
+# FTS5 index over the dictionary's words and sentences. It stores no copy of the text (content='dictionary'),
+# the triggers keep it in step with every insert, update and delete of a dictionary row
+DICTIONARY_SEARCH_TABLE = "dictionary_fts"
+DICTIONARY_SEARCH_COLUMNS = ("word_to_dictionary", "translated_word", "contex_sentence", "translated_contex_sentence")
+# bm25 weight of each column: a hit in the word counts more than one in its sentence
+DICTIONARY_SEARCH_WEIGHTS = (10.0, 10.0, 1.0, 1.0)
+
+_columns = ", ".join(DICTIONARY_SEARCH_COLUMNS)
+_new_values = ", ".join(f"new.{column}" for column in DICTIONARY_SEARCH_COLUMNS)
+_old_values = ", ".join(f"old.{column}" for column in DICTIONARY_SEARCH_COLUMNS)
+_delete_old = (f"INSERT INTO {DICTIONARY_SEARCH_TABLE}({DICTIONARY_SEARCH_TABLE}, rowid, {_columns}) "
+               f"VALUES ('delete', old.id, {_old_values});")
+_insert_new = f"INSERT INTO {DICTIONARY_SEARCH_TABLE}(rowid, {_columns}) VALUES (new.id, {_new_values});"
+
+CREATE_DICTIONARY_SEARCH = (
+    # remove_diacritics: "cafe" finds "café"; prefix indexes answer "perr*" without scanning every term
+    f"CREATE VIRTUAL TABLE {DICTIONARY_SEARCH_TABLE} USING fts5({_columns}, content='dictionary', "
+    f"content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    f"CREATE TRIGGER {DICTIONARY_SEARCH_TABLE}_insert AFTER INSERT ON dictionary BEGIN {_insert_new} END",
+    f"CREATE TRIGGER {DICTIONARY_SEARCH_TABLE}_delete AFTER DELETE ON dictionary BEGIN {_delete_old} END",
+    f"CREATE TRIGGER {DICTIONARY_SEARCH_TABLE}_update AFTER UPDATE ON dictionary BEGIN {_delete_old} {_insert_new} END",
+    # index the rows saved before the search existed
+    f"INSERT INTO {DICTIONARY_SEARCH_TABLE}({DICTIONARY_SEARCH_TABLE}) VALUES ('rebuild')",
+)
+
+
+def has_dictionary_search(connection):
+    return connection.dialect.name == "sqlite"
+
+
+def create_dictionary_search(connection):
+    """Create the search index of the dictionary table if it is missing. Only SQLite has FTS5, on other
+    databases service.search_dictionary falls back to LIKE."""
+    if not has_dictionary_search(connection):
+        return
+    exists = connection.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                        (DICTIONARY_SEARCH_TABLE,)).first()
+    if exists:
+        return
+    for statement in CREATE_DICTIONARY_SEARCH:
+        connection.exec_driver_sql(statement)
+
+
+@event.listens_for(Dictionary.__table__, "after_create")
+def _create_search_with_dictionary(target, connection, **kw):
+    create_dictionary_search(connection)
+
+
+@event.listens_for(Dictionary.__table__, "before_drop")
+def _drop_search_with_dictionary(target, connection, **kw):
+    # the triggers go with the dictionary table
+    if has_dictionary_search(connection):
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {DICTIONARY_SEARCH_TABLE}")
+
+
+def search_terms(text):
+    """The words of a search box text, e.g. "el perro!" -> ["el", "perro"]."""
+    return re.findall(r"\w+", text)
+
+
+def match_expression(terms):
+    # every word has to appear, the last one may be unfinished; quoting keeps FTS5 syntax out of user input
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
@@ -1,14 +1,65 @@
-from flask import Blueprint, jsonify
-from flask_jwt_extended import get_jwt_identity
-from .models import User, Conversation, Message, Dictionary
+from flask import Blueprint, jsonify, g, has_request_context
+from flask_jwt_extended import get_jwt_identity, get_jwt
+from .models import User, Conversation, Message, Dictionary, TranslationMemory
 from . import db
+from .database import replica_reads
+from .search import DICTIONARY_SEARCH_TABLE, DICTIONARY_SEARCH_WEIGHTS, has_dictionary_search, search_terms, \
+    match_expression
+from sqlalchemy import event, exc
+from sqlalchemy.dialects import postgresql, sqlite
 import os
 import openai
-import deepl
+from .translator import translator_pool
+from .coalesce import SingleFlight, RedisSingleFlight
+from .cache import LRUCache
+from .precompute import Precomputer
+from .metrics import track_upstream
+import base64
+import csv
+import datetime
+import functools
+import hashlib
+import json
+import redis
+import time
 
 service = Blueprint("service", __name__)
 OPENAI_TOKEN = os.environ.get('OPENAI_TOKEN')
-DEEPL_TOKEN = os.environ.get('DEEPL_TOKEN')
+DEEPL_MAX_TEXTS_PER_REQUEST = 50  # DeepL API limit for one translate request
+COALESCE_REDIS_URL = os.environ.get('COALESCE_REDIS_URL')
+IDENTITY_CACHE_MAX_ENTRIES = int(os.environ.get('IDENTITY_CACHE_MAX_ENTRIES', 10000))
+IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL', 60 * 60))
+MESSAGES_PAGE_DEFAULT_LIMIT = 50
+MESSAGES_PAGE_MAX_LIMIT = 200
+MESSAGES_EXPORT_BATCH_SIZE = 500
+DICTIONARY_SEARCH_DEFAULT_LIMIT = 20
+DICTIONARY_SEARCH_MAX_LIMIT = 100
+DICTIONARY_EXPORT_BATCH_SIZE = 500
+DICTIONARY_IMPORT_MAX_ROWS = int(os.environ.get('DICTIONARY_IMPORT_MAX_ROWS', 50000))
+DICTIONARY_IMPORT_CHUNK_SIZE = int(os.environ.get('DICTIONARY_IMPORT_CHUNK_SIZE', 1000))  # rows per transaction
+# uq_dictionary_user_word_langs, and what saving a word again replaces
+DICTIONARY_KEY_COLUMNS = ("user_id", "word_to_dictionary", "source_lang", "target_lang")
+DICTIONARY_UPDATE_COLUMNS = ("translated_word", "contex_sentence", "translated_contex_sentence", "imported")
+# the columns of an exported dictionary, in CSV order
+DICTIONARY_FILE_COLUMNS = ("word_to_dictionary", "translated_word", "contex_sentence", "translated_contex_sentence",
+                           "source_lang", "target_lang")
+GUIDANCE_CACHE_MAX_ENTRIES = int(os.environ.get('GUIDANCE_CACHE_MAX_ENTRIES', 5000))
+GUIDANCE_CACHE_TTL = int(os.environ.get('GUIDANCE_CACHE_TTL', 60 * 60))
+# generate the hint in the background after every chat answer, so /hint finds it ready
+HINT_PRECOMPUTE = os.environ.get('HINT_PRECOMPUTE', '').lower() in ('1', 'true', 'yes', 'on')
+HINT_PRECOMPUTE_MAX_CONCURRENT = int(os.environ.get('HINT_PRECOMPUTE_MAX_CONCURRENT', 4))
+
+# identical upstream calls running at the same time share one request
+upstream_calls = RedisSingleFlight(redis.StrictRedis.from_url(COALESCE_REDIS_URL)) if COALESCE_REDIS_URL \
+    else SingleFlight()
+
+# username -> user id, for tokens issued before login put the user id in them
+identity_cache = LRUCache(max_entries=IDENTITY_CACHE_MAX_ENTRIES, ttl=IDENTITY_CACHE_TTL)
+
+# hints and advanced versions per conversation, valid until the next message of that conversation
+guidance_cache = LRUCache(max_entries=GUIDANCE_CACHE_MAX_ENTRIES, ttl=GUIDANCE_CACHE_TTL)
+
+hint_precomputer = Precomputer(max_concurrent=HINT_PRECOMPUTE_MAX_CONCURRENT, max_tracked=GUIDANCE_CACHE_MAX_ENTRIES)
 
 
 class ChatAPIError(Exception):
@@ -17,12 +68,21 @@ class ChatAPIError(Exception):
 
 
 def get_user_id_by_token_identify():
+    # tokens from login carry the user id, older ones are looked up once per username
+    user_id = get_jwt().get("user_id")
+    if user_id is not None:
+        return user_id
+
     username = get_jwt_identity()
-    user_object = User.query.filter_by(username=username).first()
-    user_id = user_object.id
+    user_id = identity_cache.get(username)
+    if user_id is None:
+        user_object = User.query.filter_by(username=username).first()
+        user_id = user_object.id
+        identity_cache.set(username, user_id)
     return user_id
 
 
+@replica_reads()
 def find_all_conversations_names_ids():
     user_id = get_user_id_by_token_identify()
     user_conversations = Conversation.query.filter_by(user_id=user_id).all()
@@ -31,6 +91,7 @@ def find_all_conversations_names_ids():
     return conversations_names_and_ids
 
 
+@replica_reads()
 def find_conversation_by_conversation_id(conversation_id):
     conversation_object = Conversation.query.filter_by(id=conversation_id).first()
     if not conversation_object:
@@ -38,23 +99,165 @@ def find_conversation_by_conversation_id(conversation_id):
     return conversation_object
 
 
-def save_message_to_database(message_text, conversation_id, is_user, summary):
-    new_message = Message(message_text=message_text, conversation_id=conversation_id, is_user=is_user, summary=summary)
-    db.session.add(new_message)
-    db.session.commit()
+def unit_of_work(view):
+    """Buffer the writes a view makes through add_to_unit_of_work and commit them once, when it returns.
+
+    A view can commit earlier with commit_unit_of_work, e.g. before work that needs the rows in the
+    database. Database errors roll the writes back and reach the blueprint's SQLAlchemyError handler.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        g.unit_of_work_active = True
+        try:
+            response = view(*args, **kwargs)
+        except exc.SQLAlchemyError:
+            db.session.rollback()
+            raise
+        except Exception:
+            # writes made before the failure used to be committed one by one, keep them
+            commit_unit_of_work()
+            raise
+        finally:
+            g.unit_of_work_active = False
+        commit_unit_of_work()
+        return response
+    return wrapper
+
+
+def add_to_unit_of_work(*objects):
+    db.session.add_all(objects)
+    _commit_or_defer()
+
+
+def _commit_or_defer():
+    if has_request_context() and g.get("unit_of_work_active"):
+        g.unit_of_work_pending = True
+    else:
+        db.session.commit()
+
+
+def commit_unit_of_work():
+    if not (has_request_context() and g.get("unit_of_work_pending")):
+        return
+    g.unit_of_work_pending = False
+    try:
+        db.session.commit()
+    except exc.SQLAlchemyError:
+        db.session.rollback()
+        raise
+
+
+def save_message_to_database(message_text, conversation_id, is_user, summary, timestamp=None):
+    # the time it was said, not the time the unit of work is committed
+    new_message = Message(message_text=message_text, conversation_id=conversation_id, is_user=is_user, summary=summary,
+                          timestamp=timestamp or datetime.datetime.utcnow())
+    add_to_unit_of_work(new_message)
+
+
+def find_last_messages(conversation_id, count):
+    """Return the last `count` messages of the conversation, oldest first, as (id, message_text, summary, is_user)
+    rows, without loading the rest of the conversation."""
+    last_messages = db.session.query(Message.id, Message.message_text, Message.summary, Message.is_user) \
+        .filter(Message.conversation_id == conversation_id) \
+        .order_by(Message.timestamp.desc(), Message.id.desc()).limit(count).all()
+    return last_messages[::-1]
+
+
+def encode_message_cursor(timestamp, message_id):
+    return base64.urlsafe_b64encode(json.dumps([timestamp.isoformat(), message_id]).encode("utf-8")).decode("ascii")
+
+
+def decode_message_cursor(cursor):
+    try:
+        timestamp, message_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.datetime.fromisoformat(timestamp), int(message_id)
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError("Invalid cursor")
+
+
+@replica_reads()
+def find_messages_page(conversation_id, limit, before=None, after=None):
+    """Return (messages, has_older, has_newer) for one page of the conversation, oldest first.
+
+    Pages are found by (timestamp, id) keyset, so reading one costs the same on any page. Without a
+    cursor the page holds the newest messages; `before`/`after` cursors page to older/newer ones.
+    """
+    columns = (Message.id, Message.is_user, Message.message_text, Message.timestamp)
+    query = db.session.query(*columns).filter(Message.conversation_id == conversation_id)
+    if after is not None:
+        timestamp, message_id = decode_message_cursor(after)
+        query = query.filter(db.or_(Message.timestamp > timestamp,
+                                    db.and_(Message.timestamp == timestamp, Message.id > message_id)))
+        messages = query.order_by(Message.timestamp, Message.id).limit(limit + 1).all()
+        return messages[:limit], True, len(messages) > limit
+
+    if before is not None:
+        timestamp, message_id = decode_message_cursor(before)
+        query = query.filter(db.or_(Message.timestamp < timestamp,
+                                    db.and_(Message.timestamp == timestamp, Message.id < message_id)))
+    messages = query.order_by(Message.timestamp.desc(), Message.id.desc()).limit(limit + 1).all()
+    return messages[:limit][::-1], len(messages) > limit, before is not None
+
+
+def iter_conversation_messages(conversation_id, batch_size=MESSAGES_EXPORT_BATCH_SIZE):
+    # all messages, oldest first, read from the database `batch_size` rows at a time
+    columns = (Message.id, Message.is_user, Message.message_text, Message.timestamp)
+    query = db.session.query(*columns).filter(Message.conversation_id == conversation_id) \
+        .order_by(Message.timestamp, Message.id)
+    with replica_reads():
+        yield from query.yield_per(batch_size)
 
 
 def prepare_api_payload(conversation_id):
     conversation_object = find_conversation_by_conversation_id(conversation_id)
-    user_message = conversation_object.messages[-1].message_text  # hi
-    if len(conversation_object.messages) > 1:
-        sum_up_sentence = conversation_object.messages[-2].summary  # greeting.
+    last_messages = find_last_messages(conversation_id, 2)
+    user_message = last_messages[-1].message_text  # hi
+    if len(last_messages) > 1:
+        sum_up_sentence = last_messages[-2].summary  # greeting.
     else:
         sum_up_sentence = None
     language = conversation_object.language
     return language, user_message, sum_up_sentence
 
 
+def build_chat_request(stt_message_text, conversation_id):
+    # the messages for chat, the same payload prepare_api_payload builds once the user message is saved
+    conversation_object = find_conversation_by_conversation_id(conversation_id)
+    last_messages = find_last_messages(conversation_id, 1)
+    sum_up_sentence = last_messages[-1].summary if last_messages else None
+    return message_for_api(conversation_object.language, stt_message_text, sum_up_sentence)
+
+
+def prepare_chat_request(stt_message_text, conversation_id):
+    # save user message and build the messages for chat; read first, so a buffered message is not flushed (and
+    # the database locked) while the chat answers
+    messages_for_api = build_chat_request(stt_message_text, conversation_id)
+    save_message_to_database(stt_message_text, conversation_id, True, None)
+    return messages_for_api
+
+
+def save_chat_response(chat_message_content, conversation_id):
+    # returns the answer saved to database, or None when the chat did not answer in the expected JSON
+    try:
+        chat_message_json = json.loads(chat_message_content)
+        chat_message_answer = chat_message_json.get("answer", None)
+        chat_message_summary = chat_message_json.get("summary", None)
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return None
+
+    if chat_message_answer:
+        save_message_to_database(chat_message_answer, conversation_id, False, chat_message_summary)
+    return chat_message_answer or None
+
+
+@unit_of_work
+def save_chat_turn(stt_message_text, sent_at, chat_message_content, conversation_id):
+    """Save the user message and the chat answer of a turn in one transaction, for callers that wait for the chat
+    outside of a request, like the /async views. Returns the answer like save_chat_response."""
+    save_message_to_database(stt_message_text, conversation_id, True, None, timestamp=sent_at)
+    return save_chat_response(chat_message_content, conversation_id)
+
+
 def message_for_api(language, user_message, sum_up_sentence):
     # User response and sum up sentence if there is one
     sum_up_or_new_conv = ""
@@ -74,49 +277,387 @@ def message_for_api(language, user_message, sum_up_sentence):
 
 def prepare_messages(conversation_id):
     # last message (chat_message) and conversation summary
-    conversation_object = find_conversation_by_conversation_id(conversation_id)
-    if len(conversation_object.messages) >= 2:
-        last_message = conversation_object.messages[-1].message_text
-        # summary = conversation_object.messages[-1].summary
-        summary = getattr(conversation_object.messages[-1].summary, 'summary', None)
+    _, last_message, summary = prepare_guidance_context(conversation_id)
+    return last_message, summary
+
+
+def prepare_guidance_context(conversation_id):
+    # like prepare_messages, with the id of the last message for the guidance cache
+    last_messages = find_last_messages(conversation_id, 2)
+    if len(last_messages) >= 2:
+        last_message_id = last_messages[-1].id
+        last_message = last_messages[-1].message_text
+        # summary = last_messages[-1].summary
+        summary = getattr(last_messages[-1].summary, 'summary', None)
 
     else:
         raise ValueError("Please, start conversation before using hint or sentence advanced correction")
-    return last_message, summary
+    return last_message_id, last_message, summary
+
+
+def find_cached_guidance(conversation_id, last_message_id, kind, user_attempt=""):
+    entry = guidance_cache.get(str(conversation_id))
+    # a message saved by another worker is not seen by this worker's invalidation, the id check catches it
+    if entry and entry["last_message_id"] == last_message_id:
+        return entry["responses"].get(f"{kind}:{normalize_text(user_attempt or '')}")
+    return None
+
+
+def cache_guidance(conversation_id, last_message_id, kind, user_attempt, guidance_response):
+    entry = guidance_cache.get(str(conversation_id))
+    responses = dict(entry["responses"]) if entry and entry["last_message_id"] == last_message_id else {}
+    responses[f"{kind}:{normalize_text(user_attempt or '')}"] = guidance_response
+    guidance_cache.set(str(conversation_id), {"last_message_id": last_message_id, "responses": responses})
+
+
+def invalidate_guidance_cache(conversation_id):
+    guidance_cache.delete(str(conversation_id))
+
+
+def schedule_hint_precompute(app, conversation_id):
+    # called after the chat answer is saved; the hint for that answer lands in the guidance cache
+    if HINT_PRECOMPUTE:
+        hint_precomputer.submit(_precompute_hint, app, conversation_id)
+
+
+def _precompute_hint(app, conversation_id):
+    with app.app_context():
+        last_message_id, last_message, summary = prepare_guidance_context(conversation_id)
+        call_guidance_response(conversation_id, last_message_id, "hint", build_hint_message(last_message, summary))
+    return f"{conversation_id}:{last_message_id}"
+
+
+def record_hint_request(conversation_id, last_message_id):
+    # before the hint is served: was it precomputed and is it still cached?
+    served_from_cache = find_cached_guidance(conversation_id, last_message_id, "hint") is not None
+    return hint_precomputer.record_request(f"{conversation_id}:{last_message_id}", served_from_cache)
+
+
+@event.listens_for(Message, "after_insert")
+def _invalidate_guidance_on_new_message(mapper, connection, message):
+    # covers save_message_to_database and any other code that adds a message
+    invalidate_guidance_cache(message.conversation_id)
+
+
+def call_guidance_response(conversation_id, last_message_id, kind, guidance_message, user_attempt=""):
+    """call_chat_response for a hint or advanced version, answered from the guidance cache when possible."""
+    guidance_response = find_cached_guidance(conversation_id, last_message_id, kind, user_attempt)
+    if guidance_response is None:
+        guidance_response = call_chat_response(guidance_message)
+        cache_guidance(conversation_id, last_message_id, kind, user_attempt, guidance_response)
+    return guidance_response
+
+
+def build_hint_message(last_message, summary):
+    return [{"role": "user",
+             "content": f"{summary}, give me only one sentence example answer to this '{last_message}'"}]
+
+
+def build_advanced_version_message(last_message, summary, user_attempt_message):
+    return [{"role": "user",
+             "content": f"{summary}, this is last message '{last_message}', transform this '{user_attempt_message}' to make it more linguistically advanced"}]
 
 
 def call_chat_response(guidance_message):
     try:
         # call chat to response
-        openai.api_key = OPENAI_TOKEN
-        response = openai.ChatCompletion.create(model="gpt-3.5-turbo", messages=guidance_message)
-
-        # return chat response
-        guidance_response = response["choices"][0]["message"]["content"]
+        key = upstream_call_key("openai", guidance_message)
+        guidance_response = upstream_calls.do(key, lambda: _create_chat_completion(guidance_message))
         return guidance_response
 
     except (KeyError, ValueError) as e:
         raise ChatAPIError("Failed to get a response from the chat") from e
 
 
-def save_to_db_dictionary(word_to_dictionary, translated_word, contex_sentence, source_lang, target_lang,
-                          translated_contex_sentence):
-    user_id = get_user_id_by_token_identify()
-    new_word = Dictionary(user_id=user_id, word_to_dictionary=word_to_dictionary, translated_word=translated_word,
-                          contex_sentence=contex_sentence, source_lang=source_lang, target_lang=target_lang,
-                          translated_contex_sentence=translated_contex_sentence)
-    db.session.add(new_word)
-    db.session.commit()
+def _create_chat_completion(guidance_message):
+    openai.api_key = OPENAI_TOKEN
+    with track_upstream("openai", "chat_completion"):
+        response = openai.ChatCompletion.create(model="gpt-3.5-turbo", messages=guidance_message)
 
+    # return chat response
+    return response["choices"][0]["message"]["content"]
 
-def get_translate_deepl(word_to_translate, sentence_to_translate, source_lang, target_lang):
-    auth_key = DEEPL_TOKEN
-    translator = deepl.Translator(auth_key)
 
-    translated_word = translator.translate_text(word_to_translate, source_lang=source_lang, target_lang=target_lang)
-    translated_sentence = translator.translate_text(sentence_to_translate, source_lang=source_lang,
-                                                    target_lang=target_lang)
+def upstream_call_key(provider, payload):
+    payload_hash = hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+    return f'{provider}:{payload_hash}'
 
-    return translated_word.text, translated_sentence.text
 
+def save_to_db_dictionary(word_to_dictionary, translated_word, contex_sentence, source_lang, target_lang,
+                          translated_contex_sentence):
+    # a word the user saved before gets the new sentence and translations, saving it twice writes one row
+    user_id = get_user_id_by_token_identify()
+    upsert(Dictionary, [{"user_id": user_id, "word_to_dictionary": word_to_dictionary, "translated_word": translated_word,
+                         "contex_sentence": contex_sentence, "source_lang": source_lang, "target_lang": target_lang,
+                         "translated_contex_sentence": translated_contex_sentence, "imported": False}],
+           DICTIONARY_KEY_COLUMNS, DICTIONARY_UPDATE_COLUMNS)
+
+
+@replica_reads()
+def search_dictionary(user_id, text, source_lang=None, target_lang=None, limit=DICTIONARY_SEARCH_DEFAULT_LIMIT,
+                      offset=0):
+    """Return (entries, has_more): the user's dictionary entries matching every word of `text`, best first.
+
+    On SQLite the words are looked up in the FTS5 index (see search.py) and ranked by bm25, so a search reads
+    the matching entries only. Other databases scan the user's entries with LIKE, newest first.
+    """
+    terms = search_terms(text)
+    if not terms:
+        raise ValueError("Search for at least one word")
+
+    query = Dictionary.query.filter(Dictionary.user_id == user_id)
+    if source_lang:
+        query = query.filter(Dictionary.source_lang == source_lang)
+    if target_lang:
+        query = query.filter(Dictionary.target_lang == target_lang)
+
+    if has_dictionary_search(db.session.get_bind(Dictionary)):
+        search_table = db.table(DICTIONARY_SEARCH_TABLE, db.column("rowid"))
+        weights = ", ".join(str(weight) for weight in DICTIONARY_SEARCH_WEIGHTS)
+        query = query.join(search_table, search_table.c.rowid == Dictionary.id) \
+            .filter(db.text(f"{DICTIONARY_SEARCH_TABLE} MATCH :match").bindparams(match=match_expression(terms))) \
+            .order_by(db.text(f"bm25({DICTIONARY_SEARCH_TABLE}, {weights})"), Dictionary.id)
+    else:
+        columns = (Dictionary.word_to_dictionary, Dictionary.translated_word, Dictionary.contex_sentence,
+                   Dictionary.translated_contex_sentence)
+        for term in terms:
+            query = query.filter(db.or_(*(column.ilike(f"%{term}%") for column in columns)))
+        query = query.order_by(Dictionary.id.desc())
+
+    entries = query.offset(offset).limit(limit + 1).all()
+    return entries[:limit], len(entries) > limit
+
+
+def iter_dictionary_entries(user_id, batch_size=DICTIONARY_EXPORT_BATCH_SIZE):
+    # the user's whole dictionary, oldest first, read from the database `batch_size` rows at a time
+    columns = tuple(getattr(Dictionary, column) for column in DICTIONARY_FILE_COLUMNS)
+    query = db.session.query(*columns).filter(Dictionary.user_id == user_id).order_by(Dictionary.id)
+    with replica_reads():
+        yield from query.yield_per(batch_size)
+
+
+def parse_dictionary_file(text, file_format):
+    """Return [(line number, row)] of an exported dictionary; a line that is not JSON gives the row None."""
+    if file_format == "csv":
+        reader = csv.DictReader(text.splitlines())
+        return [(reader.line_num, row) for row in reader]
+
+    rows = []
+    for line_number, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            rows.append((line_number, json.loads(line)))
+        except ValueError:
+            rows.append((line_number, None))
+    return rows
+
+
+def validate_dictionary_row(row):
+    """Return the dictionary columns of an imported row, or raise ValueError saying what is wrong with it."""
+    if not isinstance(row, dict):
+        raise ValueError("Not a JSON object")
+    entry = {}
+    for column in DICTIONARY_FILE_COLUMNS:
+        value = row.get(column)
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f"{column} must be text")
+        value = value.strip() if value else None
+        max_length = Dictionary.__table__.c[column].type.length
+        if value and len(value) > max_length:
+            raise ValueError(f"{column} is longer than {max_length} characters")
+        entry[column] = value or None
+    for column in ("word_to_dictionary", "source_lang", "target_lang"):
+        if not entry[column]:
+            raise ValueError(f"{column} is missing")
+    return entry
+
+
+def fill_missing_translations(entries):
+    # one DeepL batch per language pair for all words and sentences that came without a translation
+    missing_by_langs = {}
+    for entry in entries:
+        for text_column, translation_column in (("word_to_dictionary", "translated_word"),
+                                                ("contex_sentence", "translated_contex_sentence")):
+            if entry[text_column] and not entry[translation_column]:
+                missing_by_langs.setdefault((entry["source_lang"], entry["target_lang"]), []).append(
+                    (entry, text_column, translation_column))
+
+    for (source_lang, target_lang), missing in missing_by_langs.items():
+        translations = translate_many_with_memory([entry[text_column] for entry, text_column, _ in missing],
+                                                  source_lang, target_lang)
+        for entry, text_column, translation_column in missing:
+            entry[translation_column] = translations[entry[text_column]]
+    return sum(len(missing) for missing in missing_by_langs.values())
+
+
+def import_dictionary(user_id, rows, chunk_size=DICTIONARY_IMPORT_CHUNK_SIZE):
+    """Add the valid rows of [(line number, row)] to the user's dictionary and report how it went.
+
+    Rows are upserted with one executemany per transaction of `chunk_size` rows; a failing chunk
+    leaves the chunks before it imported.
+    """
+    start = time.perf_counter()
+    entries, invalid = [], []
+    for line_number, row in rows:
+        try:
+            entries.append(validate_dictionary_row(row))
+        except ValueError as e:
+            invalid.append({"line": line_number, "error": str(e)})
+
+    translated = fill_missing_translations(entries)
+
+    # a word in the file twice is saved as its last row, one that is in the dictionary already is updated
+    rows_by_key = {}
+    for entry in entries:
+        row = dict(entry, user_id=user_id, imported=True)
+        rows_by_key[tuple(row[column] for column in DICTIONARY_KEY_COLUMNS)] = row
+    rows_to_save = list(rows_by_key.values())
+    for chunk_start in range(0, len(rows_to_save), chunk_size):
+        try:
+            upsert(Dictionary, rows_to_save[chunk_start:chunk_start + chunk_size], DICTIONARY_KEY_COLUMNS,
+                   DICTIONARY_UPDATE_COLUMNS)
+        except exc.SQLAlchemyError:
+            db.session.rollback()
+            raise
+
+    seconds = time.perf_counter() - start
+    return {"imported": len(entries), "invalid": invalid, "translated": translated, "seconds": round(seconds, 3),
+            "rows_per_second": round(len(entries) / seconds, 1) if seconds else None}
 
+
+def get_translate_deepl(word_to_translate, sentence_to_translate, source_lang, target_lang):
+    # word and sentence go out in one request
+    translated_word, translated_sentence = get_translate_deepl_batch([word_to_translate, sentence_to_translate],
+                                                                     source_lang, target_lang)
+    return translated_word, translated_sentence
+
+
+def get_translate_deepl_batch(texts_to_translate, source_lang, target_lang):
+    key = upstream_call_key("deepl", [texts_to_translate, source_lang, target_lang])
+    return upstream_calls.do(key, lambda: _translate_texts_deepl(texts_to_translate, source_lang, target_lang))
+
+
+def _translate_texts_deepl(texts_to_translate, source_lang, target_lang):
+    translated_texts = []
+    with translator_pool.translator() as translator:
+        for start in range(0, len(texts_to_translate), DEEPL_MAX_TEXTS_PER_REQUEST):
+            chunk = texts_to_translate[start:start + DEEPL_MAX_TEXTS_PER_REQUEST]
+            with track_upstream("deepl", "translate_text"):
+                results = translator.translate_text(chunk, source_lang=source_lang, target_lang=target_lang)
+            translated_texts.extend(result.text for result in results)
+
+    return translated_texts
+
+
+def normalize_text(text):
+    # translation memory key: same text regardless of case and surrounding/repeated whitespace
+    return " ".join(text.split()).casefold()
+
+
+def find_in_translation_memory(texts, source_lang, target_lang):
+    """Return {text: translation} for the texts already translated for this language pair."""
+    # several texts can share one memory entry, e.g. "Perro" and "perro"
+    texts_by_normalized = {}
+    for text in texts:
+        texts_by_normalized.setdefault(normalize_text(text), []).append(text)
+    memory_rows = TranslationMemory.query.filter(TranslationMemory.source_lang == source_lang,
+                                                 TranslationMemory.target_lang == target_lang,
+                                                 TranslationMemory.source_text.in_(list(texts_by_normalized))).all()
+    translations = {text: row.translated_text for row in memory_rows for text in texts_by_normalized[row.source_text]}
+
+    # words and sentences saved to dictionaries before the memory existed; imported rows hold translations of
+    # one user, not of DeepL, and other users must not get them
+    missing_texts = [text for text in texts if text not in translations]
+    if missing_texts:
+        dictionary_rows = Dictionary.query.filter(
+            Dictionary.source_lang == source_lang, Dictionary.target_lang == target_lang, db.not_(Dictionary.imported),
+            db.or_(Dictionary.word_to_dictionary.in_(missing_texts),
+                   Dictionary.contex_sentence.in_(missing_texts))).all()
+        from_dictionary = {}
+        for row in dictionary_rows:
+            if row.word_to_dictionary in missing_texts and row.translated_word:
+                from_dictionary[row.word_to_dictionary] = row.translated_word
+            if row.contex_sentence in missing_texts and row.translated_contex_sentence:
+                from_dictionary[row.contex_sentence] = row.translated_contex_sentence
+        if from_dictionary:
+            save_to_translation_memory(from_dictionary, source_lang, target_lang)
+            translations.update(from_dictionary)
+
+    return translations
+
+
+def insert_ignoring_duplicates(model, rows):
+    """INSERT rows of `model`, skipping each row that would break a unique constraint, and commit (see unit_of_work)."""
+    if not rows:
+        return
+    dialect_insert = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}.get(db.session.get_bind().dialect.name)
+    if dialect_insert is not None:
+        db.session.execute(dialect_insert(model).on_conflict_do_nothing(), rows)
+    else:
+        for row in rows:
+            try:
+                with db.session.begin_nested():
+                    db.session.add(model(**row))
+            except exc.IntegrityError:
+                pass
+    _commit_or_defer()
+
+
+def upsert(model, rows, index_elements, update_columns):
+    """INSERT rows of `model`; a row whose `index_elements` (the columns of a unique index) are already in the table
+    updates the `update_columns` of the row there instead. Commits like insert_ignoring_duplicates."""
+    if not rows:
+        return
+    dialect_insert = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}.get(db.session.get_bind().dialect.name)
+    if dialect_insert is not None:
+        statement = dialect_insert(model)
+        statement = statement.on_conflict_do_update(
+            index_elements=index_elements, set_={column: statement.excluded[column] for column in update_columns})
+        db.session.execute(statement, rows)
+    else:
+        table = model.__table__
+        for row in rows:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(table.insert(), row)
+            except exc.IntegrityError:
+                db.session.execute(table.update()
+                                   .where(*(table.c[column] == row[column] for column in index_elements))
+                                   .values({column: row[column] for column in update_columns}))
+    _commit_or_defer()
+
+
+def save_to_translation_memory(translations, source_lang, target_lang):
+    rows = {normalize_text(text): translated_text for text, translated_text in translations.items()}
+    # a text another request stored first keeps that translation, it is as good as ours
+    insert_ignoring_duplicates(TranslationMemory, [
+        {"source_text": source_text, "source_lang": source_lang, "target_lang": target_lang,
+         "translated_text": translated_text} for source_text, translated_text in rows.items()])
+
+
+def translate_with_memory(word_to_translate, sentence_to_translate, source_lang, target_lang):
+    translations = find_in_translation_memory([word_to_translate, sentence_to_translate], source_lang, target_lang)
+    if word_to_translate in translations and sentence_to_translate in translations:
+        return translations[word_to_translate], translations[sentence_to_translate]
+
+    translated_word, translated_sentence = get_translate_deepl(word_to_translate, sentence_to_translate,
+                                                               source_lang, target_lang)
+    save_to_translation_memory({word_to_translate: translated_word, sentence_to_translate: translated_sentence},
+                               source_lang, target_lang)
+    return translated_word, translated_sentence
+
+
+def translate_many_with_memory(texts_to_translate, source_lang, target_lang):
+    """Return {text: translation} for all texts, sending the ones not in memory to DeepL in one batch."""
+    texts_to_translate = list(dict.fromkeys(texts_to_translate))
+    translations = find_in_translation_memory(texts_to_translate, source_lang, target_lang)
+
+    missing_texts = [text for text in texts_to_translate if text not in translations]
+    if missing_texts:
+        translated_texts = get_translate_deepl_batch(missing_texts, source_lang, target_lang)
+        new_translations = dict(zip(missing_texts, translated_texts))
+        save_to_translation_memory(new_translations, source_lang, target_lang)
+        translations.update(new_translations)
+
+    return translations
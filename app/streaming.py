@@ -0,0 +1,70 @@
+import json
+import re
+
+
+class AnswerStreamParser:
+    """Pulls the value of the "answer" key out of the chat's JSON reply while it is still streaming.
+
+    feed() takes the next piece of the raw reply and returns the part of the answer that can
+    be decoded so far, so it can be sent to the user before the whole JSON has arrived.
+    """
+
+    ANSWER_START = re.compile(r'"answer"\s*:\s*"')
+    ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+    def __init__(self):
+        self.buffer = ""
+        self.position = None  # next undecoded character of the answer
+        self.finished = False
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        if self.finished:
+            return ""
+        if self.position is None:
+            match = self.ANSWER_START.search(self.buffer)
+            if not match:
+                return ""
+            self.position = match.end()
+
+        decoded = []
+        i = self.position
+        while i < len(self.buffer):
+            char = self.buffer[i]
+            if char == '"':
+                self.finished = True
+                i += 1
+                break
+            if char != '\\':
+                decoded.append(char)
+                i += 1
+                continue
+
+            # escape sequences can be split between chunks, wait for the rest of them
+            if i + 1 >= len(self.buffer):
+                break
+            if self.buffer[i + 1] != 'u':
+                decoded.append(self.ESCAPES.get(self.buffer[i + 1], self.buffer[i + 1]))
+                i += 2
+                continue
+            if i + 6 > len(self.buffer):
+                break
+            code_point = int(self.buffer[i + 2:i + 6], 16)
+            if 0xD800 <= code_point < 0xDC00:
+                # high surrogate, the character is only complete with the low one after it
+                if i + 12 > len(self.buffer):
+                    break
+                low = int(self.buffer[i + 8:i + 12], 16)
+                code_point = 0x10000 + ((code_point - 0xD800) << 10) + (low - 0xDC00)
+                i += 12
+            else:
+                i += 6
+            decoded.append(chr(code_point))
+
+        self.position = i
+        return "".join(decoded)
+
+
+def format_sse(data, event=None):
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
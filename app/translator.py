@@ -0,0 +1,65 @@
+import contextlib
+import os
+import queue
+import threading
+
+import deepl
+from deepl import http_client
+
+DEEPL_TOKEN = os.environ.get('DEEPL_TOKEN')
+DEEPL_SERVER_URL = os.environ.get('DEEPL_SERVER_URL')  # e.g. a local stand-in server for tests and benchmarks
+DEEPL_POOL_SIZE = int(os.environ.get('DEEPL_POOL_SIZE', 8))
+DEEPL_TIMEOUT = float(os.environ.get('DEEPL_TIMEOUT', 10))
+DEEPL_MAX_RETRIES = int(os.environ.get('DEEPL_MAX_RETRIES', 2))
+
+# the deepl library only has module level settings for these
+http_client.min_connection_timeout = DEEPL_TIMEOUT
+http_client.max_network_retries = DEEPL_MAX_RETRIES
+
+
+class TranslatorPool:
+    """Process-wide pool of long-lived deepl.Translator objects.
+
+    Every translator keeps its own HTTP session, so connections (and TLS sessions) are reused
+    between requests, and no two threads share a session at the same time. At most `size`
+    translators are created; when all of them are busy callers wait for one to be returned.
+    """
+
+    def __init__(self, auth_key, size=DEEPL_POOL_SIZE, server_url=DEEPL_SERVER_URL):
+        self.auth_key = auth_key
+        self.size = size
+        self.server_url = server_url
+        self.idle = queue.LifoQueue()  # most recently used first, its connection is most likely still open
+        self.created = 0
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def translator(self):
+        translator = self._acquire()
+        try:
+            yield translator
+        finally:
+            self.idle.put(translator)
+
+    def _acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self.lock:
+            can_create = self.created < self.size
+            if can_create:
+                self.created += 1
+        if not can_create:
+            return self.idle.get()
+
+        try:
+            return deepl.Translator(self.auth_key, server_url=self.server_url)
+        except Exception:
+            with self.lock:
+                self.created -= 1
+            raise
+
+
+translator_pool = TranslatorPool(DEEPL_TOKEN)
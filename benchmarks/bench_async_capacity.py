@@ -0,0 +1,188 @@
+"""Concurrent capacity of the sync Flask endpoints and the /async endpoints of the ASGI app.
+
+Starts fake DeepL and OpenAI servers that answer after a fixed latency, then serves the app
+twice on local ports: the Flask app on a WSGI server with a fixed number of worker threads
+(like gunicorn --threads), and the ASGI app from app/asgi.py on uvicorn with a single event loop. The same
+number of concurrent HTTP clients send advanced version and translation requests to each, and the
+throughput and p50/p95 latency of every endpoint are printed.
+
+    python -m benchmarks.bench_async_capacity --requests 400 --concurrency 100 --workers 8 --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import tempfile
+import threading
+import time
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import make_server, WSGIServer, WSGIRequestHandler
+
+from benchmarks.fake_upstreams import FakeDeepLHandler, FakeOpenAIHandler, start_fake_server
+
+
+class _QuietHandler(WSGIRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+class BoundedThreadWSGIServer(ThreadingMixIn, WSGIServer):
+    """WSGI server that handles at most `workers` requests at a time, like a sync worker pool."""
+    daemon_threads = True
+    request_queue_size = 1024
+    workers = 8
+
+    def server_activate(self):
+        super().server_activate()
+        self.slots = threading.BoundedSemaphore(self.workers)
+
+    def process_request(self, request, client_address):
+        self.slots.acquire()
+        super().process_request(request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self.slots.release()
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve_wsgi(flask_app, workers):
+    BoundedThreadWSGIServer.workers = workers
+    server = make_server("127.0.0.1", 0, flask_app, server_class=BoundedThreadWSGIServer,
+                         handler_class=_QuietHandler)
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def serve_asgi(asgi_app):
+    import uvicorn
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(asgi_app, host="127.0.0.1", port=port, log_level="warning",
+                                           backlog=1024, limit_concurrency=None))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, f"http://127.0.0.1:{port}"
+
+
+def seed(flask_app):
+    """Create the benchmark user and a conversation with a few messages; return the conversation id."""
+    from werkzeug.security import generate_password_hash
+    from app import db
+    from app.models import User, Conversation, Message
+
+    with flask_app.app_context():
+        user = User(username="bench", name="Bench", password=generate_password_hash("bench"))
+        db.session.add(user)
+        db.session.commit()
+        conversation = Conversation(conversation_name="Benchmark", user_id=user.id, language="Spanish")
+        db.session.add(conversation)
+        db.session.commit()
+        db.session.add_all([Message(message_text="Hola, ¿qué tal?", conversation_id=conversation.id, is_user=True),
+                            Message(message_text="Muy bien, ¿y tú?", conversation_id=conversation.id,
+                                    is_user=False)])
+        db.session.commit()
+        return conversation.id
+
+
+def endpoints(prefix, conversation_id):
+    """(name, path, json body for request i) for each endpoint that waits on an upstream."""
+    return [
+        # a different attempt per request, so identical calls are not coalesced into one upstream call
+        ("advanced", f"{prefix}/advanced_version/{conversation_id}",
+         lambda i: {"chat_message": f"Estoy bien, gracias {i}"}),
+        ("translation", f"{prefix}/translation",
+         lambda i: {"word_to_translate": f"palabra{prefix}{i}", "sentence_to_translate": f"una palabra{prefix}{i}",
+                    "source_lang": "ES", "target_lang": "EN-GB"}),
+    ]
+
+
+async def drive(base_url, token, name, path, body, requests, concurrency):
+    """Send `requests` POSTs from `concurrency` clients; return the wall time and per-request latencies."""
+    import httpx
+
+    latencies, failures = [], 0
+    next_request = iter(range(requests))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120,
+                                 headers={"Authorization": f"Bearer {token}"}) as client:
+        async def client_loop():
+            nonlocal failures
+            for i in next_request:
+                start = time.perf_counter()
+                response = await client.post(path, json=body(i))
+                latencies.append(time.perf_counter() - start)
+                failures += response.status_code != 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+        wall_seconds = time.perf_counter() - start
+
+    return {"endpoint": name, "seconds": wall_seconds, "latencies": latencies, "failures": failures}
+
+
+def login(base_url):
+    import httpx
+
+    return httpx.post(f"{base_url}/login", json={"username": "bench", "password": "bench"}).json()["token"]
+
+
+def report(label, result):
+    latencies = sorted(result["latencies"])
+    p50 = statistics.median(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{label:<28} {result['endpoint']:<12} {len(latencies) / result['seconds']:8.1f} req/s"
+          f"  p50 {p50 * 1000:7.0f} ms  p95 {p95 * 1000:7.0f} ms  failures {result['failures']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400, help="requests per endpoint and server")
+    parser.add_argument("--concurrency", type=int, default=100, help="concurrent HTTP clients")
+    parser.add_argument("--workers", type=int, default=8, help="worker threads of the sync server")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds the fake upstreams wait per request")
+    args = parser.parse_args()
+
+    deepl_server = start_fake_server(FakeDeepLHandler, latency=args.latency)
+    openai_server = start_fake_server(FakeOpenAIHandler, latency=args.latency)
+    # the app reads its settings at import time
+    os.environ.update({"DEEPL_TOKEN": "benchmark-key", "DEEPL_SERVER_URL": deepl_server.url,
+                       "DEEPL_POOL_SIZE": str(args.workers), "OPENAI_TOKEN": "benchmark-key",
+                       "OPENAI_API_BASE": f"{openai_server.url}/v1"})
+    from app import create_app
+    from app.asgi import create_asgi_app
+
+    with tempfile.TemporaryDirectory() as database_dir:
+        flask_app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{database_dir}/benchmark.db"})
+        conversation_id = seed(flask_app)
+        wsgi_server, wsgi_url = serve_wsgi(flask_app, args.workers)
+        asgi_server, asgi_url = serve_asgi(create_asgi_app(flask_app))
+
+        print(f"{args.requests} requests per endpoint, {args.concurrency} concurrent clients, "
+              f"{args.latency * 1000:.0f} ms upstream latency")
+        for label, base_url, prefix in [(f"sync, {args.workers} worker threads", wsgi_url, ""),
+                                        ("async, 1 event loop", asgi_url, "/async")]:
+            token = login(base_url)
+            for name, path, body in endpoints(prefix, conversation_id):
+                report(label, asyncio.run(drive(base_url, token, name, path, body, args.requests,
+                                                args.concurrency)))
+
+        asgi_server.should_exit = True
+        wsgi_server.shutdown()
+    deepl_server.shutdown()
+    openai_server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Dictionary import throughput, chunked executemany against one commit per row.
+
+Imports --rows translated entries into a temporary SQLite database twice: with
+service.import_dictionary, and the way /dictionary saves a word, one row and one commit at
+a time. Translations are in the rows, so DeepL is not called:
+
+    python -m benchmarks.bench_dictionary_import --rows 20000
+"""
+import argparse
+import tempfile
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    args = parser.parse_args()
+
+    from app import create_app, db
+    from app.models import User, Dictionary
+    from app.service import import_dictionary
+
+    rows = [(line_number, {"word_to_dictionary": f"palabra{line_number}", "translated_word": f"word{line_number}",
+                           "contex_sentence": f"una frase con palabra{line_number}",
+                           "translated_contex_sentence": f"a sentence with word{line_number}",
+                           "source_lang": "ES", "target_lang": "EN-GB"}) for line_number in range(1, args.rows + 1)]
+
+    with tempfile.TemporaryDirectory() as database_dir:
+        app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{database_dir}/benchmark.db"})
+        with app.app_context():
+            # one user per pass, the second would only update the words of the first
+            import_user = User(username="bench-import", name="Bench", password="unused")
+            per_row_user = User(username="bench-per-row", name="Bench", password="unused")
+            db.session.add_all([import_user, per_row_user])
+            db.session.commit()
+
+            report = import_dictionary(import_user.id, rows)
+
+            start = time.perf_counter()
+            for _, row in rows:
+                db.session.add(Dictionary(user_id=per_row_user.id, **row))
+                db.session.commit()
+            per_row_seconds = time.perf_counter() - start
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+
+    print(f"{args.rows} rows")
+    print(f"import_dictionary: {report['seconds']:.2f} s, {report['rows_per_second']:.0f} rows/s")
+    print(f"one commit per row: {per_row_seconds:.2f} s, {args.rows / per_row_seconds:.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
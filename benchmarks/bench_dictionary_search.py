@@ -0,0 +1,78 @@
+"""Dictionary search latency as the dictionary grows, FTS5 index against a LIKE scan.
+
+Seeds a temporary SQLite database with one user's dictionary of --sizes entries (random
+words, one in --hit-every of them holds the searched word) and times search_dictionary
+next to the LIKE query the clients used to run on every entry:
+
+    python -m benchmarks.bench_dictionary_search --sizes 1000 10000 100000
+"""
+import argparse
+import random
+import statistics
+import string
+import tempfile
+import time
+
+
+def random_word(rng):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9)))
+
+
+def timed(fn, repeat):
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return statistics.median(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--hit-every", type=int, default=1000, help="one entry in this many holds the searched word")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    from app import create_app, db
+    from app.models import User, Dictionary
+    from app.service import search_dictionary
+
+    rng = random.Random(1)
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as database_dir:
+            app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{database_dir}/benchmark.db"})
+            with app.app_context():
+                user = User(username="bench", name="Bench", password="unused")
+                db.session.add(user)
+                db.session.commit()
+                rows = []
+                words = set()  # a user has each word once
+                for i in range(size):
+                    if i % args.hit_every == 0:
+                        word = f"murciélago {i}"
+                    else:
+                        word = random_word(rng)
+                        while word in words:
+                            word = random_word(rng)
+                    words.add(word)
+                    sentence = " ".join(random_word(rng) for _ in range(6))
+                    rows.append({"user_id": user.id, "word_to_dictionary": word, "translated_word": random_word(rng),
+                                 "contex_sentence": sentence, "translated_contex_sentence": sentence,
+                                 "source_lang": "ES", "target_lang": "EN-GB"})
+                db.session.execute(Dictionary.__table__.insert(), rows)
+                db.session.commit()
+
+                fts = timed(lambda: search_dictionary(user.id, "murcielago", "ES", "EN-GB"), args.repeat)
+                like = timed(lambda: Dictionary.query.filter(
+                    Dictionary.user_id == user.id, Dictionary.source_lang == "ES", Dictionary.target_lang == "EN-GB",
+                    db.or_(Dictionary.word_to_dictionary.ilike("%murciélago%"),
+                           Dictionary.contex_sentence.ilike("%murciélago%"))).limit(21).all(), args.repeat)
+                db.session.remove()
+                for engine in db.engines.values():
+                    engine.dispose()
+        print(f"{size:>8} entries: fts5 {fts:.2f} ms, like {like:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Logins next to ordinary requests on a fixed number of WSGI worker threads.
+
+Serves the app from a temporary SQLite database on a WSGI server with --workers threads,
+then runs login clients and /home clients at the same time and reports login throughput,
+refused logins (503) and the /home latency the logins cause. Settings are read at import,
+so compare runs with different PASSWORD_HASH_WORKERS and PASSWORD_HASH_MAX_QUEUE, e.g. no
+limit (hashing may hold every worker, as before) against one hashing thread:
+
+    python -m benchmarks.bench_login_mixed --workers 8 --hash-workers 8 --hash-queue 32
+    python -m benchmarks.bench_login_mixed --workers 8 --hash-workers 1 --hash-queue 1
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+
+async def run_clients(base_url, path, clients, seconds, body=None, headers=None):
+    import httpx
+
+    latencies, statuses = [], []
+    deadline = time.perf_counter() + seconds
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, headers=headers) as client:
+        async def client_loop():
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                response = await (client.post(path, json=body) if body else client.get(path))
+                latencies.append(time.perf_counter() - start)
+                statuses.append(response.status_code)
+
+        await asyncio.gather(*(client_loop() for _ in range(clients)))
+    return latencies, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=8, help="WSGI worker threads")
+    parser.add_argument("--hash-workers", type=int, default=1, help="PASSWORD_HASH_WORKERS")
+    parser.add_argument("--hash-queue", type=int, default=1, help="PASSWORD_HASH_MAX_QUEUE")
+    parser.add_argument("--login-clients", type=int, default=32)
+    parser.add_argument("--home-clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    # the app reads its settings at import time
+    os.environ.update({"PASSWORD_HASH_WORKERS": str(args.hash_workers),
+                       "PASSWORD_HASH_MAX_QUEUE": str(args.hash_queue)})
+    import httpx
+    from app import create_app
+    from benchmarks.bench_async_capacity import serve_wsgi
+
+    with tempfile.TemporaryDirectory() as database_dir:
+        app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{database_dir}/benchmark.db"})
+        server, base_url = serve_wsgi(app, args.workers)
+        httpx.post(f"{base_url}/signup", json={"name": "Bench", "username": "bench", "password": "bench"})
+        credentials = {"username": "bench", "password": "bench"}
+        token = httpx.post(f"{base_url}/login", json=credentials).json()["token"]
+
+        async def mixed_traffic():
+            return await asyncio.gather(
+                run_clients(base_url, "/login", args.login_clients, args.seconds, body=credentials),
+                run_clients(base_url, "/home", args.home_clients, args.seconds,
+                            headers={"Authorization": f"Bearer {token}"}))
+
+        (login_latencies, login_statuses), (home_latencies, _) = asyncio.run(mixed_traffic())
+        server.shutdown()
+
+    home_latencies.sort()
+    print(f"{args.workers} worker threads, {args.hash_workers} hashing threads, "
+          f"{args.hash_queue} queued hashes, {args.seconds:.0f} s")
+    print(f"login: {login_statuses.count(200) / args.seconds:.1f} logins/s, "
+          f"{login_statuses.count(503)} refused with 503")
+    print(f"/home: {len(home_latencies) / args.seconds:.1f} req/s, "
+          f"p50 {statistics.median(home_latencies) * 1000:.1f} ms, "
+          f"p95 {home_latencies[int(len(home_latencies) * 0.95)] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Read latency while another thread writes, with the SQLite journal mode as a setting.
+
+Seeds a temporary database with a conversation, then one thread saves messages in
+transactions of --rows-per-write rows while --readers threads read the last messages of the
+conversation. The settings are read at import, so compare:
+
+    python -m benchmarks.bench_sqlite_concurrency --journal-mode DELETE
+    python -m benchmarks.bench_sqlite_concurrency --journal-mode WAL
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--journal-mode", default="WAL")
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--rows-per-write", type=int, default=1000, help="messages saved per write transaction")
+    args = parser.parse_args()
+
+    # the app reads its settings at import time
+    os.environ.update({"SQLITE_JOURNAL_MODE": args.journal_mode, "DB_POOL_SIZE": str(args.readers + 1)})
+    from app import create_app, db
+    from app.models import User, Conversation, Message
+    from app.service import find_last_messages
+
+    with tempfile.TemporaryDirectory() as database_dir:
+        app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{database_dir}/benchmark.db"})
+        with app.app_context():
+            user = User(username="bench", name="Bench", password="unused")
+            db.session.add(user)
+            db.session.commit()
+            conversation = Conversation(conversation_name="Benchmark", user_id=user.id, language="Spanish")
+            db.session.add(conversation)
+            db.session.commit()
+            conversation_id = conversation.id
+
+        deadline = time.perf_counter() + args.seconds
+        read_latencies, writes, errors = [], [], []
+
+        def write():
+            with app.app_context():
+                while time.perf_counter() < deadline:
+                    try:
+                        db.session.execute(Message.__table__.insert(), [
+                            {"message_text": "Hola", "conversation_id": conversation_id, "is_user": True}
+                            for _ in range(args.rows_per_write)])
+                        db.session.commit()
+                        writes.append(1)
+                    except Exception as e:
+                        db.session.rollback()
+                        errors.append(e)
+
+        def read():
+            with app.app_context():
+                while time.perf_counter() < deadline:
+                    start = time.perf_counter()
+                    try:
+                        find_last_messages(conversation_id, 2)
+                        db.session.commit()  # ends the read transaction
+                        read_latencies.append(time.perf_counter() - start)
+                    except Exception as e:
+                        db.session.rollback()
+                        errors.append(e)
+
+        threads = [threading.Thread(target=write)] + [threading.Thread(target=read) for _ in range(args.readers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    read_latencies.sort()
+    print(f"journal_mode={args.journal_mode}, {args.readers} readers, 1 writer, {args.seconds:.0f} s")
+    print(f"reads: {len(read_latencies) / args.seconds:.0f}/s, p50 {statistics.median(read_latencies) * 1000:.2f} ms, "
+          f"p95 {read_latencies[int(len(read_latencies) * 0.95)] * 1000:.2f} ms")
+    print(f"writes: {len(writes) / args.seconds:.0f}/s, errors: {len(errors)}")
+
+
+if __name__ == "__main__":
+    main()
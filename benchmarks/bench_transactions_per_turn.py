@@ -0,0 +1,67 @@
+"""Database transactions and throughput of /response chat turns.
+
+Runs chat turns through the Flask test client from several threads at once, against a
+fake OpenAI server and a temporary SQLite database, and counts the COMMITs the database
+engine sees. Each turn saves the user message and the chat answer.
+
+    python -m benchmarks.bench_transactions_per_turn --turns 400 --threads 8
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_upstreams import FakeOpenAIHandler, start_fake_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=400)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--conversations", type=int, default=8, help="turns are spread over this many conversations")
+    args = parser.parse_args()
+
+    openai_server = start_fake_server(FakeOpenAIHandler)
+    # the app reads its settings at import time
+    os.environ.update({"OPENAI_TOKEN": "benchmark-key", "OPENAI_API_BASE": f"{openai_server.url}/v1"})
+    from sqlalchemy import event
+    from werkzeug.security import generate_password_hash
+    from app import create_app, db
+    from app.models import User, Conversation
+
+    with tempfile.TemporaryDirectory() as database_dir:
+        app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{database_dir}/benchmark.db"})
+        with app.app_context():
+            user = User(username="bench", name="Bench", password=generate_password_hash("bench"))
+            db.session.add(user)
+            db.session.commit()
+            conversations = [Conversation(conversation_name=f"Benchmark {i}", user_id=user.id, language="Spanish")
+                             for i in range(args.conversations)]
+            db.session.add_all(conversations)
+            db.session.commit()
+            conversation_ids = [conversation.id for conversation in conversations]
+            engine = db.engine
+
+        token = app.test_client().post("/login", json={"username": "bench", "password": "bench"}).json["token"]
+        commits = []
+        event.listen(engine, "commit", lambda connection: commits.append(1))
+
+        def turn(i):
+            response = app.test_client().post(f"/response/{conversation_ids[i % len(conversation_ids)]}",
+                                              headers={"Authorization": f"Bearer {token}"},
+                                              json={"TTS_message": f"Hola, turno {i}"})
+            return response.status_code == 200
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as executor:
+            succeeded = sum(executor.map(turn, range(args.turns)))
+        seconds = time.perf_counter() - start
+
+    openai_server.shutdown()
+    print(f"{args.turns} turns on {args.threads} threads: {args.turns / seconds:.1f} turns/s, "
+          f"{len(commits) / args.turns:.2f} commits per turn, {args.turns - succeeded} failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Per-turn cost of building the chat and hint payloads as a conversation grows.
+
+Seeds conversations of increasing length in a temporary SQLite database and times
+prepare_api_payload and prepare_messages on each, next to loading the whole
+conversation.messages relationship the way the payload builders used to.
+
+    python -m benchmarks.bench_turn_cost --lengths 10 1000 10000 --repeat 200
+"""
+import argparse
+import datetime
+import tempfile
+import time
+
+
+def time_per_call(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lengths", type=int, nargs="+", default=[10, 1000, 10000],
+                        help="messages per conversation")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    from app import create_app, db
+    from app.models import User, Conversation, Message
+    from app.service import prepare_api_payload, prepare_messages
+
+    with tempfile.TemporaryDirectory() as database_dir:
+        app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{database_dir}/benchmark.db"})
+        with app.app_context():
+            user = User(username="bench", name="Bench", password="unused")
+            db.session.add(user)
+            db.session.commit()
+
+            print(f"{'messages':>9} {'prepare_api_payload':>20} {'prepare_messages':>17} {'load all messages':>18}")
+            for length in args.lengths:
+                conversation = Conversation(conversation_name=f"Benchmark {length}", user_id=user.id,
+                                            language="Spanish")
+                db.session.add(conversation)
+                db.session.commit()
+                started = datetime.datetime.utcnow()
+                db.session.execute(Message.__table__.insert(), [
+                    {"conversation_id": conversation.id, "is_user": i % 2 == 0, "message_text": f"Mensaje {i}",
+                     "summary": f"Resumen {i}", "timestamp": started + datetime.timedelta(seconds=i)}
+                    for i in range(length)])
+                db.session.commit()
+
+                def load_all_messages():
+                    db.session.expire_all()
+                    return db.session.get(Conversation, conversation.id).messages[-1]
+
+                timings = [time_per_call(lambda: prepare_api_payload(conversation.id), args.repeat),
+                           time_per_call(lambda: prepare_messages(conversation.id), args.repeat),
+                           time_per_call(load_all_messages, args.repeat)]
+                print(f"{length:>9} " + " ".join(f"{timing * 1000:>{width}.3f} ms"
+                                                 for timing, width in zip(timings, (17, 14, 15))))
+
+
+if __name__ == "__main__":
+    main()
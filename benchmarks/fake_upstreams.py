@@ -0,0 +1,137 @@
+"""Local stand-ins for the DeepL and OpenAI HTTP APIs, for tests and benchmarks.
+
+Point the app at them with DEEPL_SERVER_URL and OPENAI_API_BASE. Every request waits
+`latency` seconds before answering, like a remote API would, or a log-normal time around it
+with `latency_sigma`; a share `error_rate` of the requests fails with one of `error_statuses`.
+Requests are recorded in server.requests as (path, request data, client address).
+
+To serve an app running elsewhere, e.g. a deployment under load test, start both on fixed ports:
+
+    python -m benchmarks.fake_upstreams --openai-port 8081 --deepl-port 8082 --latency 0.5 --error-rate 0.01
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _FakeUpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        request_data = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        self.server.requests.append((self.path, request_data, self.client_address))
+        time.sleep(self.server.next_latency())
+        status = self.server.next_status()
+        body = json.dumps(self.respond(request_data) if status == 200 else self.error(status)).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def respond(self, request_data):
+        raise NotImplementedError
+
+    def error(self, status):
+        return {"message": self.responses.get(status, ("Error",))[0]}
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeDeepLHandler(_FakeUpstreamHandler):
+    """Translates the texts found in server.translations, and any other text to "translated <text>"."""
+
+    def respond(self, request_data):
+        return {"translations": [{"detected_source_language": request_data.get("source_lang") or "ES",
+                                  "text": self.server.translations.get(text, f"translated {text}")}
+                                 for text in request_data.get("text", [])]}
+
+
+class FakeOpenAIHandler(_FakeUpstreamHandler):
+
+    def error(self, status):
+        return {"error": {"message": self.responses.get(status, ("Error",))[0], "type": "server_error",
+                          "param": None, "code": None}}
+
+    def respond(self, request_data):
+        content = json.dumps({"summary": "The user keeps practicing.", "answer": "¿Y qué más te gusta hacer?"})
+        return {"id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+                "model": request_data.get("model", "gpt-3.5-turbo"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 50, "completion_tokens": 20, "total_tokens": 70}}
+
+
+class FakeUpstreamServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # benchmarks open many connections at once
+
+    def next_latency(self):
+        if self.latency_sigma and self.latency > 0:
+            # remote APIs have a long tail: most answers near the median, a few many times slower
+            return self.random.lognormvariate(math.log(self.latency), self.latency_sigma)
+        return self.latency
+
+    def next_status(self):
+        if self.error_rate and self.random.random() < self.error_rate:
+            return self.random.choice(self.error_statuses)
+        return 200
+
+
+def start_fake_server(handler_class, latency=0.0, translations=None, host="127.0.0.1", port=0, latency_sigma=0.0,
+                      error_rate=0.0, error_statuses=(500,), seed=None):
+    """Start the server in a daemon thread and return it; its address is server.url."""
+    server = FakeUpstreamServer((host, port), handler_class)
+    server.latency = latency
+    server.latency_sigma = latency_sigma
+    server.error_rate = error_rate
+    server.error_statuses = tuple(error_statuses)
+    server.random = random.Random(seed)
+    server.translations = translations or {}
+    server.requests = []
+    server.url = f"http://{host}:{server.server_port}"
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    return server
+
+
+def add_upstream_arguments(parser):
+    """The latency and error options of the fake servers, shared by the scripts that start them."""
+    parser.add_argument("--latency", type=float, default=0.3, help="median seconds the fake upstreams wait")
+    parser.add_argument("--latency-sigma", type=float, default=0.5,
+                        help="spread of the log-normal latency, 0 waits exactly --latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of upstream requests that fail")
+    parser.add_argument("--error-statuses", type=int, nargs="+", default=[429, 500, 503])
+
+
+def start_fake_upstreams(args, host="127.0.0.1", openai_port=0, deepl_port=0):
+    """(OpenAI server, DeepL server) with the options of add_upstream_arguments."""
+    options = {"latency": args.latency, "latency_sigma": args.latency_sigma, "error_rate": args.error_rate,
+               "error_statuses": args.error_statuses, "host": host}
+    return (start_fake_server(FakeOpenAIHandler, port=openai_port, **options),
+            start_fake_server(FakeDeepLHandler, port=deepl_port, **options))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--openai-port", type=int, default=8081)
+    parser.add_argument("--deepl-port", type=int, default=8082)
+    add_upstream_arguments(parser)
+    args = parser.parse_args()
+
+    openai_server, deepl_server = start_fake_upstreams(args, args.host, args.openai_port, args.deepl_port)
+    print(f"OPENAI_API_BASE={openai_server.url}/v1")
+    print(f"DEEPL_SERVER_URL={deepl_server.url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""Load test: concurrent learners replay whole sessions against the app, with fake OpenAI and DeepL.
+
+Every learner signs up once, then runs sessions until --duration is over: log in, create a
+conversation and chat for about --turns turns, waiting --think-time seconds on average before
+each one. After a chat answer a learner sometimes asks for a hint, an advanced version of their
+answer or the translation of a word, which they then may add to their dictionary. The fake
+upstreams answer after a log-normal latency and fail at --error-rate, see benchmarks/fake_upstreams.py.
+Throughput, p50/p95/p99 latency and error rate are reported per endpoint:
+
+    python -m benchmarks.load_test --learners 50 --duration 60 --workers 8 --latency 0.5 --error-rate 0.02
+
+Without --url the app is served here from a temporary SQLite database on --workers WSGI threads.
+With --url the learners drive a running deployment instead; point it at fake upstreams started with
+`python -m benchmarks.fake_upstreams`, or every turn costs real OpenAI and DeepL calls.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import tempfile
+import time
+import uuid
+
+from benchmarks.fake_upstreams import add_upstream_arguments, start_fake_upstreams
+
+MESSAGES = ["Hola, ¿qué tal estás hoy?", "Me gusta mucho leer libros por la noche.",
+            "Ayer fui al mercado con mi madre.", "Quiero viajar a México el año que viene.",
+            "No entiendo bien esta palabra.", "Mi perro se llama Max y es muy juguetón.",
+            "Trabajo en una oficina en el centro de la ciudad.", "Los fines de semana juego al fútbol con mis amigos."]
+# a small vocabulary, so translations are often answered from the cache like in real use
+WORDS = [("perro", "Tengo un perro"), ("libro", "Leo un libro"), ("mercado", "Voy al mercado"),
+         ("ciudad", "Vivo en la ciudad"), ("amigos", "Salgo con mis amigos"), ("viajar", "Me gusta viajar"),
+         ("palabra", "Es una palabra difícil"), ("oficina", "Trabajo en una oficina")]
+
+
+class Recorder:
+    """Latency and outcome of every request, per endpoint."""
+
+    def __init__(self):
+        self.requests = {}  # endpoint -> [(seconds, status)], status 0 when the request failed without one
+        self.sessions = 0
+        self.failed_sessions = 0
+
+    def record(self, endpoint, seconds, status):
+        self.requests.setdefault(endpoint, []).append((seconds, status))
+
+
+def percentile(sorted_values, fraction):
+    # nearest rank
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def summarize(requests, seconds):
+    latencies = sorted(latency for latency, _ in requests)
+    errors = sum(1 for _, status in requests if not 200 <= status < 400)
+    return {"requests": len(requests), "per_second": len(requests) / seconds, "p50": percentile(latencies, 0.5),
+            "p95": percentile(latencies, 0.95), "p99": percentile(latencies, 0.99),
+            "error_rate": errors / len(requests)}
+
+
+class Learner:
+    """One simulated user; `step` sends a request and records it, returning the response or None."""
+
+    def __init__(self, client, recorder, rng, args):
+        self.client = client
+        self.recorder = recorder
+        self.rng = rng
+        self.args = args
+        self.username = f"learner-{uuid.uuid4().hex[:12]}"
+        self.headers = {}
+
+    async def step(self, endpoint, path, body, retries=0):
+        for attempt in range(retries + 1):
+            start = time.perf_counter()
+            try:
+                response = await self.client.post(path, json=body, headers=self.headers)
+            except Exception:  # timeouts and dropped connections count as errors too
+                self.recorder.record(endpoint, time.perf_counter() - start, 0)
+                return None
+            self.recorder.record(endpoint, time.perf_counter() - start, response.status_code)
+            if response.status_code == 503 and "Retry-After" in response.headers and attempt < retries:
+                # busy password hashing; the client tries again as asked
+                await asyncio.sleep(float(response.headers["Retry-After"]))
+                continue
+            return response if response.status_code == 200 else None
+
+    async def think(self):
+        if self.args.think_time > 0:
+            await asyncio.sleep(self.rng.expovariate(1 / self.args.think_time))
+
+    async def signup(self):
+        return await self.step("signup", "/signup", {"name": "Load Test", "username": self.username,
+                                                      "password": self.username}, self.args.retries)
+
+    async def session(self, deadline):
+        login = await self.step("login", "/login", {"username": self.username, "password": self.username},
+                                self.args.retries)
+        if login is None:
+            return False
+        self.headers = {"Authorization": f"Bearer {login.json()['token']}"}
+        conversation = await self.step("conversation", "/conversation", {
+            "language": "Spanish", "conversation_name": f"{self.username} {uuid.uuid4().hex[:8]}"})
+        if conversation is None:
+            return False
+        conversation_id = conversation.json()["id"]
+
+        for _ in range(self.rng.randint(1, 2 * self.args.turns - 1)):
+            await self.think()
+            if time.perf_counter() >= deadline:
+                break
+            if await self.step("response", f"/response/{conversation_id}",
+                               {"TTS_message": self.rng.choice(MESSAGES)}) is None:
+                continue  # the learner repeats, like after "I have technical problem with answer"
+            if self.rng.random() < self.args.hint_rate:
+                await self.step("hint", f"/hint/{conversation_id}", None)
+            if self.rng.random() < self.args.advanced_rate:
+                await self.step("advanced_version", f"/advanced_version/{conversation_id}",
+                                {"chat_message": self.rng.choice(MESSAGES)})
+            if self.rng.random() < self.args.translation_rate:
+                word, sentence = self.rng.choice(WORDS)
+                translation = await self.step("translation", "/translation", {
+                    "word_to_translate": word, "sentence_to_translate": sentence, "source_lang": "ES",
+                    "target_lang": "EN-GB"})
+                if translation is not None and self.rng.random() < self.args.dictionary_rate:
+                    await self.step("dictionary", "/dictionary", {
+                        "word_to_dictionary": word, "contex_sentence": sentence, "source_lang": "ES",
+                        "target_lang": "EN-GB"})
+        return True
+
+    async def run(self, start_delay, deadline):
+        await asyncio.sleep(start_delay)
+        if await self.signup() is None:
+            self.recorder.failed_sessions += 1
+            return
+        while time.perf_counter() < deadline:
+            completed = await self.session(deadline)
+            self.recorder.sessions += completed
+            self.recorder.failed_sessions += not completed
+
+
+async def drive(base_url, args):
+    import httpx
+
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.learners, max_keepalive_connections=args.learners)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        start = time.perf_counter()
+        deadline = start + args.duration
+        learners = [Learner(client, recorder, random.Random(rng.random()), args) for _ in range(args.learners)]
+        # learners arrive over the ramp-up, not all in the same second
+        await asyncio.gather(*(learner.run(args.ramp_up * i / args.learners, deadline)
+                               for i, learner in enumerate(learners)))
+        seconds = time.perf_counter() - start
+    return recorder, seconds
+
+
+def report(recorder, seconds):
+    results = {endpoint: summarize(requests, seconds) for endpoint, requests in recorder.requests.items()}
+    every_request = [request for requests in recorder.requests.values() for request in requests]
+    if every_request:
+        results["total"] = summarize(every_request, seconds)
+    print(f"{'endpoint':<18} {'requests':>9} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'errors':>8}")
+    for endpoint, result in results.items():
+        print(f"{endpoint:<18} {result['requests']:>9} {result['per_second']:>8.1f} "
+              + " ".join(f"{result[key] * 1000:>6.0f} ms" for key in ("p50", "p95", "p99"))
+              + f" {result['error_rate']:>8.1%}")
+    print(f"{recorder.sessions} sessions completed, {recorder.failed_sessions} failed, in {seconds:.1f} s")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="a running deployment; by default the app is served here")
+    parser.add_argument("--workers", type=int, default=8, help="WSGI worker threads of the app served here")
+    parser.add_argument("--learners", type=int, default=20, help="concurrent simulated learners")
+    parser.add_argument("--duration", type=float, default=60, help="seconds")
+    parser.add_argument("--ramp-up", type=float, default=5, help="seconds until every learner has started")
+    parser.add_argument("--turns", type=int, default=10, help="average chat turns per session")
+    parser.add_argument("--think-time", type=float, default=2, help="average seconds between turns")
+    parser.add_argument("--hint-rate", type=float, default=0.2, help="share of turns followed by a hint")
+    parser.add_argument("--advanced-rate", type=float, default=0.1)
+    parser.add_argument("--translation-rate", type=float, default=0.3)
+    parser.add_argument("--dictionary-rate", type=float, default=0.5, help="share of translations saved")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds a learner waits for an answer")
+    parser.add_argument("--retries", type=int, default=5, help="signup and login attempts after a 503 with Retry-After")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also save the results as JSON")
+    add_upstream_arguments(parser)
+    args = parser.parse_args()
+
+    if args.url:
+        recorder, seconds = asyncio.run(drive(args.url, args))
+        results = report(recorder, seconds)
+    else:
+        openai_server, deepl_server = start_fake_upstreams(args)
+        # the app reads its settings at import time
+        os.environ.update({"DEEPL_TOKEN": "benchmark-key", "DEEPL_SERVER_URL": deepl_server.url,
+                           "DEEPL_POOL_SIZE": str(args.workers), "OPENAI_TOKEN": "benchmark-key",
+                           "OPENAI_API_BASE": f"{openai_server.url}/v1"})
+        from app import create_app
+        from benchmarks.bench_async_capacity import serve_wsgi
+
+        with tempfile.TemporaryDirectory() as database_dir:
+            app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{database_dir}/benchmark.db"})
+            app.logger.setLevel(logging.CRITICAL)  # failed upstream calls are counted in the report, not logged
+            server, base_url = serve_wsgi(app, args.workers)
+            recorder, seconds = asyncio.run(drive(base_url, args))
+            server.shutdown()
+        results = report(recorder, seconds)
+        print(f"upstream calls: OpenAI {len(openai_server.requests)}, DeepL {len(deepl_server.requests)}")
+        openai_server.shutdown()
+        deepl_server.shutdown()
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({"settings": vars(args), "seconds": seconds, "sessions": recorder.sessions,
+                       "failed_sessions": recorder.failed_sessions, "endpoints": results}, output, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""Micro-benchmarks of the service layer, the caches and the Flask endpoints, with regression gating.
+
+`run` seeds a temporary SQLite database with --users users, each with --conversations
+conversations of --messages messages and --dictionary dictionary entries, plus one conversation
+of --long-conversation messages, and times every benchmark in --samples samples. OpenAI and
+DeepL are stubbed, so only this app is measured. Results are saved as JSON:
+
+    python -m benchmarks.suite run --output before.json
+    python -m benchmarks.suite run --output after.json -k endpoint
+
+`compare` runs a Welch t-test per benchmark on the samples of two runs and exits with status 1
+when one is significantly slower (p below --alpha) by more than --threshold:
+
+    python -m benchmarks.suite compare before.json after.json
+"""
+import argparse
+import datetime
+import gc
+import json
+import math
+import platform
+import random
+import statistics
+import string
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+from unittest.mock import patch
+
+CHAT_RESPONSE = {"choices": [{"message": {"role": "assistant", "content": json.dumps(
+    {"summary": "The user keeps practicing.", "answer": "¿Y qué más te gusta hacer?"})}}]}
+
+
+def random_word(rng):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9)))
+
+
+def random_sentence(rng, words=8):
+    return " ".join(random_word(rng) for _ in range(words))
+
+
+def seed_database(db, args):
+    """Insert the users, conversations, messages and dictionaries; return the ids the benchmarks use."""
+    from app.models import User, Conversation, Message, Dictionary
+
+    rng = random.Random(1)
+    started = datetime.datetime.utcnow() - datetime.timedelta(days=30)
+    db.session.execute(User.__table__.insert(), [
+        {"username": f"user{i}", "name": f"User {i}", "password": "unused"} for i in range(args.users)])
+    user_ids = [user_id for user_id, in db.session.execute(db.select(User.id).order_by(User.id))]
+
+    db.session.execute(Conversation.__table__.insert(), [
+        {"conversation_name": f"Conversation {user_id}-{i}", "user_id": user_id, "language": "Spanish",
+         "beginning_date": started, "last_messaged_date": started}
+        for user_id in user_ids for i in range(args.conversations)])
+    user_id = user_ids[0]
+    long_conversation = Conversation(conversation_name="Long conversation", user_id=user_id, language="Spanish")
+    chat_conversation = Conversation(conversation_name="Chat conversation", user_id=user_id, language="Spanish")
+    db.session.add_all([long_conversation, chat_conversation])
+    db.session.flush()
+
+    def messages(conversation_id, count):
+        return [{"conversation_id": conversation_id, "is_user": i % 2 == 0, "message_text": random_sentence(rng),
+                 "summary": None if i % 2 == 0 else random_sentence(rng, 6),
+                 "timestamp": started + datetime.timedelta(seconds=i)} for i in range(count)]
+
+    conversation_ids = db.session.execute(db.select(Conversation.id)).scalars().all()
+    for conversation_id in conversation_ids:
+        count = args.long_conversation if conversation_id == long_conversation.id else args.messages
+        db.session.execute(Message.__table__.insert(), messages(conversation_id, count))
+
+    for dictionary_user_id in user_ids:
+        db.session.execute(Dictionary.__table__.insert(), [
+            {"user_id": dictionary_user_id, "word_to_dictionary": f"{random_word(rng)}{i}",
+             "translated_word": random_word(rng), "contex_sentence": random_sentence(rng),
+             "translated_contex_sentence": random_sentence(rng), "source_lang": "ES", "target_lang": "EN-GB"}
+            for i in range(args.dictionary)])
+    db.session.commit()
+    return user_id, long_conversation.id, chat_conversation.id
+
+
+def build_benchmarks(app, db, user_id, long_conversation_id, chat_conversation_id):
+    """{name: callable} of everything `run` can time."""
+    from flask_jwt_extended import create_access_token, verify_jwt_in_request
+    from app.cache import LRUCache, TieredCache
+    from app.service import message_for_api, prepare_api_payload, find_all_conversations_names_ids
+
+    token = create_access_token(identity="user0", additional_claims={"user_id": user_id})
+    headers = {"Authorization": f"Bearer {token}"}
+    client = app.test_client()
+
+    def find_conversations():
+        with app.test_request_context(headers=headers):
+            verify_jwt_in_request()
+            find_all_conversations_names_ids()
+        db.session.remove()
+
+    def service_call(fn, *args):
+        def call():
+            fn(*args)
+            db.session.remove()
+        return call
+
+    def request(method, url, **kwargs):
+        def call():
+            response = client.open(url, method=method, headers=headers, **kwargs)
+            response.get_data()
+            assert response.status_code == 200, (url, response.status_code)
+        return call
+
+    lru = LRUCache(max_entries=1000)
+    lru.set_many({f"key{i}": {"translated_word": f"word{i}"} for i in range(1000)})
+    keys = [f"key{i}" for i in range(1000)]
+    key_cycle = iter(range(sys.maxsize))
+
+    tiered = TieredCache(LRUCache(max_entries=1000), LRUCache(max_entries=10000))
+    tiered.set_many({key: {"translated_word": key} for key in keys})
+    tiered_l2_only = TieredCache(LRUCache(max_entries=100), tiered.l2)
+
+    def lru_set_evicting():
+        i = next(key_cycle)
+        lru.set(f"new{i}", {"translated_word": f"word{i}"})
+
+    return {
+        "service.message_for_api": lambda: message_for_api("Spanish", "Me gusta leer libros", "Hablamos de libros."),
+        "service.prepare_api_payload": service_call(prepare_api_payload, long_conversation_id),
+        "service.find_all_conversations_names_ids": find_conversations,
+        "cache.lru_get_hit": lambda: lru.get(keys[next(key_cycle) % 1000]),
+        "cache.lru_get_miss": lambda: lru.get("missing"),
+        "cache.lru_set_evicting": lru_set_evicting,
+        "cache.tiered_get_many_l1": lambda: tiered.get_many(keys[:10]),
+        "cache.tiered_get_many_l2": lambda: tiered_l2_only.get_many(keys[next(key_cycle) % 990:][:10]),
+        "endpoint.get_conversations": request("GET", "/conversations"),
+        "endpoint.get_conversation_page": request("GET", f"/conversation/{long_conversation_id}"),
+        "endpoint.post_response": request("POST", f"/response/{chat_conversation_id}",
+                                          json={"TTS_message": "Me gusta mucho leer libros"}),
+        "endpoint.post_translation_cached": request("POST", "/translation", json={
+            "word_to_translate": "perro", "sentence_to_translate": "Tengo un perro", "source_lang": "ES",
+            "target_lang": "EN-GB"}),
+        "endpoint.post_dictionary": request("POST", "/dictionary", json={
+            "word_to_dictionary": "perro", "contex_sentence": "Tengo un perro", "source_lang": "ES",
+            "target_lang": "EN-GB"}),
+        "endpoint.search_dictionary": request("GET", "/dictionary/search?q=ab"),
+    }
+
+
+def calibrate(fn, min_sample_time):
+    """Calls per sample, so that a sample takes about `min_sample_time`."""
+    fn()  # warm up caches, statements and lazy imports
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - start >= min_sample_time:
+            return number
+        number *= 2
+
+
+def time_samples(benchmarks, samples, min_sample_time):
+    """{name: (calls per sample, [seconds per call in each sample])}.
+
+    The samples of all benchmarks are taken in turns, so a slow spell of the machine spreads over
+    every benchmark as variance instead of shifting the mean of one of them.
+    """
+    numbers = {name: calibrate(fn, min_sample_time) for name, fn in benchmarks.items()}
+    timings = {name: [] for name in benchmarks}
+    for _ in range(samples):
+        for name, fn in benchmarks.items():
+            gc.collect()
+            start = time.perf_counter()
+            for _ in range(numbers[name]):
+                fn()
+            timings[name].append((time.perf_counter() - start) / numbers[name])
+    return {name: (numbers[name], timings[name]) for name in benchmarks}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def selected_by(name, patterns):
+    """Whether `name` is one of `patterns` or starts with one of them followed by a dot.
+
+    `cache` selects cache.lru_get_hit but not endpoint.post_translation_cached.
+    """
+    return any(name == pattern or name.startswith(f"{pattern}.") for pattern in patterns)
+
+
+def run(args):
+    from app import create_app, db
+
+    results = {}
+    with tempfile.TemporaryDirectory() as database_dir, ExitStack() as stubs:
+        # the stubs answer like the APIs would, the code around the calls still runs
+        stubs.enter_context(patch("openai.ChatCompletion.create", lambda **kwargs: CHAT_RESPONSE))
+        stubs.enter_context(patch("app.service._translate_texts_deepl",
+                                  lambda texts, source_lang, target_lang: [f"translated {text}" for text in texts]))
+        app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{database_dir}/benchmark.db", "TESTING": True})
+        with app.app_context():
+            start = time.perf_counter()
+            with patch("app.database.SLOW_QUERY_MS", math.inf):  # the bulk inserts are slow by design
+                ids = seed_database(db, args)
+            print(f"seeded in {time.perf_counter() - start:.1f} s", file=sys.stderr)
+            benchmarks = build_benchmarks(app, db, *ids)
+            selected = {name: fn for name, fn in benchmarks.items()
+                        if not args.k or selected_by(name, args.k)}
+            if not selected:
+                sys.exit(f"-k {' '.join(args.k)} selects no benchmark, the names are: {', '.join(benchmarks)}")
+            for name, (number, timings) in time_samples(selected, args.samples, args.min_sample_time).items():
+                results[name] = {"number": number, "mean": statistics.fmean(timings),
+                                 "median": statistics.median(timings), "stdev": statistics.stdev(timings),
+                                 "samples": timings}
+                print(f"{name:<45} {results[name]['mean'] * 1e6:>10.1f} us "
+                      f"± {results[name]['stdev'] * 1e6:.1f}", file=sys.stderr)
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+
+    report = {"meta": {"created": datetime.datetime.utcnow().isoformat(), "commit": git_commit(),
+                       "python": platform.python_version(), "platform": platform.platform(),
+                       "seed": {"users": args.users, "conversations": args.conversations, "messages": args.messages,
+                                "long_conversation": args.long_conversation, "dictionary": args.dictionary}},
+              "results": results}
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=1)
+    print(f"saved {len(results)} benchmarks to {args.output}", file=sys.stderr)
+
+
+def _continued_fraction(a, b, x):
+    # Lentz's method for the continued fraction of the incomplete beta function
+    tiny = 1e-300
+    c, d = 1.0, 1.0 - (a + b) * x / (a + 1)
+    d = 1 / (d if abs(d) > tiny else tiny)
+    result = d
+    for m in range(1, 300):
+        for numerator in (m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+                          -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))):
+            d = 1 + numerator * d
+            d = 1 / (d if abs(d) > tiny else tiny)
+            c = 1 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            result *= c * d
+        if abs(c * d - 1) < 1e-12:
+            break
+    return result
+
+
+def regularized_incomplete_beta(a, b, x):
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log(1 - x))
+    if x < (a + 1) / (a + b + 2):
+        return front * _continued_fraction(a, b, x) / a
+    return 1 - front * _continued_fraction(b, a, 1 - x) / b
+
+
+def welch_t_test(before, after):
+    """(t, p) of Welch's t-test that `after` is slower than `before`, i.e. one-sided."""
+    mean_before, mean_after = statistics.fmean(before), statistics.fmean(after)
+    var_before = statistics.variance(before) / len(before)
+    var_after = statistics.variance(after) / len(after)
+    if var_before + var_after == 0:
+        # identical samples on both sides, only the means tell
+        return (math.inf, 0.0) if mean_after > mean_before else (0.0, 1.0)
+    t = (mean_after - mean_before) / math.sqrt(var_before + var_after)
+    degrees = (var_before + var_after) ** 2 / (var_before ** 2 / (len(before) - 1) + var_after ** 2 / (len(after) - 1))
+    # two-sided p from Student's t distribution, halved toward the side of t
+    two_sided = regularized_incomplete_beta(degrees / 2, 0.5, degrees / (degrees + t * t))
+    return t, two_sided / 2 if t > 0 else 1 - two_sided / 2
+
+
+def compare(args):
+    with open(args.before) as before_file, open(args.after) as after_file:
+        before, after = json.load(before_file)["results"], json.load(after_file)["results"]
+
+    regressions = []
+    print(f"{'benchmark':<45} {'before':>12} {'after':>12} {'change':>8} {'p':>8}")
+    for name in sorted(before.keys() & after.keys()):
+        mean_before, mean_after = before[name]["mean"], after[name]["mean"]
+        change = mean_after / mean_before - 1
+        _, p = welch_t_test(before[name]["samples"], after[name]["samples"])
+        verdict = ""
+        if p < args.alpha and change > args.threshold:
+            verdict = "REGRESSION"
+            regressions.append(name)
+        elif change < -args.threshold and 1 - p < args.alpha:
+            verdict = "faster"
+        print(f"{name:<45} {mean_before * 1e6:>9.1f} us {mean_after * 1e6:>9.1f} us {change:>+8.1%} {p:>8.4f} "
+              f"{verdict}".rstrip())
+    for name in sorted(before.keys() ^ after.keys()):
+        print(f"{name:<45} only in {args.before if name in before else args.after}")
+
+    if regressions:
+        print(f"{len(regressions)} significant regressions: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="seed a database, run the benchmarks and save the results")
+    run_parser.add_argument("--output", default="benchmark-results.json")
+    run_parser.add_argument("-k", nargs="+", help="only these benchmarks or groups: a whole name or its leading dotted "
+                                 "segments, e.g. cache or endpoint.post_response")
+    run_parser.add_argument("--samples", type=int, default=20)
+    run_parser.add_argument("--min-sample-time", type=float, default=0.05, help="seconds")
+    run_parser.add_argument("--users", type=int, default=200)
+    run_parser.add_argument("--conversations", type=int, default=5, help="per user")
+    run_parser.add_argument("--messages", type=int, default=100, help="per conversation")
+    run_parser.add_argument("--long-conversation", type=int, default=10000, help="messages")
+    run_parser.add_argument("--dictionary", type=int, default=500, help="entries per user")
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser("compare", help="flag significant slowdowns between two runs")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+    compare_parser.add_argument("--alpha", type=float, default=0.01, help="significance level")
+    compare_parser.add_argument("--threshold", type=float, default=0.1,
+                                help="smallest slowdown reported, 0.1 is 10%%")
+    compare_parser.set_defaults(handler=compare)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
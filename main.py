@@ -1,6 +1,8 @@
 from app import create_app
+from app.asgi import create_asgi_app
 
 app = create_app()
+asgi_app = create_asgi_app(app)
 
 if __name__ == '__main__':
-    app.run(debug=True, port=8080)
\ No newline at end of file
+    app.run(debug=True, port=8080)
@@ -0,0 +1,4 @@
+import os
+
+# every test login would otherwise rehash its password at production cost; set before the app is imported
+os.environ.setdefault("PASSWORD_HASH_METHOD", "pbkdf2:sha256:1")
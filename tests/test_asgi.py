@@ -0,0 +1,163 @@
+import unittest
+from unittest.mock import patch, AsyncMock
+
+from sqlalchemy import event
+
+from flask_testing import TestCase
+from starlette.testclient import TestClient
+from werkzeug.security import generate_password_hash
+
+from app import db
+from app.asgi import create_asgi_app
+from app.controller import cache
+from app.models import User, Conversation, Message, Dictionary
+from main import app
+
+
+class AsgiTests(TestCase):
+
+    def create_app(self):
+        app.config["TESTING"] = True
+        return app
+
+    def setUp(self):
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        self.test_user = User(username="testuser", name="Test User",
+                              password=generate_password_hash("testpassword", method="sha256"))
+        db.session.add(self.test_user)
+        db.session.commit()
+        self.asgi_client = TestClient(create_asgi_app(app))
+        login = self.asgi_client.post("/login", json=dict(username="testuser", password="testpassword"))
+        self.headers = {"Authorization": f"Bearer {login.json()['token']}"}
+
+    def tearDown(self):
+        self.asgi_client.close()
+        db.session.remove()
+        db.drop_all()
+
+    def _create_conversation(self, messages=()):
+        conversation = Conversation(conversation_name="Test Conversation 1", user_id=self.test_user.id,
+                                    language="Spanish")
+        db.session.add(conversation)
+        db.session.commit()
+        for message_text, is_user in messages:
+            db.session.add(Message(message_text=message_text, conversation_id=conversation.id, is_user=is_user))
+        db.session.commit()
+        return conversation.id
+
+    @staticmethod
+    def _mock_response(content):
+        return {"choices": [{"message": {"content": content}}]}
+
+    def test_flask_endpoints_are_mounted(self):
+        home_response = self.asgi_client.get("/home", headers=self.headers)
+        self.assertEqual(home_response.status_code, 200)
+        self.assertEqual(home_response.json()["username"], "testuser")
+
+    def test_async_endpoint_requires_token(self):
+        hint_response = self.asgi_client.post("/async/hint/1")
+        self.assertEqual(hint_response.status_code, 401)
+
+    def test_get_chat_response(self):
+        conversation_id = self._create_conversation()
+        mock_response = self._mock_response('{"answer": "Test response from OpenAI", "summary": "Testing"}')
+
+        with patch("openai.ChatCompletion.acreate", new=AsyncMock(return_value=mock_response)) as mock_openai_call:
+            chat_response = self.asgi_client.post(f"/async/response/{conversation_id}", headers=self.headers,
+                                                  json={"TTS_message": "test_message"})
+
+        mock_openai_call.assert_awaited_once()
+        self.assertEqual(chat_response.json()["chat_message"], "Test response from OpenAI")
+        db.session.expire_all()
+        messages = Message.query.filter_by(conversation_id=conversation_id).all()
+        self.assertEqual([message.message_text for message in messages], ["test_message", "Test response from OpenAI"])
+
+    def test_chat_turn_is_one_transaction(self):
+        conversation_id = self._create_conversation()
+        mock_response = self._mock_response('{"answer": "Test response from OpenAI", "summary": "Testing"}')
+        commits = []
+
+        def count_commit(connection):
+            commits.append(connection)
+
+        event.listen(db.engine, "commit", count_commit)
+        try:
+            with patch("openai.ChatCompletion.acreate", new=AsyncMock(return_value=mock_response)):
+                self.asgi_client.post(f"/async/response/{conversation_id}", headers=self.headers,
+                                      json={"TTS_message": "test_message"})
+        finally:
+            event.remove(db.engine, "commit", count_commit)
+
+        self.assertEqual(len(commits), 1)
+        db.session.expire_all()
+        messages = Message.query.filter_by(conversation_id=conversation_id).order_by(Message.id).all()
+        self.assertEqual([message.is_user for message in messages], [True, False])
+        self.assertLessEqual(messages[0].timestamp, messages[1].timestamp)
+
+    def test_user_message_is_kept_when_the_chat_fails(self):
+        conversation_id = self._create_conversation()
+        asgi_client = TestClient(create_asgi_app(app), raise_server_exceptions=False)
+
+        with patch("openai.ChatCompletion.acreate", new=AsyncMock(side_effect=RuntimeError("chat is down"))):
+            chat_response = asgi_client.post(f"/async/response/{conversation_id}", headers=self.headers,
+                                             json={"TTS_message": "test_message"})
+        asgi_client.close()
+
+        self.assertEqual(chat_response.status_code, 500)
+        db.session.expire_all()
+        self.assertEqual([message.message_text for message in Message.query.filter_by(conversation_id=conversation_id)],
+                         ["test_message"])
+
+    def test_get_hint(self):
+        conversation_id = self._create_conversation([("Hello", True), ("Hi there", False)])
+
+        with patch("openai.ChatCompletion.acreate",
+                   new=AsyncMock(return_value=self._mock_response("This is your hint"))):
+            hint_response = self.asgi_client.post(f"/async/hint/{conversation_id}", headers=self.headers)
+
+        self.assertEqual(hint_response.status_code, 200)
+        self.assertEqual(hint_response.json()["guidance_response"], "This is your hint")
+
+    def test_get_hint_before_conversation_started(self):
+        conversation_id = self._create_conversation()
+        hint_response = self.asgi_client.post(f"/async/hint/{conversation_id}", headers=self.headers)
+        self.assertEqual(hint_response.status_code, 400)
+        self.assertEqual(hint_response.json()["error"],
+                         "Please, start conversation before using hint or sentence advanced correction")
+
+    def test_get_advanced_version(self):
+        conversation_id = self._create_conversation([("Hello", True), ("Hi there", False)])
+
+        with patch("openai.ChatCompletion.acreate",
+                   new=AsyncMock(return_value=self._mock_response("This is your advanced version"))):
+            advanced_response = self.asgi_client.post(f"/async/advanced_version/{conversation_id}",
+                                                      headers=self.headers, json={"chat_message": "chat_message"})
+
+        self.assertEqual(advanced_response.json()["guidance_response"], "This is your advanced version")
+
+    def test_translation_and_dictionary(self):
+        cache.clear()
+        with patch("app.async_service.aget_translate_deepl",
+                   new=AsyncMock(return_value=("dog", "I have a dog"))) as mock_deepl_call:
+            translation_response = self.asgi_client.post("/async/translation", headers=self.headers, json={
+                "word_to_translate": "perro", "sentence_to_translate": "tengo un perro", "source_lang": "ES",
+                "target_lang": "EN-GB"})
+            dictionary_response = self.asgi_client.post("/async/dictionary", headers=self.headers, json={
+                "word_to_dictionary": "gato", "contex_sentence": "tengo un gato", "source_lang": "ES",
+                "target_lang": "EN-GB"})
+
+        self.assertEqual(mock_deepl_call.await_count, 2)
+        self.assertEqual(translation_response.json()["translated_word"], "dog")
+        self.assertEqual(dictionary_response.status_code, 200)
+        self.assertEqual(Dictionary.query.filter_by(word_to_dictionary="gato").count(), 1)
+
+    def test_invalid_payload_to_translation(self):
+        translation_response = self.asgi_client.post("/async/translation", headers=self.headers,
+                                                     json={"word_to_translate": "perro"})
+        self.assertEqual(translation_response.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import asyncio
+import socket
+import unittest
+from unittest.mock import patch, AsyncMock
+
+import deepl
+
+from app import async_service
+from app.service import ChatAPIError
+from benchmarks.fake_upstreams import FakeDeepLHandler, start_fake_server
+from tests.test_translator import TRANSLATIONS
+
+
+def run(coroutine):
+    async def run_and_close_session():
+        try:
+            return await coroutine
+        finally:
+            await async_service.close_client_session()
+    return asyncio.run(run_and_close_session())
+
+
+class AsyncServiceTests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = start_fake_server(FakeDeepLHandler, translations=TRANSLATIONS)
+        self.server_url = self.server.url
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_aget_translate_deepl(self):
+        with patch.object(async_service, "DEEPL_SERVER_URL", self.server_url), \
+                patch.object(async_service, "DEEPL_TOKEN", "fake-key"):
+            translated = run(async_service.aget_translate_deepl("computadora", "me gusta usar mi computadora",
+                                                                        "ES", "EN-GB"))
+
+        self.assertEqual(translated, ("computer", "I like to use my computer"))
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_aget_translate_deepl_unreachable_server(self):
+        with socket.socket() as unused_socket:
+            unused_socket.bind(("127.0.0.1", 0))
+            unreachable_url = f"http://127.0.0.1:{unused_socket.getsockname()[1]}"
+        with patch.object(async_service, "DEEPL_SERVER_URL", unreachable_url), \
+                patch.object(async_service, "DEEPL_TOKEN", "fake-key"):
+            with self.assertRaises(deepl.DeepLException):
+                run(async_service.aget_translate_deepl_batch(["computadora"], "ES", "EN-GB"))
+
+    def test_concurrent_identical_translations_share_one_request(self):
+        async def translate_twice():
+            return await asyncio.gather(
+                async_service.aget_translate_deepl("computadora", "me gusta usar mi computadora", "ES", "EN-GB"),
+                async_service.aget_translate_deepl("computadora", "me gusta usar mi computadora", "ES", "EN-GB"))
+
+        with patch.object(async_service, "DEEPL_SERVER_URL", self.server_url), \
+                patch.object(async_service, "DEEPL_TOKEN", "fake-key"):
+            first, second = run(translate_twice())
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_client_session_is_reused(self):
+        async def translate_sequentially():
+            for word in ("uno", "dos", "tres"):
+                await async_service.aget_translate_deepl_batch([word], "ES", "EN-GB")
+
+        with patch.object(async_service, "DEEPL_SERVER_URL", self.server_url), \
+                patch.object(async_service, "DEEPL_TOKEN", "fake-key"):
+            run(translate_sequentially())
+
+        client_addresses = {client_address for _, _, client_address in self.server.requests}
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(len(client_addresses), 1)
+
+    def test_acall_chat_response(self):
+        mock_response = {"choices": [{"message": {"content": "mock response"}}]}
+        with patch("openai.ChatCompletion.acreate", new=AsyncMock(return_value=mock_response)):
+            guidance_response = run(async_service.acall_chat_response([{"role": "user", "content": "hi"}]))
+        self.assertEqual(guidance_response, "mock response")
+
+    def test_acall_chat_response_error(self):
+        with patch("openai.ChatCompletion.acreate", new=AsyncMock(return_value={"choices": []})):
+            with self.assertRaises(ChatAPIError):
+                run(async_service.acall_chat_response([{"role": "user", "content": "hi"}]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,7 +4,9 @@ import json
 from app import db
 from app.models import User
 from main import app
-from werkzeug.security import check_password_hash
+from unittest.mock import patch
+from werkzeug.security import check_password_hash, generate_password_hash
+from app.passwords import HashingExecutor, HashingOverloaded, needs_rehash
 
 
 class AuthenticationTests(TestCase):
@@ -52,6 +54,36 @@ class AuthenticationTests(TestCase):
                                                     json=dict(username='testusername', password='failpassword'))
         self.assertEqual(incorrect_password_login.status_code, 401)
 
+    def test_outdated_hash_is_upgraded_on_login(self):
+        user = User.query.filter_by(username='testusername').first()
+        user.password = generate_password_hash('testpassword', method='pbkdf2:sha256:1000')
+        db.session.commit()
+        self.assertTrue(needs_rehash(user.password))
+
+        login = self.client.post('login', json=dict(username='testusername', password='testpassword'))
+
+        self.assertEqual(login.status_code, 200)
+        user = User.query.filter_by(username='testusername').first()
+        self.assertFalse(needs_rehash(user.password))
+        self.assertTrue(check_password_hash(user.password, 'testpassword'))
+
+    def test_login_is_refused_when_hashing_is_overloaded(self):
+        with patch('app.auth.check_password', side_effect=HashingOverloaded('Too many password checks right now')):
+            login = self.client.post('login', json=dict(username='testusername', password='testpassword'))
+
+        self.assertEqual(login.status_code, 503)
+        self.assertEqual(login.headers['Retry-After'], '1')
+
+    def test_hashing_executor_rejects_over_its_queue(self):
+        executor = HashingExecutor(workers=1, max_queue=0)
+        executor.slots.acquire()  # a hash in progress
+        with self.assertRaises(HashingOverloaded):
+            executor.run(len, 'password')
+        executor.slots.release()
+
+        self.assertEqual(executor.run(len, 'password'), 8)
+        self.assertEqual(executor.stats(), {'hashed': 1, 'rejected': 1})
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,169 @@
+import unittest
+from unittest.mock import patch
+
+import redis
+
+from app.cache import LRUCache, RedisCache, TieredCache
+
+
+class FakeRedis:
+    """Minimal stand-in for redis.StrictRedis that counts round trips."""
+
+    def __init__(self):
+        self.data = {}
+        self.round_trips = 0
+
+    def get(self, key):
+        self.round_trips += 1
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.round_trips += 1
+        self.data[key] = value.encode("utf-8")
+
+    def mget(self, keys):
+        self.round_trips += 1
+        return [self.data.get(key) for key in keys]
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def set(self, key, value, ex=None):
+        self.commands.append((key, value))
+
+    def execute(self):
+        self.client.round_trips += 1
+        for key, value in self.commands:
+            self.client.data[key] = value.encode("utf-8")
+
+
+class BrokenRedis(FakeRedis):
+
+    def mget(self, keys):
+        raise redis.ConnectionError("redis is down")
+
+    def pipeline(self, transaction=True):
+        raise redis.ConnectionError("redis is down")
+
+
+class LRUCacheTests(unittest.TestCase):
+
+    def test_get_and_set(self):
+        cache = LRUCache()
+        cache.set("computadora_ES_EN-GB", {"translated_word": "computer"})
+        self.assertEqual(cache.get("computadora_ES_EN-GB"), {"translated_word": "computer"})
+        self.assertIsNone(cache.get("missing"))
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 1)
+
+    def test_evicts_least_recently_used_entry(self):
+        cache = LRUCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(len(cache), 2)
+
+    def test_evicts_when_over_byte_limit(self):
+        cache = LRUCache(max_bytes=100)
+        cache.set("first", "x" * 60)
+        cache.set("second", "y" * 60)
+        self.assertIsNone(cache.get("first"))
+        self.assertEqual(cache.get("second"), "y" * 60)
+        self.assertLessEqual(cache.stats()["size_bytes"], 100)
+
+    def test_value_larger_than_limit_is_not_stored(self):
+        cache = LRUCache(max_bytes=10)
+        cache.set("key", "too long for this cache")
+        self.assertIsNone(cache.get("key"))
+        self.assertEqual(cache.stats()["size_bytes"], 0)
+
+    def test_entry_expires_after_ttl(self):
+        cache = LRUCache(ttl=60)
+        with patch("app.cache.time.monotonic", return_value=1000):
+            cache.set("key", "value")
+        with patch("app.cache.time.monotonic", return_value=1059):
+            self.assertEqual(cache.get("key"), "value")
+        with patch("app.cache.time.monotonic", return_value=1060):
+            self.assertIsNone(cache.get("key"))
+        self.assertEqual(len(cache), 0)
+
+    def test_overwrite_keeps_size_accounting(self):
+        cache = LRUCache()
+        cache.set("key", "short")
+        cache.set("key", "a bit longer")
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.stats()["size_bytes"], LRUCache._estimate_size("key", "a bit longer"))
+
+
+class RedisCacheTests(unittest.TestCase):
+
+    def test_get_many_uses_one_round_trip(self):
+        client = FakeRedis()
+        cache = RedisCache(client=client)
+        cache.set_many({"a": {"translated_word": "A"}, "b": {"translated_word": "B"}})
+        self.assertEqual(client.round_trips, 1)
+
+        values = cache.get_many(["a", "b", "c", "a"])
+        self.assertEqual(values, {"a": {"translated_word": "A"}, "b": {"translated_word": "B"}})
+        self.assertEqual(client.round_trips, 2)
+
+
+class TieredCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeRedis()
+        self.cache = TieredCache(LRUCache(), RedisCache(client=self.client))
+
+    def test_read_through_fills_l1(self):
+        RedisCache(client=self.client).set("key", "value")
+        self.client.round_trips = 0
+        self.assertEqual(self.cache.get("key"), "value")
+        self.assertEqual(self.cache.get("key"), "value")
+        self.assertEqual(self.client.round_trips, 1)
+
+    def test_write_through_reaches_l2(self):
+        self.cache.set("key", "value")
+        other_worker = TieredCache(LRUCache(), RedisCache(client=self.client))
+        self.assertEqual(other_worker.get("key"), "value")
+
+    def test_misses_are_cached_until_key_is_set(self):
+        self.assertIsNone(self.cache.get("key"))
+        self.assertIsNone(self.cache.get("key"))
+        self.assertEqual(self.client.round_trips, 1)
+
+        self.cache.set("key", "value")
+        self.assertEqual(self.cache.get("key"), "value")
+
+    def test_get_many_only_asks_l2_for_unknown_keys(self):
+        self.cache.set("in_l1", 1)
+        RedisCache(client=self.client).set("in_l2", 2)
+        self.client.round_trips = 0
+
+        values = self.cache.get_many(["in_l1", "in_l2", "missing", "in_l2"])
+        self.assertEqual(values, {"in_l1": 1, "in_l2": 2})
+        self.assertEqual(self.client.round_trips, 1)
+        self.assertEqual(self.cache.stats()["l2_hits"], 1)
+        self.assertEqual(self.cache.stats()["l2_misses"], 1)
+
+    def test_unavailable_l2_falls_back_to_l1(self):
+        cache = TieredCache(LRUCache(), RedisCache(client=BrokenRedis()))
+        cache.set("key", "value")
+        self.assertEqual(cache.get("key"), "value")
+        self.assertIsNone(cache.get("other"))
+        self.assertEqual(cache.stats()["l2_errors"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
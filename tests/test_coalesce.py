@@ -0,0 +1,181 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from app.coalesce import SingleFlight, AsyncSingleFlight, RedisSingleFlight
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.001)
+
+
+class SingleFlightTests(unittest.TestCase):
+
+    def _run_concurrently(self, flight, fn, callers=5):
+        results, errors = [], []
+
+        def call():
+            try:
+                results.append(flight.do("key", fn))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        return threads, results, errors
+
+    def test_concurrent_calls_share_one_result(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        upstream_calls = []
+
+        def fn():
+            upstream_calls.append(1)
+            release.wait()
+            return "computer"
+
+        threads, results, errors = self._run_concurrently(flight, fn)
+        wait_for(lambda: flight.stats()["coalesced"] == 4)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(upstream_calls), 1)
+        self.assertEqual(results, ["computer"] * 5)
+        self.assertEqual(flight.stats()["coalescing_rate"], 0.8)
+
+    def test_waiters_get_the_leaders_exception(self):
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def fn():
+            release.wait()
+            raise ValueError("upstream failed")
+
+        threads, results, errors = self._run_concurrently(flight, fn, callers=3)
+        wait_for(lambda: flight.stats()["coalesced"] == 2)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [])
+        self.assertEqual(len(errors), 3)
+        self.assertTrue(all(isinstance(error, ValueError) for error in errors))
+
+    def test_sequential_calls_are_not_coalesced(self):
+        flight = SingleFlight()
+        self.assertEqual(flight.do("key", lambda: 1), 1)
+        self.assertEqual(flight.do("key", lambda: 2), 2)
+        self.assertEqual(flight.stats()["coalesced"], 0)
+
+
+class AsyncSingleFlightTests(unittest.TestCase):
+
+    def test_concurrent_calls_share_one_result(self):
+        flight = AsyncSingleFlight()
+        upstream_calls = []
+
+        async def fn():
+            upstream_calls.append(1)
+            await asyncio.sleep(0.01)
+            return "computer"
+
+        async def run():
+            return await asyncio.gather(*(flight.do("key", fn) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(run()), ["computer"] * 5)
+        self.assertEqual(len(upstream_calls), 1)
+        self.assertEqual(flight.stats()["coalesced"], 4)
+
+    def test_cancelled_waiter_does_not_cancel_the_call(self):
+        flight = AsyncSingleFlight()
+
+        async def fn():
+            await asyncio.sleep(0.01)
+            return "computer"
+
+        async def run():
+            leader = asyncio.ensure_future(flight.do("key", fn))
+            await asyncio.sleep(0)
+            waiter = asyncio.ensure_future(flight.do("key", fn))
+            await asyncio.sleep(0)
+            waiter.cancel()
+            return await leader, waiter.cancelled()
+
+        self.assertEqual(asyncio.run(run()), ("computer", True))
+
+
+class FakeLock:
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def acquire(self, blocking=True):
+        if self.name in self.client.data:
+            return False
+        self.client.data[self.name] = b"1"
+        return True
+
+    def release(self):
+        self.client.data.pop(self.name, None)
+
+
+class FakeRedis:
+
+    def __init__(self):
+        self.data = {}
+
+    def lock(self, name, timeout=None):
+        return FakeLock(self, name)
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value.encode("utf-8")
+
+    def exists(self, key):
+        return int(key in self.data)
+
+
+class RedisSingleFlightTests(unittest.TestCase):
+
+    def test_other_process_waits_for_published_result(self):
+        client = FakeRedis()
+        first_process, second_process = RedisSingleFlight(client), RedisSingleFlight(client, poll_interval=0.001)
+        in_upstream, release = threading.Event(), threading.Event()
+        results = []
+
+        def slow_call():
+            in_upstream.set()
+            release.wait()
+            return ["computer", "I like to use my computer"]
+
+        leader = threading.Thread(target=lambda: results.append(first_process.do("key", slow_call)))
+        leader.start()
+        in_upstream.wait()
+        waiter = threading.Thread(target=lambda: results.append(second_process.do("key", lambda: ["other"])))
+        waiter.start()
+        wait_for(lambda: second_process.stats()["coalesced_remote"] == 1)
+        release.set()
+        leader.join()
+        waiter.join()
+
+        self.assertEqual(results, [["computer", "I like to use my computer"]] * 2)
+
+    def test_lock_is_released_after_call(self):
+        client = FakeRedis()
+        flight = RedisSingleFlight(client)
+        self.assertEqual(flight.do("key", lambda: "computer"), "computer")
+        self.assertNotIn("singleflight:lock:key", client.data)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,12 +1,20 @@
 import json
 import unittest
+import openai
 from flask_testing import TestCase
 from werkzeug.security import generate_password_hash
 from unittest.mock import patch
+from sqlalchemy import event, exc
 from app import db
-from app.models import User, Conversation, Message
+from app.database import assert_max_queries, TooManyQueries
+from app.models import User, Conversation, Message, Dictionary
 from main import app
 from app.service import ChatAPIError
+from app.controller import cache
+from app.service import hint_precomputer
+from tests.test_coalesce import wait_for
+
+MAX_QUERIES_PER_REQUEST = 5
 
 
 class ControllerTests(TestCase):
@@ -14,6 +22,8 @@ class ControllerTests(TestCase):
     def create_app(self):
         app.config["TESTING"] = True
         app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///test.db"  # Use an in-memory database for testing
+        # every request of these tests, a lazy load per row shows up as a failure
+        app.config["MAX_QUERIES_PER_REQUEST"] = MAX_QUERIES_PER_REQUEST
         return app
 
     def setUp(self):
@@ -128,6 +138,83 @@ class ControllerTests(TestCase):
         self.assertTrue(decode_conv_response["messages"][0]["is_user"])
         self.assertTrue("timestamp" in decode_conv_response["messages"][0])
 
+    def _create_long_conversation(self, length):
+        conversation = Conversation(conversation_name="Long conversation", user_id=self.test_user.id,
+                                    language="Spanish")
+        db.session.add(conversation)
+        db.session.commit()
+        for i in range(length):
+            db.session.add(Message(message_text=f"message {i}", conversation_id=conversation.id, is_user=i % 2 == 0))
+        db.session.commit()
+        return conversation.id
+
+    def test_get_conversation_pages(self):
+        bearer_token = self.test_login_required()
+        headers = {"Authorization": f"Bearer {bearer_token}"}
+        conversation_id = self._create_long_conversation(5)
+
+        newest = self.client.get(f"/conversation/{conversation_id}?limit=2", headers=headers).json
+        self.assertEqual([message["message_text"] for message in newest["messages"]], ["message 3", "message 4"])
+        self.assertTrue(newest["has_older"])
+        self.assertFalse(newest["has_newer"])
+
+        older = self.client.get(f"/conversation/{conversation_id}?limit=2&before={newest['cursors']['before']}",
+                                headers=headers).json
+        self.assertEqual([message["message_text"] for message in older["messages"]], ["message 1", "message 2"])
+        oldest = self.client.get(f"/conversation/{conversation_id}?limit=2&before={older['cursors']['before']}",
+                                 headers=headers).json
+        self.assertEqual([message["message_text"] for message in oldest["messages"]], ["message 0"])
+        self.assertFalse(oldest["has_older"])
+
+        newer = self.client.get(f"/conversation/{conversation_id}?limit=3&after={oldest['cursors']['after']}",
+                                headers=headers).json
+        self.assertEqual([message["message_text"] for message in newer["messages"]],
+                         ["message 1", "message 2", "message 3"])
+        self.assertTrue(newer["has_newer"])
+
+    def test_history_queries_do_not_grow_with_the_conversation(self):
+        bearer_token = self.test_login_required()
+        headers = {"Authorization": f"Bearer {bearer_token}"}
+        conversation_id = self._create_long_conversation(60)
+        db.session.add(Conversation(conversation_name="Second", user_id=self.test_user.id, language="Spanish"))
+        db.session.commit()
+
+        with assert_max_queries(1):
+            self.assertEqual(len(self.client.get("/conversations", headers=headers).json), 2)
+        with assert_max_queries(2):
+            self.assertEqual(len(self.client.get(f"/conversation/{conversation_id}", headers=headers).json["messages"]),
+                             50)
+        with assert_max_queries(2):
+            export = self.client.get(f"/conversation/{conversation_id}/export", headers=headers).data
+        self.assertEqual(len(export.splitlines()), 60)
+
+    def test_request_over_the_query_limit_fails(self):
+        bearer_token = self.test_login_required()
+        self._create_long_conversation(1)
+
+        with patch.dict(app.config, {"MAX_QUERIES_PER_REQUEST": 1}), self.assertRaises(TooManyQueries):
+            self.client.get("/conversation/1", headers={"Authorization": f"Bearer {bearer_token}"})
+
+    def test_get_conversation_invalid_page(self):
+        bearer_token = self.test_login_required()
+        headers = {"Authorization": f"Bearer {bearer_token}"}
+        conversation_id = self._create_long_conversation(1)
+
+        self.assert400(self.client.get(f"/conversation/{conversation_id}?before=not-a-cursor", headers=headers))
+        self.assert400(self.client.get(f"/conversation/{conversation_id}?limit=0", headers=headers))
+        self.assert404(self.client.get("/conversation/999", headers=headers))
+
+    def test_export_conversation(self):
+        bearer_token = self.test_login_required()
+        conversation_id = self._create_long_conversation(3)
+
+        export_response = self.client.get(f"/conversation/{conversation_id}/export",
+                                          headers={"Authorization": f"Bearer {bearer_token}"})
+
+        self.assertEqual(export_response.mimetype, "application/x-ndjson")
+        lines = export_response.data.decode("utf-8").splitlines()
+        self.assertEqual([json.loads(line)["message_text"] for line in lines], ["message 0", "message 1", "message 2"])
+
     def _mock_response(self, test_answer_summary):
         mock_response = {
             "choices": [
@@ -213,12 +300,170 @@ class ControllerTests(TestCase):
         self.assert200(chat_response)
         self.assertEqual(decoded_chat_response["chat_message"], "I have technical problem with answer, please repeat")
 
+    def test_chat_turn_is_one_transaction(self):
+        bearer_token = self.test_login_required()
+        conversation = Conversation(conversation_name="Test conversation", user_id=self.test_user.id,
+                                    language="Spanish")
+        db.session.add(conversation)
+        db.session.commit()
+        commits = []
+        mock_response = self._mock_response('{"answer": "Test response from OpenAI", "summary": "Testing"}')
+
+        def count_commit(connection):
+            commits.append(connection)
+
+        event.listen(db.engine, "commit", count_commit)
+        try:
+            with patch("openai.ChatCompletion.create", return_value=mock_response):
+                self.client.post(f"/response/{conversation.id}", headers={"Authorization": f"Bearer {bearer_token}"},
+                                 json={"TTS_message": "test_message"})
+        finally:
+            event.remove(db.engine, "commit", count_commit)
+
+        self.assertEqual(len(commits), 1)
+        messages = Message.query.filter_by(conversation_id=conversation.id).order_by(Message.id).all()
+        self.assertEqual([message.is_user for message in messages], [True, False])
+        self.assertLessEqual(messages[0].timestamp, messages[1].timestamp)
+
+    def test_database_error_is_handled(self):
+        bearer_token = self.test_login_required()
+        input_data = {"word_to_dictionary": "perro", "contex_sentence": "tengo un perro", "source_lang": "ES",
+                      "target_lang": "EN-GB"}
+        cache.clear()
+
+        with patch("app.controller.translate_with_memory", return_value=("dog", "I have a dog")), \
+                patch.object(db.session, "commit", side_effect=exc.OperationalError("INSERT", {}, Exception("locked"))):
+            dictionary_response = self.client.post("/dictionary", headers={"Authorization": f"Bearer {bearer_token}"},
+                                                   json=input_data)
+
+        self.assertEqual(dictionary_response.status_code, 500)
+        self.assertEqual(dictionary_response.json["error"], "Database error. I cannot save this word to the dictionary")
+        self.assertIsNone(cache.get("perro_ES_EN-GB"))
+
     def test_invalid_user_message(self):
         test_answer_summary = '{"answer": "Test response from OpenAI", "summary": "Testing"}'
         _, json_error, _, _ = self._prepare_and_call_get_chat_response(test_answer_summary, "")
         json_data = json.loads(json_error.data)
         self.assertEqual(json_data["error"], "I have technical problem with answer, please repeat")
 
+    def test_stream_chat_response(self):
+        bearer_token = self.test_login_required()
+        conversation = Conversation(conversation_name="Test conversation", user_id=self.test_user.id,
+                                    language="Spanish")
+        db.session.add(conversation)
+        db.session.commit()
+        content_parts = ['{"summary": "Testing", ', '"answer": "Test response', ' from OpenAI"}']
+        chunks = [{"choices": [{"delta": {"content": content_part}}]} for content_part in content_parts]
+
+        with patch("openai.ChatCompletion.create", return_value=iter(chunks)) as mock_openai_call:
+            chat_response = self.client.post(f"/response/{conversation.id}?stream=1",
+                                             headers={"Authorization": f"Bearer {bearer_token}"},
+                                             json={"TTS_message": "test_message"})
+            events = chat_response.data.decode("utf-8")
+
+        self.assertTrue(mock_openai_call.call_args.kwargs["stream"])
+        self.assertEqual(chat_response.mimetype, "text/event-stream")
+        self.assertEqual(events.split("\n\n")[:3], ['data: {"chat_message": "Test response"}',
+                                                     'data: {"chat_message": " from OpenAI"}',
+                                                     'event: done\ndata: {"chat_message": "Test response from OpenAI"}'])
+        saved_message = Message.query.filter_by(conversation_id=conversation.id, is_user=False).first()
+        self.assertEqual(saved_message.message_text, "Test response from OpenAI")
+        self.assertEqual(saved_message.summary, "Testing")
+
+    def test_stream_chat_invalid_json_response(self):
+        bearer_token = self.test_login_required()
+        conversation = Conversation(conversation_name="Test conversation", user_id=self.test_user.id,
+                                    language="Spanish")
+        db.session.add(conversation)
+        db.session.commit()
+        chunks = [{"choices": [{"delta": {"content": '{"invalid_json_response"}'}}]}]
+
+        with patch("openai.ChatCompletion.create", return_value=iter(chunks)):
+            chat_response = self.client.post(f"/response/{conversation.id}",
+                                             headers={"Authorization": f"Bearer {bearer_token}",
+                                                      "Accept": "text/event-stream"},
+                                             json={"TTS_message": "test_message"})
+            events = chat_response.data.decode("utf-8")
+
+        self.assertEqual(events, 'event: error\ndata: {"chat_message": "I have technical problem with answer, '
+                                 'please repeat"}\n\n')
+        self.assertEqual(Message.query.filter_by(conversation_id=conversation.id).count(), 1)
+
+    def test_stream_false_returns_json(self):
+        bearer_token = self.test_login_required()
+        conversation = Conversation(conversation_name="Test conversation", user_id=self.test_user.id,
+                                    language="Spanish")
+        db.session.add(conversation)
+        db.session.commit()
+        mock_response = self._mock_response('{"answer": "Test response from OpenAI", "summary": "Testing"}')
+
+        for stream in ("0", "false"):
+            with patch("openai.ChatCompletion.create", return_value=mock_response) as mock_openai_call:
+                chat_response = self.client.post(f"/response/{conversation.id}?stream={stream}",
+                                                 headers={"Authorization": f"Bearer {bearer_token}"},
+                                                 json={"TTS_message": "test_message"})
+
+            self.assertNotIn("stream", mock_openai_call.call_args.kwargs)
+            self.assertEqual(chat_response.json["chat_message"], "Test response from OpenAI")
+
+    def test_stream_chat_upstream_error(self):
+        bearer_token = self.test_login_required()
+        conversation = Conversation(conversation_name="Test conversation", user_id=self.test_user.id,
+                                    language="Spanish")
+        db.session.add(conversation)
+        db.session.commit()
+
+        def broken_stream():
+            yield {"choices": [{"delta": {"content": '{"summary": "Testing", "answer": "Test'}}]}
+            raise openai.error.APIConnectionError("connection reset")
+
+        with patch("openai.ChatCompletion.create", return_value=broken_stream()):
+            chat_response = self.client.post(f"/response/{conversation.id}?stream=true",
+                                             headers={"Authorization": f"Bearer {bearer_token}"},
+                                             json={"TTS_message": "test_message"})
+            events = chat_response.data.decode("utf-8")
+
+        self.assertEqual(events.split("\n\n")[:2], ['data: {"chat_message": "Test"}',
+                                                     'event: error\ndata: {"chat_message": "I have technical problem '
+                                                     'with answer, please repeat"}'])
+        self.assertEqual(Message.query.filter_by(conversation_id=conversation.id, is_user=False).count(), 0)
+
+    def test_get_stats(self):
+        bearer_token = self.test_login_required()
+        stats_response = self.client.get("/stats", headers={"Authorization": f"Bearer {bearer_token}"})
+
+        self.assertEqual(stats_response.status_code, 200)
+        self.assertEqual(set(stats_response.json), {"translation_cache", "guidance_cache", "upstream_calls",
+                                                          "async_upstream_calls", "hint_precompute",
+                                                          "identity_cache", "password_hashing"})
+        self.assertEqual(set(stats_response.json["upstream_calls"]), {"calls", "coalesced", "coalescing_rate"})
+
+    def test_get_metrics(self):
+        bearer_token = self.test_login_required()
+        self.client.get("/conversations", headers={"Authorization": f"Bearer {bearer_token}"})
+
+        response = self.client.get("/metrics")
+
+        self.assert200(response)
+        self.assertEqual(response.mimetype, "text/plain")
+        metrics = response.data.decode("utf-8")
+        self.assertIn('http_request_duration_seconds_count{method="GET",endpoint="/conversations",status="200"}',
+                      metrics)
+        self.assertIn('http_request_db_queries_bucket{endpoint="/conversations",le="1"}', metrics)
+        self.assertIn('cache_hits_total{cache="translation",level="l1"}', metrics)
+        self.assertIn('upstream_calls_coalesced_total{coalescer="sync"}', metrics)
+        self.assertIn("db_queries_total ", metrics)
+
+    def test_get_metrics_with_a_token(self):
+        with patch("app.metrics.METRICS_TOKEN", "scrape-secret"):
+            without_token = self.client.get("/metrics")
+            wrong_token = self.client.get("/metrics", headers={"Authorization": "Bearer guess"})
+            with_token = self.client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"})
+
+        self.assert401(without_token)
+        self.assert401(wrong_token)
+        self.assert200(with_token)
+
     def test_get_hint(self):
         bearer_token = self._create_examples_to_db()
         test_answer_summary = "This is your hint"
@@ -290,6 +535,52 @@ class ControllerTests(TestCase):
             self.assertEqual(decode_advanced_version_response["error"],
                              "Please, start conversation before using hint or sentence advanced correction")
 
+    def test_repeated_hint_is_cached_until_next_message(self):
+        bearer_token = self._create_examples_to_db()
+        headers = {"Authorization": f"Bearer {bearer_token}"}
+
+        with patch("openai.ChatCompletion.create", return_value=self._mock_response("This is your hint")) \
+                as mock_openai_call:
+            first = self.client.post("/hint/1", headers=headers)
+            second = self.client.post("/hint/1", headers=headers)
+            self.assertEqual(mock_openai_call.call_count, 1)
+            self.assertEqual(first.json, second.json)
+
+            db.session.add(Message(message_text="Como estas?", conversation_id=1, is_user=True))
+            db.session.commit()
+            self.client.post("/hint/1", headers=headers)
+            self.assertEqual(mock_openai_call.call_count, 2)
+
+    def test_hint_is_precomputed_after_chat_answer(self):
+        bearer_token = self._create_examples_to_db()
+        headers = {"Authorization": f"Bearer {bearer_token}"}
+        completed = hint_precomputer.stats()["completed"]
+        chat_answer = self._mock_response('{"answer": "Test response from OpenAI", "summary": "Testing"}')
+
+        with patch("app.service.HINT_PRECOMPUTE", True), \
+                patch("openai.ChatCompletion.create", return_value=chat_answer):
+            self.client.post("/response/1", headers=headers, json={"TTS_message": "test_message"})
+            wait_for(lambda: hint_precomputer.stats()["completed"] == completed + 1)
+
+        used = hint_precomputer.stats()["used"]
+        with patch("openai.ChatCompletion.create") as mock_openai_call:
+            hint_response = self.client.post("/hint/1", headers=headers)
+
+        mock_openai_call.assert_not_called()
+        self.assertEqual(hint_response.json["guidance_response"], chat_answer["choices"][0]["message"]["content"])
+        self.assertEqual(hint_precomputer.stats()["used"], used + 1)
+
+    def test_advanced_version_cache_is_keyed_on_attempt(self):
+        bearer_token = self._create_examples_to_db()
+        headers = {"Authorization": f"Bearer {bearer_token}"}
+
+        with patch("openai.ChatCompletion.create", return_value=self._mock_response("Advanced")) as mock_openai_call:
+            for attempt in ("Estoy bien", " estoy  BIEN", "Estoy mal"):
+                self.client.post("/advanced_version/1", headers=headers, json={"chat_message": attempt})
+            self.client.post("/hint/1", headers=headers)
+
+            self.assertEqual(mock_openai_call.call_count, 3)
+
     def test_chat_api_error_get_hint(self):
         bearer_token = self._create_examples_to_db()
         with patch("openai.ChatCompletion.create", side_effect=ChatAPIError("Failed to get a response from the chat")):
@@ -371,6 +662,42 @@ class ControllerTests(TestCase):
         self.assertEqual(decoded_translation_response["translated_word"], "compatadora")
         self.assertEqual(decoded_translation_response["translated_contex_sentence"], "I like to use my computer")
 
+    def test_add_to_dictionary_saves_cached_words(self):
+        cache.clear()
+        bearer_token = self.test_login_required()
+        other_user = User(username="otheruser", name="Other User", password=generate_password_hash("otherpassword"))
+        db.session.add(other_user)
+        db.session.commit()
+        other_token = self.client.post("login", json={"username": "otheruser", "password": "otherpassword"}).json["token"]
+        input_data = {"word_to_dictionary": "perro", "contex_sentence": "tengo un perro", "source_lang": "ES",
+                      "target_lang": "EN-GB"}
+
+        with patch("app.controller.translate_with_memory", return_value=("dog", "I have a dog")) as mock_translate:
+            for token in (bearer_token, bearer_token, other_token):
+                response = self.client.post("/dictionary", headers={"Authorization": f"Bearer {token}"},
+                                            json=input_data)
+                self.assert200(response)
+
+        mock_translate.assert_called_once()
+        self.assertEqual(sorted(entry.user_id for entry in Dictionary.query), sorted([self.test_user.id, other_user.id]))
+
+    def test_add_to_dictionary_with_another_sentence_translates_it(self):
+        cache.clear()
+        bearer_token = self.test_login_required()
+        headers = {"Authorization": f"Bearer {bearer_token}"}
+        translations = {"tengo un perro": ("dog", "I have a dog"), "un perro grande": ("dog", "a big dog")}
+
+        with patch("app.controller.translate_with_memory",
+                   side_effect=lambda word, sentence, source_lang, target_lang: translations[sentence]):
+            for sentence in translations:
+                response = self.client.post("/dictionary", headers=headers, json={
+                    "word_to_dictionary": "perro", "contex_sentence": sentence, "source_lang": "ES",
+                    "target_lang": "EN-GB"})
+
+        self.assertEqual(response.json["translated_contex_sentence"], "a big dog")
+        self.assertEqual([(entry.contex_sentence, entry.translated_contex_sentence) for entry in Dictionary.query],
+                         [("un perro grande", "a big dog")])
+
     def test_invalid_payload_add_to_dictionary(self):
         payload_to_dictionary = {
             "word_to_dictionary": "computadora",
@@ -381,6 +708,179 @@ class ControllerTests(TestCase):
         self.assertEqual(decoded_translation_response["error"],
                          "Incorrect data format. Make sure you provide the word and try again.")
 
+    def _add_dictionary_entries(self, entries, user_id=None):
+        for word, translated_word, sentence, translated_sentence, source_lang, target_lang in entries:
+            db.session.add(Dictionary(user_id=user_id or self.test_user.id, word_to_dictionary=word,
+                                      translated_word=translated_word, contex_sentence=sentence,
+                                      translated_contex_sentence=translated_sentence, source_lang=source_lang,
+                                      target_lang=target_lang))
+        db.session.commit()
+
+    def _search_dictionary(self, query_string):
+        bearer_token = self.test_login_required()
+        return self.client.get(f"/dictionary/search?{query_string}", headers={"Authorization": f"Bearer {bearer_token}"})
+
+    def test_search_dictionary_ranks_words_above_sentences(self):
+        self._add_dictionary_entries([
+            ("gato", "cat", "el perro persigue al gato", "the dog chases the cat", "ES", "EN-GB"),
+            ("perro", "dog", "tengo un perro", "I have a dog", "ES", "EN-GB"),
+            ("café", "coffee", "un café con leche", "a coffee with milk", "ES", "EN-GB")])
+
+        response = self._search_dictionary("q=perro")
+
+        self.assert200(response)
+        self.assertEqual([entry["word_to_dictionary"] for entry in response.json["results"]], ["perro", "gato"])
+        self.assertEqual(response.json["results"][0]["translated_contex_sentence"], "I have a dog")
+        # any case, no accents, unfinished last word, translations too
+        for query in ("q=CAFE", "q=caf", "q=coffee+with"):
+            self.assertEqual([entry["word_to_dictionary"] for entry in self._search_dictionary(query).json["results"]],
+                             ["café"])
+
+    def test_search_dictionary_filters_language_pair_and_user(self):
+        other_user = User(username="otheruser", name="Other User", password="unused")
+        db.session.add(other_user)
+        db.session.commit()
+        self._add_dictionary_entries([("perro", "dog", "tengo un perro", "I have a dog", "ES", "EN-GB"),
+                                      ("perro", "chien", "tengo un perro", "j'ai un chien", "ES", "FR")])
+        self._add_dictionary_entries([("perro", "dog", "un perro", "a dog", "ES", "EN-GB")], user_id=other_user.id)
+
+        results = self._search_dictionary("q=perro&source_lang=ES&target_lang=FR").json["results"]
+
+        self.assertEqual([entry["translated_word"] for entry in results], ["chien"])
+        self.assertEqual(len(self._search_dictionary("q=perro").json["results"]), 2)
+
+    def test_search_dictionary_pages(self):
+        self._add_dictionary_entries([(f"perro{i}", "dog", "tengo un perro", "I have a dog", "ES", "EN-GB")
+                                      for i in range(5)])
+
+        first = self._search_dictionary("q=perro&limit=2").json
+        last = self._search_dictionary("q=perro&limit=2&page=3").json
+
+        self.assertTrue(first["has_more"])
+        self.assertFalse(last["has_more"])
+        self.assertEqual(len(last["results"]), 1)
+        words = [entry["word_to_dictionary"] for page in (1, 2, 3)
+                 for entry in self._search_dictionary(f"q=perro&limit=2&page={page}").json["results"]]
+        self.assertEqual(sorted(words), [f"perro{i}" for i in range(5)])
+
+    def test_search_index_follows_updates_and_deletes(self):
+        self._add_dictionary_entries([("perro", "dog", "tengo un perro", "I have a dog", "ES", "EN-GB")])
+        entry = Dictionary.query.first()
+        entry.word_to_dictionary = "gato"
+        db.session.commit()
+        self.assertEqual(self._search_dictionary("q=gato").json["results"][0]["id"], entry.id)
+
+        db.session.delete(entry)
+        db.session.commit()
+        self.assertEqual(self._search_dictionary("q=gato").json["results"], [])
+
+    def test_search_dictionary_invalid_query(self):
+        self.assert400(self._search_dictionary("q=%22%2A"))
+        self.assert400(self._search_dictionary("q=perro&limit=0"))
+        self.assert400(self._search_dictionary("q=perro&page=0"))
+
+    def test_export_dictionary(self):
+        bearer_token = self.test_login_required()
+        headers = {"Authorization": f"Bearer {bearer_token}"}
+        self._add_dictionary_entries([("perro", "dog", "tengo un perro, sí", "I have a dog, yes", "ES", "EN-GB"),
+                                      ("gato", "cat", None, None, "ES", "EN-GB")])
+
+        ndjson = self.client.get("/dictionary/export", headers=headers)
+        ndjson_lines = ndjson.data.decode("utf-8").splitlines()
+        csv_export = self.client.get("/dictionary/export?format=csv", headers=headers)
+
+        self.assertEqual(ndjson.mimetype, "application/x-ndjson")
+        self.assertEqual([json.loads(line) for line in ndjson_lines], [
+            {"word_to_dictionary": "perro", "translated_word": "dog", "contex_sentence": "tengo un perro, sí",
+             "translated_contex_sentence": "I have a dog, yes", "source_lang": "ES", "target_lang": "EN-GB"},
+            {"word_to_dictionary": "gato", "translated_word": "cat", "contex_sentence": None,
+             "translated_contex_sentence": None, "source_lang": "ES", "target_lang": "EN-GB"}])
+        self.assertEqual(csv_export.data.decode("utf-8").splitlines(), [
+            "word_to_dictionary,translated_word,contex_sentence,translated_contex_sentence,source_lang,target_lang",
+            'perro,dog,"tengo un perro, sí","I have a dog, yes",ES,EN-GB',
+            "gato,cat,,,ES,EN-GB"])
+        self.assert400(self.client.get("/dictionary/export?format=xml", headers=headers))
+
+    def test_import_dictionary_export_round_trip(self):
+        bearer_token = self.test_login_required()
+        headers = {"Authorization": f"Bearer {bearer_token}"}
+        self._add_dictionary_entries([("perro", "dog", "tengo un perro, sí", "I have a dog, yes", "ES", "EN-GB")])
+        exports = {file_format: self.client.get(f"/dictionary/export?format={file_format}", headers=headers).data
+                   for file_format in ("csv", "ndjson")}
+        for file_format, exported in exports.items():
+            response = self.client.post(f"/dictionary/import?format={file_format}", headers=headers, data=exported)
+
+            self.assert200(response)
+            self.assertEqual(response.json["imported"], 1)
+            self.assertEqual(response.json["invalid"], [])
+            self.assertIn("rows_per_second", response.json)
+        self.assertEqual([(entry.contex_sentence, entry.translated_contex_sentence) for entry in Dictionary.query],
+                         [("tengo un perro, sí", "I have a dog, yes")])
+
+    def test_import_dictionary_translates_missing_and_reports_invalid_rows(self):
+        bearer_token = self.test_login_required()
+        lines = [{"word_to_dictionary": "perro", "contex_sentence": "tengo un perro", "source_lang": "ES",
+                  "target_lang": "EN-GB"},
+                 {"word_to_dictionary": "gato", "translated_word": "cat", "source_lang": "ES", "target_lang": "EN-GB"},
+                 {"word_to_dictionary": "perro", "source_lang": "ES"},
+                 {"word_to_dictionary": "x" * 51, "source_lang": "ES", "target_lang": "EN-GB"},
+                 {"word_to_dictionary": 5, "source_lang": "ES", "target_lang": "EN-GB"}]
+        body = "\n".join(json.dumps(line) for line in lines) + "\nnot json\n"
+        translations = {"perro": "dog", "tengo un perro": "I have a dog"}
+
+        with patch("app.service.get_translate_deepl_batch",
+                   side_effect=lambda texts, source_lang, target_lang: [translations[text] for text in texts]) \
+                as mock_deepl_call, patch("app.service.DICTIONARY_IMPORT_CHUNK_SIZE", 1):
+            response = self.client.post("/dictionary/import", headers={"Authorization": f"Bearer {bearer_token}"},
+                                        data=body)
+
+        mock_deepl_call.assert_called_once()
+        self.assertEqual(response.json["imported"], 2)
+        self.assertEqual(response.json["translated"], 2)
+        self.assertEqual(response.json["invalid"], [
+            {"line": 3, "error": "target_lang is missing"},
+            {"line": 4, "error": "word_to_dictionary is longer than 50 characters"},
+            {"line": 5, "error": "word_to_dictionary must be text"},
+            {"line": 6, "error": "Not a JSON object"}])
+        self.assertEqual({(entry.word_to_dictionary, entry.translated_word, entry.translated_contex_sentence)
+                          for entry in Dictionary.query}, {("perro", "dog", "I have a dog"), ("gato", "cat", None)})
+
+    def _get_translation_batch(self, payload_to_translation):
+        bearer_token = self.test_login_required()
+        translation_response = self.client.post("/translation/batch",
+                                                headers={"Authorization": f"Bearer {bearer_token}"},
+                                                json=payload_to_translation)
+        return translation_response, json.loads(translation_response.data.decode("utf-8"))
+
+    def test_translation_batch(self):
+        cache.clear()
+        items = [{"word_to_translate": "perro", "sentence_to_translate": "tengo un perro", "source_lang": "ES",
+                  "target_lang": "EN-GB"},
+                 {"word_to_translate": "gato", "sentence_to_translate": "tengo un gato", "source_lang": "ES",
+                  "target_lang": "EN-GB"},
+                 {"word_to_translate": "perro", "sentence_to_translate": "tengo un perro", "source_lang": "ES",
+                  "target_lang": "EN-GB"}]
+        translations = {"perro": "dog", "tengo un perro": "I have a dog", "gato": "cat", "tengo un gato": "I have a cat"}
+
+        with patch("app.service.get_translate_deepl_batch",
+                   side_effect=lambda texts, source_lang, target_lang: [translations[text] for text in texts]) \
+                as mock_deepl_call:
+            response, decoded_response = self._get_translation_batch({"items": items})
+            self._get_translation_batch({"items": items})
+
+            mock_deepl_call.assert_called_once()
+            self.assertEqual(mock_deepl_call.call_args.args[0], ["perro", "tengo un perro", "gato", "tengo un gato"])
+        self.assert200(response)
+        self.assertEqual([item["translated_word"] for item in decoded_response["translations"]],
+                         ["dog", "cat", "dog"])
+        self.assertEqual(decoded_response["translations"][1]["translated_sentence"], "I have a cat")
+
+    def test_invalid_payload_to_translation_batch(self):
+        response, decoded_response = self._get_translation_batch({"items": [{"word_to_translate": "perro"}]})
+        self.assert400(response)
+        self.assertEqual(decoded_response["error"],
+                         "Incorrect data format. Make sure you press the word and try again.")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+from app.metrics import Registry, track_upstream, upstream_duration, upstream_errors, cache_metrics
+from app.cache import LRUCache
+
+
+class MetricsTests(unittest.TestCase):
+
+    def test_counter_and_histogram_text_format(self):
+        registry = Registry()
+        requests = registry.counter("requests_total", "Requests.", ("path",))
+        latency = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1))
+        requests.inc(path='/say "hola"\n')
+        requests.inc(2, path='/say "hola"\n')
+        latency.observe(0.05)
+        latency.observe(0.5)
+        latency.observe(5)
+
+        self.assertEqual(registry.render().splitlines(), [
+            "# HELP requests_total Requests.",
+            "# TYPE requests_total counter",
+            'requests_total{path="/say \\"hola\\"\\n"} 3',
+            "# HELP latency_seconds Latency.",
+            "# TYPE latency_seconds histogram",
+            'latency_seconds_bucket{le="0.1"} 1',
+            'latency_seconds_bucket{le="1"} 2',
+            'latency_seconds_bucket{le="+Inf"} 3',
+            "latency_seconds_sum 5.55",
+            "latency_seconds_count 3"])
+
+    def test_collectors_are_read_when_rendered(self):
+        registry = Registry()
+        cache = LRUCache(max_entries=1)
+        registry.add_collector(lambda: cache_metrics({"words": cache}))
+        cache.set("perro", "dog")
+        cache.set("gato", "cat")
+        cache.get("gato")
+        cache.get("perro")
+
+        rendered = registry.render()
+
+        self.assertIn('cache_hits_total{cache="words",level="l1"} 1', rendered)
+        self.assertIn('cache_misses_total{cache="words",level="l1"} 1', rendered)
+        self.assertIn('cache_evictions_total{cache="words",level="l1"} 1', rendered)
+        self.assertIn('cache_entries{cache="words",level="l1"} 1', rendered)
+
+    def test_track_upstream_counts_errors(self):
+        labels = {"provider": "test", "operation": "fail"}
+        with self.assertRaises(TimeoutError):
+            with track_upstream(**labels):
+                raise TimeoutError()
+
+        self.assertIn(("test", "fail", "TimeoutError"), upstream_errors.values)
+        self.assertEqual(upstream_duration.values[("test", "fail")][-2:-1], [0])
+        self.assertEqual(sum(upstream_duration.values[("test", "fail")][:-1]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import threading
+import unittest
+
+from app.precompute import Precomputer
+from tests.test_coalesce import wait_for
+
+
+class PrecomputerTests(unittest.TestCase):
+
+    def test_result_is_counted_as_used(self):
+        precomputer = Precomputer(max_concurrent=1)
+        self.assertTrue(precomputer.submit(lambda: "conversation:1"))
+        wait_for(lambda: precomputer.stats()["completed"] == 1)
+
+        self.assertTrue(precomputer.record_request("conversation:1", served_from_cache=True))
+        self.assertFalse(precomputer.record_request("conversation:1", served_from_cache=False))
+        self.assertFalse(precomputer.record_request("conversation:2", served_from_cache=True))
+        self.assertEqual(precomputer.stats()["used"], 1)
+        self.assertEqual(precomputer.stats()["missed"], 2)
+
+    def test_submissions_over_the_cap_are_dropped(self):
+        precomputer = Precomputer(max_concurrent=1)
+        release = threading.Event()
+
+        self.assertTrue(precomputer.submit(lambda: release.wait() and None))
+        self.assertFalse(precomputer.submit(lambda: None))
+        release.set()
+        wait_for(lambda: precomputer.stats()["completed"] == 1)
+
+        self.assertTrue(precomputer.submit(lambda: None))
+        self.assertEqual(precomputer.stats()["dropped"], 1)
+
+    def test_failed_job_frees_its_slot(self):
+        precomputer = Precomputer(max_concurrent=1)
+
+        def fail():
+            raise ValueError("upstream failed")
+
+        precomputer.submit(fail)
+        wait_for(lambda: precomputer.stats()["failed"] == 1)
+        self.assertTrue(precomputer.submit(lambda: None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from flask_testing import TestCase
+from flask_jwt_extended import create_access_token
+from app import db
+from app.models import User, Conversation
+from app.profiling import ProfileRing
+from main import app
+
+
+class ProfilingTests(TestCase):
+
+    def create_app(self):
+        app.config["TESTING"] = True
+        return app
+
+    def setUp(self):
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        user = User(username="testuser", name="Test User", password="unused")
+        db.session.add(user)
+        db.session.commit()
+        db.session.add(Conversation(conversation_name="Conversation", user_id=user.id, language="Spanish"))
+        db.session.commit()
+        self.headers = {"Authorization": f"Bearer {create_access_token(identity='testuser', additional_claims={'user_id': user.id})}"}
+        self.profile_dir = tempfile.TemporaryDirectory()
+        self.ring = ProfileRing(self.profile_dir.name, max_files=2)
+        self.previous_ring = app.extensions["profile_ring"]
+        app.extensions["profile_ring"] = self.ring
+
+    def tearDown(self):
+        app.extensions["profile_ring"] = self.previous_ring
+        self.profile_dir.cleanup()
+        db.session.remove()
+        db.drop_all()
+
+    def test_admin_header_profiles_the_request(self):
+        with patch("app.profiling.PROFILE_ADMIN_TOKEN", "secret"):
+            response = self.client.get("/conversation/1", headers={**self.headers, "X-Profile": "secret"})
+            unprofiled = self.client.get("/conversation/1", headers={**self.headers, "X-Profile": "guess"})
+
+        self.assert200(response)
+        self.assertNotIn("X-Profile-Id", unprofiled.headers)
+        [meta] = self.ring.list()
+        self.assertEqual(meta["id"], response.headers["X-Profile-Id"])
+        self.assertEqual((meta["endpoint"], meta["conversation_id"], meta["status"]),
+                         ("/conversation/<conversation_id>", "1", 200))
+        self.assertIn("get_conversation", self.ring.top([meta["id"]]))
+
+    def test_header_does_nothing_without_admin_token(self):
+        with patch("app.profiling.PROFILE_ADMIN_TOKEN", None):
+            self.client.get("/conversation/1", headers={**self.headers, "X-Profile": ""})
+
+        self.assertEqual(self.ring.list(), [])
+
+    def test_sampled_profiles_stay_in_a_bounded_ring(self):
+        with patch("app.profiling.PROFILE_SAMPLE_RATE", 1.0):
+            ids = [self.client.get("/conversations", headers=self.headers).headers["X-Profile-Id"] for _ in range(3)]
+
+        self.assertEqual([meta["id"] for meta in self.ring.list()], ids[1:])
+
+    def test_cli_lists_and_aggregates_profiles(self):
+        with patch("app.profiling.PROFILE_SAMPLE_RATE", 1.0):
+            self.client.get("/conversation/1", headers=self.headers)
+            self.client.get("/conversations", headers=self.headers)
+        runner = app.test_cli_runner()
+
+        listed = runner.invoke(args=["profiles", "list"])
+        top = runner.invoke(args=["profiles", "top", "--endpoint", "/conversations", "--limit", "50"])
+        missing = runner.invoke(args=["profiles", "top", "--conversation", "2"])
+
+        self.assertEqual(len(listed.output.splitlines()), 2)
+        self.assertIn("GET /conversation/<conversation_id>  conversation=1", listed.output)
+        self.assertTrue(top.output.startswith("1 profiles"))
+        self.assertIn("get_conversations", top.output)
+        self.assertNotEqual(missing.exit_code, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,15 +1,18 @@
 import json
+import threading
 import unittest
 from unittest.mock import patch
 
 from flask_testing import TestCase
 from werkzeug.security import generate_password_hash
-from flask_jwt_extended import verify_jwt_in_request
+from flask_jwt_extended import verify_jwt_in_request, create_access_token
 from app.service import find_all_conversations_names_ids, get_user_id_by_token_identify, \
     find_conversation_by_conversation_id, save_message_to_database, prepare_api_payload, message_for_api, \
-    prepare_messages, call_chat_response, save_to_db_dictionary, get_translate_deepl
+    prepare_messages, call_chat_response, save_to_db_dictionary, get_translate_deepl, translate_with_memory, \
+    translate_many_with_memory, save_to_translation_memory, find_last_messages, identity_cache, \
+    upsert, import_dictionary, DICTIONARY_KEY_COLUMNS, DICTIONARY_UPDATE_COLUMNS
 from app import db
-from app.models import User, Conversation, Message, Dictionary
+from app.models import User, Conversation, Message, Dictionary, TranslationMemory
 from main import app
 from app.controller import ChatAPIError
 
@@ -56,6 +59,26 @@ class ServiceTests(TestCase):
             user_id = get_user_id_by_token_identify()
             self.assertEqual(user_id, 1)
 
+    def test_user_id_comes_from_token_claim(self):
+        bearer_token = self.test_login_required()
+        with self.app.test_request_context(headers={"Authorization": f"Bearer {bearer_token}"}):
+            verify_jwt_in_request()
+            with patch("app.service.User.query") as mock_user_query:
+                self.assertEqual(get_user_id_by_token_identify(), self.test_user.id)
+                mock_user_query.filter_by.assert_not_called()
+
+    def test_user_id_of_token_without_claim_is_cached(self):
+        identity_cache.clear()
+        with self.app.app_context():
+            bearer_token = create_access_token(identity="testuser")
+
+        for _ in range(2):
+            with self.app.test_request_context(headers={"Authorization": f"Bearer {bearer_token}"}):
+                verify_jwt_in_request()
+                self.assertEqual(get_user_id_by_token_identify(), self.test_user.id)
+        self.assertEqual(identity_cache.stats()["hits"], 1)
+        self.assertEqual(identity_cache.stats()["misses"], 1)
+
     def add_conversation_and_message(self):
         conversation1 = Conversation(conversation_name="Test Conversation 1", user_id=self.test_user.id,
                                      language="Spanish")
@@ -111,6 +134,22 @@ class ServiceTests(TestCase):
         self.assertEqual(language, conversation_object.language)
         self.assertEqual(user_message, "Hello Again")
 
+    def test_find_last_messages(self):
+        conversation = Conversation(conversation_name="Test Conversation 1", user_id=self.test_user.id,
+                                    language="Spanish")
+        db.session.add(conversation)
+        db.session.commit()
+        for i in range(5):
+            db.session.add(Message(message_text=f"message {i}", conversation_id=conversation.id, is_user=i % 2 == 0,
+                                   summary=f"summary {i}"))
+        db.session.commit()
+
+        last_messages = find_last_messages(conversation.id, 2)
+        self.assertEqual([(message.message_text, message.summary) for message in last_messages],
+                         [("message 3", "summary 3"), ("message 4", "summary 4")])
+        self.assertEqual(len(find_last_messages(conversation.id, 10)), 5)
+        self.assertEqual(find_last_messages(conversation.id + 1, 2), [])
+
     def test_message_for_api(self):
         formatted_messages = message_for_api("Spanish", "Test", "Testing")
         self.assertEqual(formatted_messages, [{"role": "system",
@@ -196,6 +235,44 @@ class ServiceTests(TestCase):
             self.assertEqual(dictionary_object.target_lang, "EN-GB")
             self.assertEqual(dictionary_object.user_id, 1)
 
+    def test_save_to_db_dictionary_twice_updates_the_word(self):
+        bearer_token = self.test_login_required()
+        with self.app.test_request_context(headers={"Authorization": f"Bearer {bearer_token}"}):
+            verify_jwt_in_request()
+            save_to_db_dictionary("perro", "dog", "tengo un perro", "ES", "EN-GB", "I have a dog")
+            save_to_db_dictionary("perro", "dog", "un perro grande", "ES", "EN-GB", "a big dog")
+            save_to_db_dictionary("perro", "chien", "tengo un perro", "ES", "FR", "j'ai un chien")
+
+            entries = Dictionary.query.order_by(Dictionary.id).all()
+            self.assertEqual([(entry.contex_sentence, entry.target_lang) for entry in entries],
+                             [("un perro grande", "EN-GB"), ("tengo un perro", "FR")])
+            self.assertEqual(entries[0].translated_contex_sentence, "a big dog")
+
+    def test_concurrent_upserts_write_one_row(self):
+        row = {"user_id": self.test_user.id, "word_to_dictionary": "perro", "translated_word": "dog",
+               "contex_sentence": "tengo un perro", "translated_contex_sentence": "I have a dog", "source_lang": "ES",
+               "target_lang": "EN-GB"}
+        start = threading.Barrier(4)
+        errors = []
+
+        def double_tap():
+            with app.app_context():
+                start.wait()
+                try:
+                    upsert(Dictionary, [row], DICTIONARY_KEY_COLUMNS, DICTIONARY_UPDATE_COLUMNS)
+                except Exception as e:
+                    errors.append(e)
+                db.session.remove()
+
+        threads = [threading.Thread(target=double_tap) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(Dictionary.query.count(), 1)
+
     def test_get_translate_deepl(self):
         bearer_token = self.test_login_required()
         with self.app.test_request_context(headers={"Authorization": f"Bearer {bearer_token}"}):
@@ -204,6 +281,73 @@ class ServiceTests(TestCase):
             self.assertEqual(translated_word, "computer")
             self.assertEqual(translated_sentence, "I like to use my computer")
 
+    def test_translate_with_memory_calls_deepl_once(self):
+        with patch("app.service.get_translate_deepl", return_value=("computer", "I like to use my computer")) \
+                as mock_deepl_call:
+            first = translate_with_memory("computadora", "me gusta usar mi computadora", "ES", "EN-GB")
+            second = translate_with_memory("Computadora", " me gusta  usar mi computadora", "ES", "EN-GB")
+
+            mock_deepl_call.assert_called_once()
+            self.assertEqual(first, ("computer", "I like to use my computer"))
+            self.assertEqual(second, ("computer", "I like to use my computer"))
+            self.assertEqual(TranslationMemory.query.count(), 2)
+
+    def test_translate_with_memory_reuses_dictionary_rows(self):
+        db.session.add(Dictionary(user_id=self.test_user.id, word_to_dictionary="computadora", translated_word="computer",
+                                  contex_sentence="me gusta usar mi computadora", source_lang="ES", target_lang="EN-GB",
+                                  translated_contex_sentence="I like to use my computer"))
+        db.session.commit()
+        with patch("app.service.get_translate_deepl") as mock_deepl_call:
+            translated = translate_with_memory("computadora", "me gusta usar mi computadora", "ES", "EN-GB")
+
+            mock_deepl_call.assert_not_called()
+            self.assertEqual(translated, ("computer", "I like to use my computer"))
+            self.assertEqual(TranslationMemory.query.filter_by(source_text="computadora").first().translated_text,
+                             "computer")
+
+    def test_translate_with_memory_ignores_imported_translations(self):
+        import_dictionary(self.test_user.id, [(1, {"word_to_dictionary": "perro", "translated_word": "banana",
+                                                   "contex_sentence": "tengo un perro",
+                                                   "translated_contex_sentence": "I have a banana",
+                                                   "source_lang": "ES", "target_lang": "EN-GB"})])
+        with patch("app.service.get_translate_deepl", return_value=("dog", "I have a dog")) as mock_deepl_call:
+            translated = translate_with_memory("perro", "tengo un perro", "ES", "EN-GB")
+
+            mock_deepl_call.assert_called_once()
+            self.assertEqual(translated, ("dog", "I have a dog"))
+            self.assertEqual(TranslationMemory.query.filter_by(source_text="perro").first().translated_text, "dog")
+
+    def test_saving_an_imported_word_again_clears_the_import_flag(self):
+        import_dictionary(self.test_user.id, [(1, {"word_to_dictionary": "perro", "translated_word": "banana",
+                                                   "source_lang": "ES", "target_lang": "EN-GB"})])
+        with self.app.test_request_context(headers={"Authorization": f"Bearer {self.test_login_required()}"}):
+            verify_jwt_in_request()
+            save_to_db_dictionary("perro", "dog", "tengo un perro", "ES", "EN-GB", "I have a dog")
+
+        entry = Dictionary.query.one()
+        self.assertEqual(entry.translated_word, "dog")
+        self.assertFalse(entry.imported)
+
+    def test_translate_many_with_memory_keeps_new_rows_next_to_stored_ones(self):
+        db.session.add(TranslationMemory(source_text="perro", source_lang="ES", target_lang="EN-GB",
+                                         translated_text="dog"))
+        db.session.commit()
+        with patch("app.service.get_translate_deepl_batch", return_value=["cat", "I have a cat"]) \
+                as mock_deepl_call:
+            translations = translate_many_with_memory(["Perro", "perro", "gato", "tengo un gato"], "ES", "EN-GB")
+
+            mock_deepl_call.assert_called_once_with(["gato", "tengo un gato"], "ES", "EN-GB")
+            self.assertEqual(translations, {"Perro": "dog", "perro": "dog", "gato": "cat",
+                                            "tengo un gato": "I have a cat"})
+            self.assertEqual(TranslationMemory.query.filter_by(source_text="gato").first().translated_text, "cat")
+
+    def test_save_to_translation_memory_skips_only_duplicates(self):
+        save_to_translation_memory({"perro": "dog"}, "ES", "EN-GB")
+        save_to_translation_memory({"Perro": "hound", "gato": "cat"}, "ES", "EN-GB")
+
+        memory = {row.source_text: row.translated_text for row in TranslationMemory.query.all()}
+        self.assertEqual(memory, {"perro": "dog", "gato": "cat"})
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+
+from app.streaming import AnswerStreamParser, format_sse
+
+
+class AnswerStreamParserTests(unittest.TestCase):
+
+    def _feed_all(self, chunks):
+        parser = AnswerStreamParser()
+        return parser, [parser.feed(chunk) for chunk in chunks]
+
+    def test_answer_is_returned_while_streaming(self):
+        parser, parts = self._feed_all(['{"summary": "Greeting.", ', '"ans', 'wer": "Hola', ', ¿qué tal?', '"}'])
+        self.assertEqual(parts, ["", "", "Hola", ", ¿qué tal?", ""])
+        self.assertTrue(parser.finished)
+
+    def test_escapes_split_between_chunks(self):
+        parser, parts = self._feed_all(['{"answer": "say \\', '"hi\\"\\n', ' \\u00', 'f1 \\ud83d', '\\ude00"}'])
+        self.assertEqual("".join(parts), 'say "hi"\n ñ 😀')
+
+    def test_answer_key_inside_other_value_is_ignored(self):
+        parser, parts = self._feed_all(['{"summary": "about \\"answer\\": \\"x\\"", "answer": "real"}'])
+        self.assertEqual("".join(parts), "real")
+
+    def test_nothing_after_answer_is_returned(self):
+        parser, parts = self._feed_all(['{"answer": "done", ', '"summary": "more text"}'])
+        self.assertEqual(parts, ["done", ""])
+
+    def test_format_sse(self):
+        self.assertEqual(format_sse({"chat_message": "Hola"}), 'data: {"chat_message": "Hola"}\n\n')
+        self.assertEqual(format_sse({"chat_message": "Hola"}, event="done"),
+                         'event: done\ndata: {"chat_message": "Hola"}\n\n')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+
+import deepl
+
+from app.translator import TranslatorPool
+from benchmarks.fake_upstreams import FakeDeepLHandler, start_fake_server
+
+TRANSLATIONS = {"computadora": "computer", "me gusta usar mi computadora": "I like to use my computer"}
+
+
+class TranslatorPoolTests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = start_fake_server(FakeDeepLHandler, translations=TRANSLATIONS)
+        self.pool = TranslatorPool("fake-key", size=2, server_url=self.server.url)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_word_and_sentence_in_one_request(self):
+        with self.pool.translator() as translator:
+            results = translator.translate_text(list(TRANSLATIONS), source_lang="ES", target_lang="EN-GB")
+
+        self.assertEqual([result.text for result in results], list(TRANSLATIONS.values()))
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(self.server.requests[0][0], "/v2/translate")
+
+    def test_translator_and_connection_are_reused(self):
+        for _ in range(3):
+            with self.pool.translator() as translator:
+                translator.translate_text("computadora", source_lang="ES", target_lang="EN-GB")
+
+        self.assertEqual(self.pool.created, 1)
+        client_addresses = {client_address for _, _, client_address in self.server.requests}
+        self.assertEqual(len(client_addresses), 1)
+
+    def test_pool_does_not_grow_past_its_size(self):
+        with self.pool.translator() as first, self.pool.translator() as second:
+            self.assertIsNot(first, second)
+        with self.pool.translator():
+            pass
+        self.assertEqual(self.pool.created, 2)
+
+    def test_failed_creation_does_not_use_up_the_pool(self):
+        pool = TranslatorPool("", size=1)
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                with pool.translator():
+                    pass
+        self.assertEqual(pool.created, 0)
+
+    def test_fake_server_errors_reach_the_client(self):
+        failing_server = start_fake_server(FakeDeepLHandler, error_rate=1.0, error_statuses=(456,))
+        try:
+            pool = TranslatorPool("fake-key", size=1, server_url=failing_server.url)
+            with self.assertRaises(deepl.QuotaExceededException):
+                with pool.translator() as translator:
+                    translator.translate_text("computadora", source_lang="ES", target_lang="EN-GB")
+        finally:
+            failing_server.shutdown()
+            failing_server.server_close()
+
+
+if __name__ == "__main__":
+    unittest.main()